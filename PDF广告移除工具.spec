@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['numpy', 'cv2', 'PIL.Image', 'PIL.ImageTk', 'fitz'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
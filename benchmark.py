@@ -0,0 +1,278 @@
+"""
+性能基准测试
+对比新旧实现的耗时,并检查结果是否一致
+
+用法:
+  去白边边界框: python benchmark.py margins [--pdf PDF路径] [--repeat 次数]
+  底部文字检测: python benchmark.py textband [--pdf PDF路径] [--repeat 次数]
+  启动耗时:     python benchmark.py startup [--repeat 次数]
+"""
+
+import argparse
+import os
+import sys
+import json
+import time
+import subprocess
+import cv2
+import numpy as np
+from cleaning_core import PDFAdRemover, find_content_bbox
+
+
+def legacy_content_bbox(image):
+    """原 KeepRegionRemover.remove_white_margins 的边界框算法(findNonZero + boundingRect)"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, 250, 255, cv2.THRESH_BINARY)
+    coords = cv2.findNonZero(cv2.bitwise_not(binary))
+    if coords is None:
+        return None
+    return tuple(int(v) for v in cv2.boundingRect(coords))
+
+
+def time_call(func, repeat):
+    """返回多次调用中最快一次的耗时(毫秒)和结果"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_synthetic_pages():
+    """生成 A4 300DPI 的合成页面: 密集文字、稀疏内容+扫描灰尘、空白页"""
+    rng = np.random.default_rng(0)
+    height, width = 3508, 2480
+    pages = []
+
+    # 密集文字页: 大量短横条模拟文字行
+    dense = np.full((height, width, 3), 255, np.uint8)
+    for line_y in range(250, height - 300, 38):
+        x = 200
+        while x < width - 220:
+            word = int(rng.integers(20, 90))
+            cv2.rectangle(dense, (x, line_y), (x + word, line_y + 22), (30, 30, 30), -1)
+            x += word + int(rng.integers(10, 25))
+    pages.append(("密集文字", dense))
+
+    # 稀疏内容 + 扫描灰尘
+    sparse = np.full((height, width, 3), 255, np.uint8)
+    cv2.rectangle(sparse, (600, 900), (1800, 1400), (0, 0, 0), 3)
+    cv2.putText(sparse, "SCAN", (800, 2000), cv2.FONT_HERSHEY_SIMPLEX, 8, (0, 0, 0), 12)
+    for _ in range(40):
+        y, x = int(rng.integers(0, height - 2)), int(rng.integers(0, width - 2))
+        sparse[y:y + 2, x:x + 2] = 120
+    pages.append(("稀疏内容+灰尘", sparse))
+
+    # 空白页
+    pages.append(("空白页", np.full((height, width, 3), 255, np.uint8)))
+    return pages
+
+
+def load_pdf_pages(pdf_path, dpi):
+    """渲染PDF页面用于测试"""
+    import fitz
+
+    pages = []
+    zoom = dpi / 72
+    with fitz.open(pdf_path) as doc:
+        for i, page in enumerate(doc):
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+            pages.append((f"PDF第{i+1}页", cv2.cvtColor(image[:, :, :3], cv2.COLOR_RGB2BGR)))
+    return pages
+
+
+def bench_margins(args):
+    """对比去白边边界框的新旧实现"""
+    pages = make_synthetic_pages()
+    if args.pdf:
+        pages += load_pdf_pages(args.pdf, args.dpi)
+
+    print(f"{'页面':<12}{'尺寸':>12}{'旧实现':>10}{'投影':>10}{'粗扫+投影':>12}{'加速比':>8}  结果一致")
+    all_match = True
+    for name, image in pages:
+        legacy_ms, legacy_bbox = time_call(lambda: legacy_content_bbox(image), args.repeat)
+        full_ms, full_bbox = time_call(lambda: find_content_bbox(image, coarse_factor=1), args.repeat)
+        coarse_ms, coarse_bbox = time_call(lambda: find_content_bbox(image), args.repeat)
+        match = legacy_bbox == full_bbox == coarse_bbox
+        all_match = all_match and match
+        size = f"{image.shape[1]}x{image.shape[0]}"
+        print(f"{name:<12}{size:>12}{legacy_ms:>9.1f}ms{full_ms:>8.1f}ms{coarse_ms:>10.1f}ms"
+              f"{legacy_ms / coarse_ms:>7.1f}x  {'✓' if match else '✗'}")
+
+    # 容差效果: 灰尘不应阻止裁剪
+    _, dusty = pages[1]
+    print()
+    print(f"稀疏内容+灰尘, 容差0: {find_content_bbox(dusty)}")
+    print(f"稀疏内容+灰尘, 容差{args.noise_tolerance}: {find_content_bbox(dusty, noise_tolerance=args.noise_tolerance)}")
+
+    if not all_match:
+        print("✗ 新旧实现结果不一致!")
+        return 1
+    return 0
+
+
+def band_decision(remover, image, regions):
+    """与 PDFAdRemover.clean_loaded_page 相同的判断: 检测到区域且底部区域不是纯白时需要处理"""
+    return bool(regions) and not np.all(image[remover.ad_band_start(image):] == 255)
+
+
+def bench_textband(args):
+    """对比底部文字检测的轮廓实现与连通域实现"""
+    if not os.path.exists(args.pdf):
+        print(f"错误: 文件不存在: {args.pdf}")
+        return 1
+
+    # 与处理时相同: 2倍渲染,底部15%
+    pages = load_pdf_pages(args.pdf, 144)
+    blank_pages = []
+    for name, image in pages:
+        # 底部区域清成纯白的页面,检查"无需处理"的判断
+        blank = image.copy()
+        blank[int(blank.shape[0] * 0.85):] = 255
+        blank_pages.append((f"{name}(底部空白)", blank))
+    pages += blank_pages
+
+    remover = PDFAdRemover()
+    print(f"{'页面':<20}{'预筛选':>14}{'轮廓':>10}{'连通域':>10}{'文字行':>10}{'加速比':>8}  判断(轮廓/连通域/文字行)")
+    all_match = True
+    for name, image in pages:
+        band = image[remover.ad_band_start(image):]
+        prefilter_ms, prefilter = time_call(lambda: remover.prefilter_band(band), args.repeat)
+        contour_ms, contour_regions = time_call(lambda: remover.detect_text_contours(image, band), args.repeat)
+        component_ms, component_regions = time_call(lambda: remover.detect_text_components(image, band), args.repeat)
+        line_ms, line_regions = time_call(
+            lambda: remover.detect_text_components(image, band, text_lines=True), args.repeat
+        )
+        decisions = [band_decision(remover, image, regions) for regions in (contour_regions, component_regions, line_regions)]
+        match = len(set(decisions)) == 1
+        # 预筛选能直接判断时,判断也必须一致
+        if prefilter != "ambiguous":
+            match = match and decisions[0] == (prefilter == "ad")
+        all_match = all_match and match
+        marks = "/".join("处理" if decision else "跳过" for decision in decisions)
+        print(f"{name:<20}{prefilter:>9}{prefilter_ms * 1000:>4.0f}us{contour_ms:>8.2f}ms{component_ms:>8.2f}ms"
+              f"{line_ms:>8.2f}ms{contour_ms / component_ms:>7.1f}x  {marks} {'✓' if match else '✗'}")
+
+    if not all_match:
+        print("✗ 检测结果的处理判断不一致!")
+        return 1
+    return 0
+
+
+# 各界面程序的入口: (显示名, 模块名, 创建窗口并进入主循环的函数)
+ENTRY_POINTS = [
+    ("交互式标注", "interactive_ad_remover", "main"),
+    ("批量处理界面", "pdf_ad_remover_gui", "main"),
+    ("打印图片背景", "处理打印图片背景", "create_ui"),
+]
+
+HEAVY_MODULES = ("numpy", "cv2", "PIL.Image", "fitz")
+
+# 在子进程中运行: 导入入口模块,创建窗口,第一次绘制完成后退出
+STARTUP_PROBE = """
+import sys, time, json
+started = time.time()
+import tkinter
+module_name, entry_name = sys.argv[1], sys.argv[2]
+heavy = %r
+result = {"started": started}
+
+def loaded():
+    return [name for name in heavy if name in sys.modules]
+
+def first_paint(self, n=0):
+    self.update()
+    result["paint_ms"] = (time.perf_counter() - entry_start) * 1000
+    result["loaded_at_paint"] = loaded()
+    self.destroy()
+
+tkinter.Misc.mainloop = first_paint
+start = time.perf_counter()
+try:
+    module = __import__(module_name)
+except ImportError as e:
+    result["error"] = f"缺少模块 {e.name}"
+else:
+    result["import_ms"] = (time.perf_counter() - start) * 1000
+    result["loaded_at_import"] = loaded()
+    entry_start = time.perf_counter()
+    try:
+        getattr(module, entry_name)()
+    except tkinter.TclError as e:
+        result["error"] = f"无法创建窗口({e})"
+print(json.dumps(result, ensure_ascii=False))
+""" % (HEAVY_MODULES,)
+
+
+def run_startup_probe(module_name, entry_name):
+    """在新的解释器中运行一次启动测量,返回测量结果"""
+    spawned = time.time()
+    completed = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE, module_name, entry_name],
+        capture_output=True, text=True, encoding="utf-8",
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    lines = completed.stdout.strip().splitlines()
+    if not lines:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "没有输出"}
+    result = json.loads(lines[-1])
+    result["interpreter_ms"] = (result.pop("started") - spawned) * 1000
+    return result
+
+
+def bench_startup(args):
+    """测量各界面程序的导入耗时和从启动到窗口第一次绘制的耗时"""
+    print(f"{'程序':<12}{'解释器':>10}{'导入':>10}{'首次绘制':>10}{'合计':>10}  窗口显示时已导入的模块")
+    for label, module_name, entry_name in ENTRY_POINTS:
+        runs = [run_startup_probe(module_name, entry_name) for _ in range(args.repeat)]
+        measured = [run for run in runs if "import_ms" in run]
+        if not measured:
+            print(f"{label:<12}  {runs[-1]['error']}")
+            continue
+        # 各项分别取最快一次
+        interpreter_ms = min(run["interpreter_ms"] for run in measured)
+        import_ms = min(run["import_ms"] for run in measured)
+        painted = [run for run in measured if "paint_ms" in run]
+        if painted:
+            paint_ms = min(run["paint_ms"] for run in painted)
+            loaded = ", ".join(painted[-1]["loaded_at_paint"]) or "无"
+            print(f"{label:<12}{interpreter_ms:>8.0f}ms{import_ms:>8.0f}ms{paint_ms:>8.0f}ms"
+                  f"{interpreter_ms + import_ms + paint_ms:>8.0f}ms  {loaded}")
+        else:
+            loaded = ", ".join(measured[-1]["loaded_at_import"]) or "无"
+            print(f"{label:<12}{interpreter_ms:>8.0f}ms{import_ms:>8.0f}ms{'-':>10}{'-':>10}  "
+                  f"导入后: {loaded}; {measured[-1]['error']}")
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    margins_parser = subparsers.add_parser("margins", help="去白边边界框: findNonZero vs 行列投影")
+    margins_parser.add_argument("--pdf", help="额外使用该PDF的页面测试")
+    margins_parser.add_argument("--dpi", type=int, default=150, help="渲染PDF页面的DPI")
+    margins_parser.add_argument("--repeat", type=int, default=5, help="每项重复次数,取最快一次")
+    margins_parser.add_argument("--noise-tolerance", type=int, default=4, help="演示灰尘容差时使用的值")
+    margins_parser.set_defaults(func=bench_margins)
+
+    textband_parser = subparsers.add_parser("textband", help="底部文字检测: findContours vs 连通域")
+    textband_parser.add_argument("--pdf", default="重力.pdf", help="测试用的PDF")
+    textband_parser.add_argument("--repeat", type=int, default=5, help="每项重复次数,取最快一次")
+    textband_parser.set_defaults(func=bench_textband)
+
+    startup_parser = subparsers.add_parser("startup", help="界面程序的导入和首次绘制耗时")
+    startup_parser.add_argument("--repeat", type=int, default=3, help="每个程序启动的次数,取最快一次")
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
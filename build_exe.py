@@ -14,6 +14,8 @@ a = Analysis(
         'cv2',
         'numpy',
         'PIL',
+        'PIL.Image',
+        'PIL.ImageTk',
         'tkinter',
         'fitz',
         'pymupdf',
@@ -0,0 +1,34 @@
+"""
+图片和PDF清理的处理核心,不依赖 tkinter 和 PIL.ImageTk
+
+命令行、三个界面程序、监视文件夹和任务服务都从这里导入处理器,没有图形环境的服务器和容器中也可以使用:
+    
+    from cleaning_core import PDFAdRemover, KeepRegions, KeepRegionRemover, remove_black_background
+    
+    PDFAdRemover().batch_process_pdf_to_pdf("试卷.pdf", "试卷_cleaned.pdf")
+    
+    regions = KeepRegions()
+    regions.add_global((36, 36, 559, 770))  # PDF点坐标 (x1, y1, x2, y2)
+    KeepRegionRemover(regions).process_pdf("试卷.pdf", "试卷_kept.pdf")
+
+以下列出的名称为稳定的接口;子模块中的其他函数是内部实现,可能随版本改变。
+cv2、numpy 在第一次处理时才导入,fitz 在处理PDF时才导入。
+处理器在处理期间持有 FITZ_LOCK,同一进程中其他线程使用fitz时也应先取得这把锁。
+"""
+
+from cleaning_core.ad_remover import (
+    PDFAdRemover, ProgressTracker, format_progress, CancelToken, ProcessingCancelled, MemoryBudget,
+    COLOR_MODES, TEXT_DETECTORS, FITZ_LOCK
+)
+from cleaning_core.keep_regions import (
+    KeepRegions, KeepRegionRemover, find_content_bbox, page_to_pixel_matrix, invert_matrix, transform_regions
+)
+from cleaning_core.background import remove_black_background
+
+__all__ = [
+    "PDFAdRemover", "ProgressTracker", "format_progress", "CancelToken", "ProcessingCancelled", "MemoryBudget",
+    "COLOR_MODES", "TEXT_DETECTORS", "FITZ_LOCK",
+    "KeepRegions", "KeepRegionRemover", "find_content_bbox", "page_to_pixel_matrix", "invert_matrix",
+    "transform_regions",
+    "remove_black_background",
+]
@@ -0,0 +1,1764 @@
+"""
+PDF广告文字和二维码移除的处理核心
+PDFAdRemover 检测并覆盖试卷图片底部的广告文字和二维码,以及处理过程共用的进度、取消、内存预算、
+流水线和输出写入等部件。不依赖界面,命令行、界面程序和服务进程共用。
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+import functools
+import contextlib
+import collections
+import hashlib
+from typing import TYPE_CHECKING
+from pdf_shards import resolve_pages, shard_metadata, format_page_range
+from result_cache import page_content_hash
+from lazy_modules import lazy_import
+
+lazy_import(globals(), cv2="cv2", np="numpy")
+if TYPE_CHECKING:
+    import cv2
+    import numpy as np
+
+
+class ProgressTracker:
+    """
+    处理进度跟踪
+    
+    处理方每完成一页调用一次 update(),跟踪器计算速度和预计剩余时间,
+    并把进度字典传给回调函数 progress_callback(progress),字段如下:
+        pages_done: 已处理页数
+        total_pages: 总页数
+        pages_per_second: 平均处理速度(页/秒)
+        eta_seconds: 预计剩余时间(秒),尚无法估计时为 None
+        bytes_written: 已写入的字节数
+        elapsed_seconds: 已用时间(秒)
+    回调在处理线程中调用,GUI 需要自行切换到界面线程。
+    """
+    
+    def __init__(self, total_pages, callback=None):
+        """
+        初始化进度跟踪
+        
+        Args:
+            total_pages: 总页数
+            callback: 进度回调函数,为None时只记录不报告
+        """
+        self.total_pages = total_pages
+        self.callback = callback
+        self.pages_done = 0
+        self.bytes_written = 0
+        self.start_time = time.perf_counter()
+    
+    def update(self, pages=1, bytes_written=0):
+        """
+        记录新完成的页面并报告进度
+        
+        Args:
+            pages: 新完成的页数
+            bytes_written: 这些页面新写入的字节数
+        """
+        self.pages_done += pages
+        self.bytes_written += bytes_written
+        if self.callback:
+            self.callback(self.report())
+    
+    def report(self):
+        """生成当前的进度字典"""
+        elapsed = time.perf_counter() - self.start_time
+        speed = self.pages_done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total_pages - self.pages_done
+        return {
+            'pages_done': self.pages_done,
+            'total_pages': self.total_pages,
+            'pages_per_second': speed,
+            'eta_seconds': remaining / speed if speed > 0 else None,
+            'bytes_written': self.bytes_written,
+            'elapsed_seconds': elapsed
+        }
+    
+    def finish(self, bytes_written=None):
+        """
+        结束跟踪,返回最终进度字典
+        
+        Args:
+            bytes_written: 最终输出的实际字节数(如保存后的PDF文件大小),为None时保留累计值
+        """
+        if bytes_written is not None:
+            self.bytes_written = bytes_written
+        report = self.report()
+        if self.callback:
+            self.callback(report)
+        return report
+
+
+def format_progress(progress):
+    """
+    把进度字典格式化为状态栏文字
+    
+    Args:
+        progress: ProgressTracker 生成的进度字典
+        
+    Returns:
+        例如 "第 12/200 页 | 3.5 页/秒 | 剩余 00:54 | 已写入 4.2 MB"
+    """
+    eta = progress['eta_seconds']
+    eta_text = "--:--" if eta is None else f"{int(eta) // 60:02d}:{int(eta) % 60:02d}"
+    return (
+        f"第 {progress['pages_done']}/{progress['total_pages']} 页 | "
+        f"{progress['pages_per_second']:.1f} 页/秒 | 剩余 {eta_text} | "
+        f"已写入 {progress['bytes_written'] / (1024 * 1024):.1f} MB"
+    )
+
+
+class ProcessingCancelled(Exception):
+    """处理被取消"""
+
+
+class CancelToken:
+    """
+    协作式取消令牌
+    
+    界面线程调用 cancel(),处理线程在页与页之间、各处理阶段之间调用 check(),
+    检测到取消时抛出 ProcessingCancelled,由处理方负责关闭文档和清理未完成的输出。
+    """
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        """请求取消"""
+        self._event.set()
+    
+    @property
+    def cancelled(self):
+        """是否已请求取消"""
+        return self._event.is_set()
+    
+    def check(self):
+        """已请求取消时抛出 ProcessingCancelled"""
+        if self._event.is_set():
+            raise ProcessingCancelled("处理已取消")
+
+
+# PyMuPDF 不是线程安全的: 同一进程中使用fitz的线程(处理线程、界面的页面加载线程等)都要先取得这把锁。
+# 处理器在整次处理期间持有,页面加载器每渲染一页取得一次,处理期间加载暂停。
+FITZ_LOCK = threading.RLock()
+
+
+def holds_fitz_lock(method):
+    """装饰器: 调用期间持有 FITZ_LOCK"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with FITZ_LOCK:
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def remove_quietly(path):
+    """删除文件,文件不存在或删除失败时忽略"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """
+    当前进程到目前为止的峰值常驻内存
+    
+    Returns:
+        峰值内存(MB),无法获取时为 None
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows 没有 resource 模块,改用 psutil(可选依赖)
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB,macOS 上为字节
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class MemoryBudget:
+    """
+    处理时的内存预算
+    
+    预算的一半留给正在渲染/处理的页面,另一半留给已编码但尚未写入磁盘的输出页面:
+    - 单页渲染估计超出预算时自动降低渲染DPI(不低于 min_zoom)
+    - 已编码页数达到 max_pages_in_flight 或字节数超出预算时,输出增量写入磁盘
+    """
+    
+    # 处理一页时同时存在的整页图像副本数(pixmap、解码图像、处理中间结果、编码前图像)
+    COPIES_PER_PAGE = 4
+    
+    def __init__(self, max_memory_mb=1024, max_pages_in_flight=4, min_zoom=1.0):
+        """
+        初始化内存预算
+        
+        Args:
+            max_memory_mb: 内存上限(MB)
+            max_pages_in_flight: 同时在内存中的已渲染页数和未写盘的已编码页数上限
+            min_zoom: 因内存不足降低渲染倍数时的下限(1.0 即 72 DPI)
+        """
+        self.max_memory_mb = max_memory_mb
+        self.max_pages_in_flight = max(1, int(max_pages_in_flight))
+        self.min_zoom = min_zoom
+    
+    @property
+    def max_bytes(self):
+        """内存上限(字节)"""
+        return int(self.max_memory_mb * 1024 * 1024)
+    
+    def page_allowance(self):
+        """单个渲染中的页面可用的内存(字节)"""
+        return self.max_bytes // 2 // self.max_pages_in_flight
+    
+    def estimate_page_bytes(self, width, height, zoom, channels=3):
+        """
+        估计按指定倍数处理一页需要的内存
+        
+        Args:
+            width: 页面宽度(点)
+            height: 页面高度(点)
+            zoom: 渲染倍数
+            channels: 颜色通道数
+        """
+        return int(width * zoom) * int(height * zoom) * channels * self.COPIES_PER_PAGE
+    
+    def fit_zoom(self, width, height, zoom, channels=3):
+        """
+        返回不超出单页预算的渲染倍数
+        
+        Args:
+            width: 页面宽度(点)
+            height: 页面高度(点)
+            zoom: 期望的渲染倍数
+            channels: 颜色通道数
+            
+        Returns:
+            实际使用的渲染倍数,预算足够时等于 zoom
+        """
+        estimate = self.estimate_page_bytes(width, height, zoom, channels)
+        if estimate <= self.page_allowance():
+            return zoom
+        
+        # 内存与倍数的平方成正比
+        fitted = zoom * (self.page_allowance() / estimate) ** 0.5
+        return max(fitted, min(self.min_zoom, zoom))
+    
+    def should_flush(self, pending_pages, pending_bytes):
+        """
+        未写盘的已编码页面是否需要写入磁盘
+        
+        Args:
+            pending_pages: 未写盘的页数
+            pending_bytes: 未写盘的编码字节数
+        """
+        return pending_pages >= self.max_pages_in_flight or pending_bytes >= self.max_bytes // 2
+
+
+class IncrementalPDFWriter:
+    """
+    按内存预算增量写入的输出PDF
+    
+    新页面先加入内存中的文档,未写盘的页数或字节数达到预算时追加保存到 .part 临时文件,
+    再重新打开文档以释放已写入页面占用的内存。commit() 成功后替换为正式输出文件,
+    abort() 删除临时文件,不会留下半成品。
+    
+    优化模式下,相同的图片数据按哈希只嵌入一次,后续页面引用同一个xref;
+    commit() 时再整体重写一遍,清理无用对象、合并重复对象、启用对象流和数据流压缩。
+    """
+    
+    def __init__(self, output_path, memory_budget, deflate=False, optimize=False, metadata=None):
+        """
+        初始化输出PDF
+        
+        Args:
+            output_path: 最终输出路径
+            memory_budget: MemoryBudget对象
+            deflate: 保存时是否压缩未压缩的数据流
+            optimize: 是否启用优化保存模式
+            metadata: 文档元数据字典(如分片信息),为None时不设置
+        """
+        import fitz
+        
+        self.output_path = output_path
+        self.partial_path = output_path + ".part"
+        self.optimized_path = output_path + ".opt.part"
+        self.memory_budget = memory_budget
+        self.deflate = deflate
+        self.optimize = optimize
+        self.doc = fitz.open()
+        if metadata:
+            self.doc.set_metadata(metadata)
+        self.pending_pages = 0
+        self.pending_bytes = 0
+        self.flush_count = 0
+        self.on_disk = False
+        self.image_xrefs = {}  # 图片数据的sha256 -> (已嵌入的xref, 嵌入后的数据流字节数)
+        self.duplicate_images = 0
+        self.duplicate_bytes = 0
+        self.optimized_bytes_saved = 0
+    
+    def new_page(self, width, height):
+        """在输出文档末尾添加空白页"""
+        return self.doc.new_page(width=width, height=height)
+    
+    def copy_page(self, source_document, page_num):
+        """
+        把源文档的一页原样复制到输出文档末尾,不重新编码
+        
+        Args:
+            source_document: 源fitz文档
+            page_num: 源文档中的页码
+        """
+        self.copy_pages(source_document, page_num, page_num)
+    
+    def copy_pages(self, source_document, from_page, to_page):
+        """
+        把源文档的连续多页原样复制到输出文档末尾
+        
+        Args:
+            source_document: 源fitz文档
+            from_page: 起始页码
+            to_page: 结束页码(包含)
+        """
+        self.doc.insert_pdf(source_document, from_page=from_page, to_page=to_page)
+        self.page_done(0, pages=to_page - from_page + 1)
+    
+    def insert_image(self, page, rect, image_data, keep_proportion=True):
+        """
+        在输出页面上插入图片,优化模式下相同的图片只嵌入一次
+        
+        Args:
+            page: new_page() 返回的页面
+            rect: 图片位置
+            image_data: 编码后的图片字节
+            keep_proportion: 是否保持图片宽高比
+            
+        Returns:
+            图片的xref
+        """
+        if not self.optimize:
+            return page.insert_image(rect, stream=image_data, keep_proportion=keep_proportion)
+        
+        digest = hashlib.sha256(image_data).digest()
+        if digest in self.image_xrefs:
+            # 重复的图片: 引用已嵌入的对象(增量写盘后xref仍然有效)
+            xref, stream_bytes = self.image_xrefs[digest]
+            page.insert_image(rect, xref=xref, keep_proportion=keep_proportion)
+            self.duplicate_images += 1
+            self.duplicate_bytes += stream_bytes
+            return xref
+        
+        xref = page.insert_image(rect, stream=image_data, keep_proportion=keep_proportion)
+        
+        # 记录嵌入后的数据流大小(PNG会被解码后重新存储,可能比编码数据大得多)
+        kind, length = self.doc.xref_get_key(xref, "Length")
+        self.image_xrefs[digest] = (xref, int(length) if kind == "int" else len(image_data))
+        return xref
+    
+    def page_done(self, encoded_bytes, pages=1):
+        """
+        登记页面已写入内存中的文档,超出预算时写入磁盘
+        
+        Args:
+            encoded_bytes: 插入的编码数据字节数
+            pages: 页数
+        """
+        self.pending_pages += pages
+        self.pending_bytes += encoded_bytes
+        if self.memory_budget.should_flush(self.pending_pages, self.pending_bytes):
+            self.flush()
+    
+    def flush(self):
+        """把未写盘的页面追加保存到临时文件,并释放其内存"""
+        import fitz
+        
+        if self.pending_pages == 0:
+            return
+        
+        if self.on_disk:
+            self.doc.save(
+                self.partial_path,
+                incremental=True,
+                encryption=fitz.PDF_ENCRYPT_KEEP,
+                deflate=self.deflate
+            )
+        else:
+            self.doc.save(self.partial_path, deflate=self.deflate)
+            self.on_disk = True
+        
+        # 重新打开,已写入的页面不再占用内存
+        self.doc.close()
+        self.doc = fitz.open(self.partial_path)
+        self.pending_pages = 0
+        self.pending_bytes = 0
+        self.flush_count += 1
+    
+    def commit(self):
+        """
+        写入剩余页面并替换为正式输出文件
+        
+        Returns:
+            输出文件路径
+        """
+        self.flush()
+        
+        if self.optimize:
+            # 整体重写: 清理无用对象并合并重复对象、对象流、压缩数据流
+            unoptimized_size = os.path.getsize(self.partial_path)
+            self.doc.save(self.optimized_path, garbage=3, deflate=True, use_objstms=1)
+            self.doc.close()
+            os.replace(self.optimized_path, self.partial_path)
+            self.optimized_bytes_saved = unoptimized_size - os.path.getsize(self.partial_path)
+        else:
+            self.doc.close()
+        
+        os.replace(self.partial_path, self.output_path)
+        return self.output_path
+    
+    def abort(self):
+        """放弃输出,删除临时文件"""
+        if not self.doc.is_closed:
+            self.doc.close()
+        remove_quietly(self.partial_path)
+        remove_quietly(self.optimized_path)
+    
+    def size_report(self):
+        """
+        优化保存节省的空间
+        
+        Returns:
+            字典: duplicate_images 复用的重复图片数, duplicate_bytes 因复用少嵌入的字节数,
+            optimized_bytes_saved 最终重写节省的字节数, bytes_saved 合计节省的字节数
+        """
+        return {
+            'duplicate_images': self.duplicate_images,
+            'duplicate_bytes': self.duplicate_bytes,
+            'optimized_bytes_saved': self.optimized_bytes_saved,
+            'bytes_saved': self.duplicate_bytes + self.optimized_bytes_saved
+        }
+
+
+def add_memory_report(report, memory_budget, reduced_dpi_pages, flush_count=0):
+    """
+    把内存相关的统计加入运行报告并打印峰值内存
+    
+    Args:
+        report: ProgressTracker.finish() 返回的报告字典
+        memory_budget: 本次使用的 MemoryBudget
+        reduced_dpi_pages: 因内存预算降低了渲染DPI的页码列表
+        flush_count: 输出增量写盘的次数
+        
+    Returns:
+        补充后的报告字典
+    """
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['memory_budget_mb'] = memory_budget.max_memory_mb
+    report['reduced_dpi_pages'] = reduced_dpi_pages
+    report['flush_count'] = flush_count
+    if report['peak_rss_mb'] is not None:
+        print(f"峰值内存: {report['peak_rss_mb']:.0f} MB (预算 {memory_budget.max_memory_mb} MB)")
+    if reduced_dpi_pages:
+        print(f"因内存预算降低渲染DPI的页数: {len(reduced_dpi_pages)}")
+    return report
+
+
+def add_size_report(report, output_pdf):
+    """
+    优化保存模式下,把节省的空间加入运行报告并打印
+    
+    Args:
+        report: 运行报告字典
+        output_pdf: 已 commit() 的 IncrementalPDFWriter
+        
+    Returns:
+        补充后的报告字典
+    """
+    if output_pdf.optimize:
+        report.update(output_pdf.size_report())
+        print(
+            f"优化保存: 复用重复图片 {report['duplicate_images']} 张, "
+            f"共节省 {report['bytes_saved'] / (1024 * 1024):.1f} MB"
+        )
+    return report
+
+
+class PagePipeline:
+    """
+    页面处理流水线: 渲染 -> 处理 -> 编码 -> 写入
+    
+    渲染和写入使用fitz(不是线程安全的),在调用线程中进行;处理(OpenCV)和编码(PNG/JPEG)
+    各由一组线程完成,这两步运行时释放GIL,可以与调用线程渲染下一页同时进行。
+    阶段之间用有界队列连接,流水线中(已渲染、处理中、编码中、待写入)的页数不超过 depth,
+    与 MemoryBudget.max_pages_in_flight 对应,内存估计仍然成立。结果按提交顺序取回。
+    
+    用法:
+        pipeline = PagePipeline(process, encode, depth, workers)
+        try:
+            for ...:
+                with pipeline.stage("render"):
+                    item = ...
+                pipeline.submit(key, item)
+                for key, result in pipeline.results():
+                    with pipeline.stage("write"):
+                        ...
+            for key, result in pipeline.results(wait_all=True):
+                ...
+        finally:
+            pipeline.close()
+    """
+    
+    STAGES = ("render", "process", "encode", "write")
+    
+    def __init__(self, process, encode, depth=4, workers=2):
+        """
+        初始化流水线
+        
+        Args:
+            process: 处理函数,参数为 submit() 的 item,返回值传给 encode;返回 None 表示页面无需改动,跳过编码
+            encode: 编码函数,返回值即该页的结果
+            depth: 流水线中最多同时存在的页数
+            workers: 处理和编码阶段各自的线程数,为0时在调用线程中依次执行(不使用线程)
+        """
+        self.process = process
+        self.encode = encode
+        self.depth = max(1, int(depth))
+        self.workers = max(0, int(workers))
+        self.busy = dict.fromkeys(self.STAGES, 0.0)  # 各阶段累计的处理时间(秒)
+        self.start_time = time.perf_counter()
+        
+        self._order = collections.deque()  # 已提交、尚未取回的页,按提交顺序
+        self._done = {}  # key -> (结果, 异常)
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads = []
+        if self.workers:
+            self._process_queue = queue.Queue(maxsize=self.depth)
+            self._encode_queue = queue.Queue(maxsize=self.depth)
+            for _ in range(self.workers):
+                self._start_thread(self._process_queue, "process", self._process_item)
+                self._start_thread(self._encode_queue, "encode", self._encode_item)
+    
+    def _start_thread(self, task_queue, stage, handle):
+        thread = threading.Thread(target=self._run, args=(task_queue, stage, handle), daemon=True)
+        thread.start()
+        self._threads.append((stage, task_queue, thread))
+    
+    def _run(self, task_queue, stage, handle):
+        """工作线程: 从队列取出页面并处理,收到 None 时退出"""
+        while True:
+            task = task_queue.get()
+            if task is None:
+                return
+            if self._stopped:
+                continue  # 已关闭,丢弃剩余的页面
+            key, item = task
+            start = time.perf_counter()
+            try:
+                handle(key, item)
+            except BaseException as e:
+                self._finish(key, None, e)
+            finally:
+                self._add_busy(stage, time.perf_counter() - start)
+    
+    def _process_item(self, key, item):
+        result = self.process(item)
+        if result is None:
+            self._finish(key, None)
+        else:
+            self._encode_queue.put((key, result))
+    
+    def _encode_item(self, key, item):
+        self._finish(key, self.encode(item))
+    
+    def _add_busy(self, stage, seconds):
+        with self._condition:
+            self.busy[stage] += seconds
+    
+    def _finish(self, key, result, error=None):
+        with self._condition:
+            self._done[key] = (result, error)
+            self._condition.notify_all()
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """统计调用线程中的阶段(渲染、写入)用时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_busy(name, time.perf_counter() - start)
+    
+    def submit(self, key, item):
+        """
+        提交一页进入处理阶段
+        
+        Args:
+            key: 页面标识(如页码),取回结果时返回
+            item: 传给处理函数的数据
+        """
+        self._order.append(key)
+        if self.workers:
+            self._process_queue.put((key, item))
+            return
+        
+        # 不使用线程: 在调用线程中依次处理和编码
+        try:
+            with self.stage("process"):
+                result = self.process(item)
+            if result is not None:
+                with self.stage("encode"):
+                    result = self.encode(result)
+        except BaseException as e:
+            self._finish(key, None, e)
+        else:
+            self._finish(key, result)
+    
+    def put_result(self, key, result):
+        """提交一页已有结果(如缓存命中)的页面,按顺序与其他页面一起取回"""
+        self._order.append(key)
+        self._finish(key, result)
+    
+    def results(self, wait_all=False):
+        """
+        按提交顺序取回已完成的页面;流水线已满时等待最早提交的页面完成,为下一页腾出位置
+        
+        Args:
+            wait_all: 等待并取回所有已提交的页面
+            
+        Returns:
+            (key, 结果) 的迭代器;处理或编码时出现的异常在取回该页时抛出
+        """
+        while self._order:
+            key = self._order[0]
+            with self._condition:
+                if key not in self._done and not wait_all and len(self._order) < self.depth:
+                    return
+                while key not in self._done:
+                    self._condition.wait()
+                result, error = self._done.pop(key)
+            self._order.popleft()
+            if error is not None:
+                raise error
+            yield key, result
+    
+    def close(self):
+        """停止工作线程,丢弃尚未完成的页面"""
+        self._stopped = True
+        # 先停处理线程再停编码线程: 处理线程可能正在向编码队列放入页面,编码线程需要继续取走
+        for stage in ("process", "encode"):
+            threads = [(task_queue, thread) for name, task_queue, thread in self._threads if name == stage]
+            for task_queue, _ in threads:
+                task_queue.put(None)
+            for _, thread in threads:
+                thread.join()
+        self._threads = []
+    
+    def report(self):
+        """
+        各阶段的利用率,用于找出瓶颈
+        
+        Returns:
+            {'depth', 'workers', 'elapsed_seconds', 'stages': {阶段: {'busy_seconds', 'threads', 'utilization'}},
+             'bottleneck': 利用率最高的阶段}
+        """
+        elapsed = time.perf_counter() - self.start_time
+        stages = {}
+        for name in self.STAGES:
+            threads = self.workers if name in ("process", "encode") and self.workers else 1
+            stages[name] = {
+                'busy_seconds': self.busy[name],
+                'threads': threads,
+                'utilization': self.busy[name] / (elapsed * threads) if elapsed > 0 else 0.0
+            }
+        return {
+            'depth': self.depth,
+            'workers': self.workers,
+            'elapsed_seconds': elapsed,
+            'stages': stages,
+            'bottleneck': max(self.STAGES, key=lambda name: stages[name]['utilization'])
+        }
+
+
+def add_pipeline_report(report, pipeline):
+    """
+    把流水线各阶段的利用率写入运行报告并输出
+    
+    Args:
+        report: 运行报告字典
+        pipeline: PagePipeline对象
+    """
+    report['pipeline'] = pipeline.report()
+    names = {'render': "渲染", 'process': "处理", 'encode': "编码", 'write': "写入"}
+    stages = report['pipeline']['stages']
+    usage = ", ".join(
+        f"{names[name]} {stage['utilization']:.0%}" + (f"({stage['threads']}线程)" if stage['threads'] > 1 else "")
+        for name, stage in stages.items()
+    )
+    print(f"流水线利用率: {usage}; 瓶颈: {names[report['pipeline']['bottleneck']]}")
+
+
+def find_page_image(page, coverage_tolerance=0.02):
+    """
+    查找整页由一张图片构成的页面(扫描件)中的图片
+    
+    条件: 页面未旋转,只有一处图片且没有透明蒙版,图片正向放置(无旋转/翻转)并覆盖整页,
+    页面上没有文字和矢量图形。
+    
+    Args:
+        page: fitz页面对象
+        coverage_tolerance: 图片边界与页面边界允许的偏差(占页面宽/高的比例)
+        
+    Returns:
+        page.get_image_info(xrefs=True) 中该图片的信息字典,不满足条件时返回 None
+    """
+    if page.rotation != 0:
+        return None
+    
+    infos = page.get_image_info(xrefs=True)
+    if len(infos) != 1:
+        return None
+    
+    info = infos[0]
+    if info['xref'] <= 0 or info['has-mask']:
+        return None
+    
+    # 放置矩阵必须是正向的缩放+平移
+    a, b, c, d, _, _ = info['transform']
+    if abs(b) > 1e-6 or abs(c) > 1e-6 or a <= 0 or d <= 0:
+        return None
+    
+    # 图片需要覆盖整页
+    rect = page.rect
+    x0, y0, x1, y1 = info['bbox']
+    tolerance_x = rect.width * coverage_tolerance
+    tolerance_y = rect.height * coverage_tolerance
+    if (abs(x0 - rect.x0) > tolerance_x or abs(x1 - rect.x1) > tolerance_x
+            or abs(y0 - rect.y0) > tolerance_y or abs(y1 - rect.y1) > tolerance_y):
+        return None
+    
+    if page.get_text("text").strip() or page.get_drawings():
+        return None
+    
+    return info
+
+
+def extract_page_image(page, memory_budget=None, grayscale=False):
+    """
+    按原始分辨率取出整页图片,不经过渲染
+    
+    Args:
+        page: fitz页面对象
+        memory_budget: MemoryBudget对象,原图处理超出单页预算时放弃快速路径
+        grayscale: 彩色原图也按灰度解码;灰度原图总是解码为单通道
+        
+    Returns:
+        (OpenCV图像(BGR,灰度时为单通道), 图片信息字典, 原图格式扩展名, 图像是否为灰度),
+        页面不是单图页面或图片无法解码时返回 None
+    """
+    info = find_page_image(page)
+    if info is None:
+        return None
+    
+    extracted = page.parent.extract_image(info['xref'])
+    if not extracted or extracted.get('smask') or extracted['colorspace'] not in (1, 3):
+        return None
+    
+    grayscale = grayscale or extracted['colorspace'] == 1
+    if memory_budget is not None:
+        channels = 1 if grayscale else 3
+        estimate = memory_budget.estimate_page_bytes(info['width'], info['height'], 1, channels)
+        if estimate > memory_budget.page_allowance():
+            return None
+    
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    image = cv2.imdecode(np.frombuffer(extracted['image'], np.uint8), flags)
+    if image is None or image.shape[:2] != (extracted['height'], extracted['width']):
+        return None
+    
+    return image, info, extracted['ext'], grayscale
+
+
+def to_gray(image):
+    """BGR图像转为灰度,已是单通道时原样返回"""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+# 颜色模式: 自动(按页面饱和度选择)、彩色、灰度
+COLOR_MODES = ("auto", "color", "gray")
+
+# 底部文字检测方式: 轮廓(原实现)、连通域、连通域+横向膨胀(按文字行合并)
+TEXT_DETECTORS = ("contours", "components", "lines")
+
+
+def is_monochrome_page(page, saturation_threshold=48, max_color_ratio=0.001, sample_zoom=0.25):
+    """
+    按缩略图的饱和度判断页面是否为黑白(灰度)页面
+    
+    Args:
+        page: fitz页面对象
+        saturation_threshold: HSV饱和度超过该值的像素视为彩色
+        max_color_ratio: 彩色像素占比不超过该值时视为黑白页面(容忍扫描色偏和小的彩色印章)
+        sample_zoom: 缩略图的渲染倍数
+        
+    Returns:
+        是否为黑白页面
+    """
+    import fitz
+    
+    pix = page.get_pixmap(matrix=fitz.Matrix(sample_zoom, sample_zoom), alpha=False)
+    rgb = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+    saturation = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)[:, :, 1]
+    return np.count_nonzero(saturation > saturation_threshold) <= saturation.size * max_color_ratio
+
+
+def use_grayscale(page, color_mode):
+    """
+    按颜色模式确定页面是否按灰度处理
+    
+    Args:
+        page: fitz页面对象
+        color_mode: "color" 总是彩色, "gray" 总是灰度, "auto" 按页面饱和度自动选择
+        
+    Returns:
+        是否按灰度处理
+    """
+    if color_mode not in COLOR_MODES:
+        raise ValueError(f"无效的颜色模式: {color_mode},应为 {'/'.join(COLOR_MODES)}")
+    if color_mode == "auto":
+        return is_monochrome_page(page)
+    return color_mode == "gray"
+
+
+def render_page(page, zoom, grayscale=False):
+    """
+    渲染页面为OpenCV图像
+    
+    Args:
+        page: fitz页面对象
+        zoom: 渲染倍数
+        grayscale: 按灰度颜色空间渲染为单通道图像
+        
+    Returns:
+        OpenCV图像(BGR,灰度时为单通道)
+    """
+    import fitz
+    
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+    image = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+    if grayscale:
+        return image[:, :, 0].copy()  # 像素缓冲区只读,复制一份供原地修改
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+
+class RunningStats:
+    """逐像素的累计均值和方差(Welford算法),逐个加入样本,内存与样本数无关"""
+    
+    def __init__(self, shape):
+        """
+        初始化统计
+        
+        Args:
+            shape: 样本数组的形状
+        """
+        self.count = 0
+        self.mean = np.zeros(shape, np.float32)
+        self._m2 = np.zeros(shape, np.float32)
+    
+    def add(self, sample):
+        """加入一个样本"""
+        sample = sample.astype(np.float32)
+        self.count += 1
+        delta = sample - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (sample - self.mean)
+    
+    def std(self):
+        """逐像素的样本标准差"""
+        return np.sqrt(self._m2 / max(self.count - 1, 1))
+
+
+def find_repeated_band(pdf_document, max_samples=60, sample_width=200, search_fraction=0.3,
+                       max_std=16, ink_threshold=200, min_samples=3):
+    """
+    跨页比对,找出每页相同位置都有的底部内容(广告页脚)
+    
+    以灰度低分辨率逐页渲染(页数多时均匀抽样),用 RunningStats 累计每个像素的均值和标准差;
+    均值为深色且标准差很小的像素即各页都相同的内容。在页面底部 search_fraction 范围内,
+    把含有这类像素的行按间隔不超过页面高度2%分组,相同像素最多的一组即页脚区域
+    (零星的版式线条等巧合相同的像素不会把区域拉大)。
+    
+    Args:
+        pdf_document: 已打开的fitz文档
+        max_samples: 最多抽样的页数
+        sample_width: 缩略图宽度(像素)
+        search_fraction: 在页面底部多大比例的范围内查找
+        max_std: 标准差不超过该值的像素视为各页相同
+        ink_threshold: 均值低于该值的像素视为有内容(非白色)
+        min_samples: 至少需要的样本页数
+        
+    Returns:
+        (起始位置, 结束位置),为页面高度的比例;没有找到,或各页正文也几乎相同(无法区分页脚)时返回 None
+    """
+    page_count = len(pdf_document)
+    if page_count < min_samples:
+        return None
+    if page_count <= max_samples:
+        sample = range(page_count)
+    else:
+        sample = sorted({round(k * (page_count - 1) / (max_samples - 1)) for k in range(max_samples)})
+    
+    stats = None
+    aspect = None
+    for i in sample:
+        page = pdf_document[i]
+        page_aspect = page.rect.height / page.rect.width
+        if aspect is None:
+            aspect = page_aspect
+            size = (sample_width, max(int(round(sample_width * aspect)), 1))
+            stats = RunningStats((size[1], size[0]))
+        elif abs(page_aspect - aspect) > aspect * 0.02:
+            continue  # 尺寸不同的页面(如插页)不参与比对
+        
+        thumbnail = render_page(page, sample_width / page.rect.width, grayscale=True)
+        if thumbnail.shape != stats.mean.shape:
+            thumbnail = cv2.resize(thumbnail, size, interpolation=cv2.INTER_AREA)
+        stats.add(thumbnail)
+    
+    if stats is None or stats.count < min_samples:
+        return None
+    
+    repeated = (stats.std() <= max_std) & (stats.mean < ink_threshold)
+    height = repeated.shape[0]
+    search_start = int(height * (1 - search_fraction))
+    
+    # 正文部分的内容也大多相同(如同一页重复多次)时无法区分页脚,放弃
+    body_ink = stats.mean[:search_start] < ink_threshold
+    if np.count_nonzero(body_ink) and np.count_nonzero(repeated[:search_start]) > np.count_nonzero(body_ink) * 0.5:
+        return None
+    
+    row_counts = np.count_nonzero(repeated[search_start:], axis=1)
+    rows = np.nonzero(row_counts >= 2)[0]
+    if len(rows) == 0:
+        return None
+    
+    # 按行间隔分组,取相同像素最多的一组
+    max_gap = max(int(height * 0.02), 1)
+    groups = np.split(rows, np.nonzero(np.diff(rows) > max_gap)[0] + 1)
+    band = max(groups, key=lambda group: row_counts[group].sum())
+    
+    # 上下各留一个缩略图像素的余量;接近页面底部时直接覆盖到底
+    start = max(search_start + band[0] - 1, 0) / height
+    end = min(search_start + band[-1] + 2, height) / height
+    if end > 0.97:
+        end = 1.0
+    return float(start), float(end)
+
+
+def band_rows(band, page_rect, image_rect, image_height):
+    """
+    把页面高度比例表示的区域换算为图像的行范围
+    
+    Args:
+        band: (起始位置, 结束位置),为页面高度的比例
+        page_rect: 页面矩形
+        image_rect: 图像在页面上的矩形
+        image_height: 图像高度(像素)
+        
+    Returns:
+        (起始行, 结束行)
+    """
+    scale = image_height / image_rect.height
+    start = int((page_rect.y0 + band[0] * page_rect.height - image_rect.y0) * scale)
+    end = int(np.ceil((page_rect.y0 + band[1] * page_rect.height - image_rect.y0) * scale))
+    return min(max(start, 0), image_height), min(max(end, 0), image_height)
+
+
+def locate_ad_band(image, max_fraction, work_width=400, ink_threshold=160, min_gap_fraction=0.01):
+    """
+    在底部 max_fraction 范围内,按行墨迹投影找出把页脚与正文分开的空白间隔
+    
+    在隔行隔列抽样的底部区域上统计每行的深色像素数,行投影中最长的空白段(不短于页面高度的
+    min_gap_fraction)即页脚上方的间隔,广告区域从间隔中间开始。区域内没有内容,或内容连续
+    找不到足够长的间隔时,仍使用整个 max_fraction 范围。结果不会超出 max_fraction 范围。
+    
+    Args:
+        image: OpenCV图像(BGR或单通道)
+        max_fraction: 广告区域最多占图像高度的比例
+        work_width: 抽样后的目标宽度,决定抽样步长
+        ink_threshold: 灰度低于该值的像素视为有内容
+        min_gap_fraction: 间隔最短占图像高度的比例
+        
+    Returns:
+        广告区域在图像中的起始行
+    """
+    height, width = image.shape[:2]
+    fixed_start = height - int(height * max_fraction)
+    # 抽样视图不复制数据;文字行和笔画都比抽样步长大,行投影不会漏掉内容
+    stride = max(1, width // work_width)
+    region = image[fixed_start::stride, ::stride]
+    if region.ndim == 3:
+        # 取最暗的通道,彩色文字同样计为内容
+        region = np.minimum(np.minimum(region[:, :, 0], region[:, :, 1]), region[:, :, 2])
+    
+    # 行投影;少量零星的深色像素(噪点、扫描污渍)不算内容
+    row_ink = np.count_nonzero(region < ink_threshold, axis=1) > max(region.shape[1] // 200, 1)
+    rows = np.flatnonzero(row_ink)
+    if len(rows) == 0:
+        return fixed_start
+    
+    # 空白段: 区域顶部到第一行内容,以及相邻两行内容之间;取最长的一段,一样长时取最上面的
+    gap_starts = np.concatenate(([0], rows[:-1] + 1))
+    gap_lengths = np.concatenate(([rows[0]], np.diff(rows) - 1))
+    best = int(np.argmax(gap_lengths))
+    if gap_lengths[best] * stride < height * min_gap_fraction:
+        return fixed_start
+    return fixed_start + int(gap_starts[best] + gap_lengths[best] // 2) * stride
+
+
+def encode_page_image(image, ext="png", grayscale=False, jpeg_quality=95):
+    """
+    按原图格式重新编码处理后的图片
+    
+    Args:
+        image: OpenCV图像(BGR或单通道)
+        ext: 原图格式扩展名,为 jpeg/jpg 时编码为JPEG,否则为PNG
+        grayscale: 是否按灰度编码
+        jpeg_quality: JPEG质量
+        
+    Returns:
+        编码后的图片字节
+    """
+    if grayscale:
+        image = to_gray(image)
+    
+    if ext in ("jpeg", "jpg"):
+        ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    else:
+        ok, data = cv2.imencode(".png", image)
+    if not ok:
+        raise ValueError("图片编码失败")
+    return data.tobytes()
+
+
+class PDFAdRemover:
+    # 底部区域预筛选的阈值,可按 prefilter_counts 的统计调整
+    PREFILTER_STRIDE = 4            # 隔行隔列抽样的步长
+    PREFILTER_INK_LEVEL = 160       # 灰度低于该值的像素视为墨迹
+    PREFILTER_EMPTY_STD = 4.0       # 没有墨迹且灰度标准差不超过该值: 一定是空白
+    PREFILTER_AD_INK_RATIO = 0.01   # 墨迹像素占比不低于该值: 一定有内容
+    
+    def __init__(self, ad_height_percent=0.15, memory_budget=None, use_native_images=True, optimize_output=False, cache=None,
+                 color_mode="auto", text_detector="components", footer_consensus=False, prefilter=True,
+                 adaptive_band=False, pipeline_workers=2):
+        """
+        初始化广告移除器
+        
+        Args:
+            ad_height_percent: 广告区域占图片高度的百分比,默认15%;adaptive_band 为True时是广告区域的上限
+            memory_budget: MemoryBudget对象,为None时使用默认预算
+            use_native_images: 整页只有一张图片的页面(扫描件)直接取出原图按原始分辨率处理,不重新渲染
+            optimize_output: 输出PDF时使用优化保存模式(重复图片只嵌入一次、对象流、压缩)
+            cache: ResultCache对象,生成PDF时复用内容和参数都未变化的页面的处理结果;为None时不使用缓存
+            color_mode: 颜色模式,"gray" 按灰度渲染并以单通道处理和编码(内存和输出更小),"color" 按彩色处理,
+                "auto" 按页面饱和度逐页选择
+            text_detector: 底部文字检测方式,"components" 在缩小的底部区域上做连通域分析(默认),
+                "lines" 先横向膨胀把文字合并成行再做连通域分析,"contours" 为原来的全分辨率轮廓检测
+            footer_consensus: 生成PDF前先跨页比对找出各页相同的底部页脚(find_repeated_band),
+                找到时直接覆盖该区域,不再逐页检测;找不到时仍逐页检测
+            prefilter: 检测前先用抽样的墨迹占比和方差快速判断底部区域,明显空白或明显有内容时不运行二维码和文字检测
+            adaptive_band: 逐页按行墨迹投影找出页脚上方的空白间隔(locate_ad_band),只检测和覆盖间隔以下的部分,
+                不再固定使用 ad_height_percent 的高度
+            pipeline_workers: 批量处理时处理和编码阶段各自的线程数(见 PagePipeline),与渲染下一页同时进行;
+                为0时逐页依次处理。流水线深度为 memory_budget.max_pages_in_flight
+        """
+        if color_mode not in COLOR_MODES:
+            raise ValueError(f"无效的颜色模式: {color_mode},应为 {'/'.join(COLOR_MODES)}")
+        if text_detector not in TEXT_DETECTORS:
+            raise ValueError(f"无效的文字检测方式: {text_detector},应为 {'/'.join(TEXT_DETECTORS)}")
+        self.ad_height_percent = ad_height_percent
+        self.memory_budget = memory_budget or MemoryBudget()
+        self.use_native_images = use_native_images
+        self.optimize_output = optimize_output
+        self.cache = cache
+        self.color_mode = color_mode
+        self.text_detector = text_detector
+        self.footer_consensus = footer_consensus
+        self.prefilter = prefilter
+        self.adaptive_band = adaptive_band
+        self.pipeline_workers = pipeline_workers
+        self.prefilter_counts = {'empty': 0, 'ad': 0, 'ambiguous': 0}  # 预筛选的判断次数
+        self._prefilter_lock = threading.Lock()  # 流水线的多个处理线程同时计数
+        self.last_report = None  # 最近一次批量处理的运行报告
+    
+    def fit_render_zoom(self, page, zoom, page_num, reduced_dpi_pages, channels=3):
+        """
+        按内存预算确定页面的渲染倍数
+        
+        Args:
+            page: fitz页面对象
+            zoom: 期望的渲染倍数
+            page_num: 页码
+            reduced_dpi_pages: 降低了DPI的页码列表,降低时追加当前页
+            channels: 颜色通道数,灰度处理时为1
+            
+        Returns:
+            实际使用的渲染倍数
+        """
+        fitted = self.memory_budget.fit_zoom(page.rect.width, page.rect.height, zoom, channels)
+        if fitted < zoom:
+            reduced_dpi_pages.append(page_num)
+            print(f"  第{page_num+1}页按 {zoom * 72:.0f} DPI 渲染会超出内存预算,降为 {fitted * 72:.0f} DPI")
+        return fitted
+    
+    def detect_qrcode(self, image):
+        """
+        检测图片中的二维码
+        
+        Args:
+            image: OpenCV图像对象
+            
+        Returns:
+            二维码位置列表 [(x, y, w, h), ...]
+        """
+        detector = cv2.QRCodeDetector()
+        value, points, straight_qrcode = detector.detectAndDecode(image)
+        
+        if points is not None:
+            # 转换points为矩形坐标
+            points = points.astype(int)
+            x = int(np.min(points[:, 0]))
+            y = int(np.min(points[:, 1]))
+            w = int(np.max(points[:, 0]) - x)
+            h = int(np.max(points[:, 1]) - y)
+            return [(x, y, w, h)]
+        return []
+    
+    def detect_text_area(self, image, bottom_region):
+        """
+        检测底部区域的文字区域
+        
+        Args:
+            image: 完整图像
+            bottom_region: 底部区域图像
+            
+        Returns:
+            文字区域列表 [(x, y, w, h), ...],坐标为完整图像的坐标
+        """
+        if self.text_detector == "contours":
+            return self.detect_text_contours(image, bottom_region)
+        return self.detect_text_components(image, bottom_region, text_lines=self.text_detector == "lines")
+    
+    def detect_text_components(self, image, bottom_region, text_lines=False, min_width=50, min_height=10, work_width=250):
+        """
+        用连通域分析检测底部区域的文字区域
+        
+        在缩小后的底部区域上做 connectedComponentsWithStats,用统计数组一次筛掉过小的区域,
+        再把边界框换算回全分辨率坐标。
+        
+        Args:
+            image: 完整图像
+            bottom_region: 底部区域图像
+            text_lines: 为False时与 detect_text_contours() 一样对二值化后的白色区域做分析,检测结果一致;
+                为True时对深色文字做分析,先横向膨胀把同一行的文字连成一片,按文字行检测
+            min_width: 区域最小宽度(全分辨率像素)
+            min_height: 区域最小高度(全分辨率像素)
+            work_width: 缩小后的目标宽度,底部区域更窄时不缩小
+            
+        Returns:
+            文字区域列表 [(x, y, w, h), ...],坐标为完整图像的坐标
+        """
+        gray = to_gray(bottom_region)
+        height, width = gray.shape
+        
+        # 按整数倍缩小,区域面积平均保留细小文字的灰度;裁掉不足一格的边缘,使 INTER_AREA 走整数倍的快速路径
+        factor = max(1, min(width // work_width, height))
+        if factor > 1:
+            small_height, small_width = height // factor, width // factor
+            gray = cv2.resize(
+                gray[:small_height * factor, :small_width * factor],
+                (small_width, small_height),
+                interpolation=cv2.INTER_AREA
+            )
+        
+        if text_lines:
+            # 深色文字为前景,横向膨胀连接同一行中的字符(间距约为全分辨率下的20像素)
+            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            run = max(3, 20 // factor)
+            binary = cv2.dilate(binary, cv2.getStructuringElement(cv2.MORPH_RECT, (run, 1)))
+        else:
+            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        
+        # 第0个连通域是背景;按全分辨率尺寸筛选
+        boxes = stats[1:, :4] * factor
+        keep = (boxes[:, 2] > min_width) & (boxes[:, 3] > min_height)
+        boxes = boxes[keep]
+        boxes[:, 1] += image.shape[0] - height  # 底部区域内的坐标 -> 完整图像坐标
+        return [tuple(box) for box in boxes.tolist()]
+    
+    def detect_text_contours(self, image, bottom_region):
+        """
+        用轮廓检测底部区域的文字区域(原实现,在全分辨率上处理)
+        
+        Args:
+            image: 完整图像
+            bottom_region: 底部区域图像
+            
+        Returns:
+            文字区域列表 [(x, y, w, h), ...],坐标为完整图像的坐标
+        """
+        # 转换为灰度图
+        gray = to_gray(bottom_region)
+        
+        # 二值化
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        
+        # 使用形态学操作检测文字区域
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        morph = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=2)
+        
+        # 查找轮廓
+        contours, _ = cv2.findContours(morph, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        text_regions = []
+        bottom_start = image.shape[0] - bottom_region.shape[0]
+        
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            # 调整y坐标到原图坐标系
+            y_absolute = bottom_start + y
+            
+            # 过滤掉太小的区域
+            if w > 50 and h > 10:
+                text_regions.append((x, y_absolute, w, h))
+        
+        return text_regions
+    
+    def remove_advertisement(self, image_path, output_path=None):
+        """
+        移除图片底部的广告文字和二维码
+        
+        Args:
+            image_path: 输入图片路径
+            output_path: 输出图片路径,如果为None则覆盖原文件
+            
+        Returns:
+            处理后的图片路径
+        """
+        # 读取图片
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"无法读取图片: {image_path}")
+        
+        image = self.clean_image(image)
+        
+        # 保存结果
+        if output_path is None:
+            output_path = image_path
+        
+        cv2.imwrite(output_path, image)
+        return output_path
+    
+    def detect_advertisement(self, image, bottom_start=None):
+        """
+        检测图像底部的广告文字和二维码
+        
+        Args:
+            image: OpenCV图像对象
+            bottom_start: 底部区域的起始行(ad_band_start() 的结果),为None时计算
+            
+        Returns:
+            检测到的广告区域列表(二维码 + 文字),为空表示该页无需处理
+        """
+        height, width = image.shape[:2]
+        if bottom_start is None:
+            bottom_start = self.ad_band_start(image)
+        
+        # 提取底部区域
+        bottom_region = image[bottom_start:height, 0:width]
+        
+        # 先快速预筛选,只有无法判断时才运行下面的检测
+        if self.prefilter:
+            decision = self.prefilter_band(bottom_region)
+            with self._prefilter_lock:
+                self.prefilter_counts[decision] += 1
+            if decision == "empty":
+                return []
+            if decision == "ad":
+                return [(0, bottom_start, width, height - bottom_start)]
+        
+        # 检测二维码
+        qrcode_regions = self.detect_qrcode(bottom_region)
+        
+        # 检测文字区域
+        text_regions = self.detect_text_area(image, bottom_region)
+        
+        # 合并所有需要移除的区域
+        return qrcode_regions + text_regions
+    
+    def prefilter_band(self, bottom_region):
+        """
+        在隔行隔列抽样的底部区域上统计墨迹占比和灰度方差,快速判断
+        
+        Args:
+            bottom_region: 底部区域图像
+            
+        Returns:
+            "empty" 一定是空白, "ad" 一定有内容(整个区域都要覆盖), "ambiguous" 需要进一步检测
+        """
+        stride = self.PREFILTER_STRIDE
+        sample = bottom_region[::stride, ::stride]
+        if sample.size == 0:
+            return "empty"
+        if sample.ndim == 3:
+            # 取最暗的通道,彩色文字同样计为墨迹(逐通道比较,比 min(axis=2) 在抽样视图上快得多)
+            sample = np.minimum(np.minimum(sample[:, :, 0], sample[:, :, 1]), sample[:, :, 2])
+        
+        ink_ratio = np.count_nonzero(sample < self.PREFILTER_INK_LEVEL) / sample.size
+        if ink_ratio >= self.PREFILTER_AD_INK_RATIO:
+            return "ad"
+        if ink_ratio == 0 and cv2.meanStdDev(sample)[1][0, 0] <= self.PREFILTER_EMPTY_STD:
+            return "empty"
+        return "ambiguous"
+    
+    def reset_prefilter_counts(self):
+        """清零预筛选的判断次数"""
+        self.prefilter_counts = {'empty': 0, 'ad': 0, 'ambiguous': 0}
+    
+    def add_prefilter_report(self):
+        """把预筛选的判断次数写入运行报告并输出"""
+        self.last_report['prefilter'] = dict(self.prefilter_counts)
+        if self.prefilter:
+            counts = self.prefilter_counts
+            print(f"底部区域预筛选: 空白 {counts['empty']}, 有内容 {counts['ad']}, 需检测 {counts['ambiguous']}")
+    
+    def clean_image(self, image, regions=None, bottom_start=None):
+        """
+        移除图像底部的广告文字和二维码
+        
+        Args:
+            image: OpenCV图像对象,会被原地修改
+            regions: detect_advertisement() 的检测结果,为None时重新检测
+            bottom_start: 底部区域的起始行(ad_band_start() 的结果),为None时计算
+            
+        Returns:
+            处理后的图像
+        """
+        # 自适应底部区域要分析整页图像,每页只计算一次,检测和覆盖共用
+        if bottom_start is None:
+            bottom_start = self.ad_band_start(image)
+        if regions is None:
+            regions = self.detect_advertisement(image, bottom_start)
+        
+        # 检测到广告内容时覆盖整个底部区域
+        if regions:
+            image[bottom_start:] = 255
+        
+        return image
+    
+    def ad_band_start(self, image):
+        """底部广告区域在图像中的起始行"""
+        if self.adaptive_band:
+            return locate_ad_band(image, self.ad_height_percent)
+        height = image.shape[0]
+        return height - int(height * self.ad_height_percent)
+    
+    @holds_fitz_lock
+    def batch_process_pdf_images(self, pdf_path, output_dir=None, progress_callback=None, cancel_token=None, pages=None):
+        """
+        批量处理PDF中的所有图片
+        
+        Args:
+            pdf_path: PDF文件路径
+            output_dir: 输出目录,如果为None则在原目录创建"cleaned"子目录
+            progress_callback: 进度回调函数,参数为进度字典(见 ProgressTracker)
+            cancel_token: CancelToken对象,取消时抛出 ProcessingCancelled 并删除本次已生成的图片
+            pages: 要处理的页码 range(从0开始),为None时处理全部页面
+            
+        Returns:
+            处理后的图片路径列表
+        """
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            print("请先安装pymupdf: pip install pymupdf")
+            return []
+        
+        cancel_token = cancel_token or CancelToken()
+        
+        # 设置输出目录
+        if output_dir is None:
+            base_dir = os.path.dirname(pdf_path)
+            output_dir = os.path.join(base_dir, "cleaned")
+        
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        
+        # 打开PDF文件
+        print(f"正在打开PDF: {pdf_path}")
+        pdf_document = fitz.open(pdf_path)
+        try:
+            pages = resolve_pages(pages, len(pdf_document))
+        except ValueError:
+            pdf_document.close()
+            raise
+        tracker = ProgressTracker(len(pages), progress_callback)
+        self.reset_prefilter_counts()
+        
+        processed_images = []
+        written_images = []  # 已写出的图片,包括流水线中尚未取回的
+        reduced_dpi_pages = []
+        native_pages = []
+        native_sizes = {}
+        
+        # 处理阶段去广告,编码阶段编码并写出PNG,都与渲染下一页同时进行
+        def write_image(item):
+            output_path, image = item
+            if not cv2.imwrite(output_path, image):
+                raise ValueError(f"无法写入图片: {output_path}")
+            written_images.append(output_path)
+            return output_path
+        
+        pipeline = PagePipeline(
+            lambda item: (item[0], self.clean_image(item[1])),
+            write_image,
+            self.memory_budget.max_pages_in_flight,
+            self.pipeline_workers
+        )
+        
+        def finish_page(i, output_path):
+            processed_images.append(output_path)
+            tracker.update(bytes_written=os.path.getsize(output_path))
+            if i in native_sizes:
+                width, height = native_sizes.pop(i)
+                print(f"已处理第 {i+1}/{len(pdf_document)} 页 (原图 {width}x{height})")
+            else:
+                print(f"已处理第 {i+1}/{len(pdf_document)} 页")
+        
+        try:
+            for i in pages:
+                cancel_token.check()
+                with pipeline.stage("render"):
+                    page = pdf_document[i]
+                    # 黑白页面按灰度处理,渲染、去广告和写出PNG都是单通道
+                    gray = use_grayscale(page, self.color_mode)
+                    
+                    # 整页单图(扫描件): 直接取出原图,按原始分辨率处理
+                    native = None
+                    if self.use_native_images:
+                        native = extract_page_image(page, self.memory_budget, gray)
+                    if native is not None:
+                        image = native[0]
+                        native_pages.append(i)
+                        native_sizes[i] = (image.shape[1], image.shape[0])
+                    else:
+                        # 将页面转换为图片
+                        channels = 1 if gray else 3
+                        zoom = self.fit_render_zoom(page, 2, i, reduced_dpi_pages, channels)  # 放大倍数,提高清晰度
+                        image = render_page(page, zoom, gray)
+                
+                pipeline.submit(i, (os.path.join(output_dir, f"page_{i}.png"), image))
+                for page_num, output_path in pipeline.results():
+                    finish_page(page_num, output_path)
+            
+            for page_num, output_path in pipeline.results(wait_all=True):
+                finish_page(page_num, output_path)
+        except ProcessingCancelled:
+            # 取消时不留下不完整的输出
+            pipeline.close()
+            for path in written_images:
+                remove_quietly(path)
+            print("处理已取消,已删除本次生成的图片")
+            raise
+        finally:
+            pipeline.close()
+            pdf_document.close()
+        
+        self.last_report = add_memory_report(tracker.finish(), self.memory_budget, reduced_dpi_pages)
+        self.last_report['native_pages'] = native_pages
+        self.add_prefilter_report()
+        add_pipeline_report(self.last_report, pipeline)
+        return processed_images
+    
+    def cache_params(self, page, footer_band=None):
+        """
+        影响页面处理结果的参数,作为缓存键的一部分
+        
+        Args:
+            page: fitz页面对象
+            footer_band: 跨页比对得到的页脚区域,没有时为None
+            
+        Returns:
+            参数字典
+        """
+        return {
+            'engine': type(self).__name__,
+            'ad_height_percent': self.ad_height_percent,
+            'adaptive_band': self.adaptive_band,
+            'use_native_images': self.use_native_images,
+            'color_mode': self.color_mode,
+            'text_detector': self.text_detector,
+            'prefilter': self.prefilter and [
+                self.PREFILTER_STRIDE, self.PREFILTER_INK_LEVEL, self.PREFILTER_EMPTY_STD, self.PREFILTER_AD_INK_RATIO
+            ],
+            'footer_band': footer_band and [round(value, 6) for value in footer_band],
+            'render_zoom': self.memory_budget.fit_zoom(page.rect.width, page.rect.height, 2),
+            'page_allowance': self.memory_budget.page_allowance()
+        }
+    
+    def load_page(self, page, page_num, reduced_dpi_pages):
+        """
+        取出页面图像(流水线的渲染阶段,使用fitz,只能在调用线程中进行)
+        
+        Args:
+            page: fitz页面对象
+            page_num: 页码
+            reduced_dpi_pages: 降低了DPI的页码列表
+            
+        Returns:
+            (图像, 图片在页面上的矩形, 原图尺寸(宽, 高), 编码格式, 是否按灰度编码);
+            页面是渲染得到的时原图尺寸为None
+        """
+        import fitz
+        
+        # 黑白页面按灰度处理,全程单通道
+        gray = use_grayscale(page, self.color_mode)
+        
+        # 整页单图(扫描件)直接取出原图,按原始分辨率处理;其他页面渲染为图片
+        native = extract_page_image(page, self.memory_budget, gray) if self.use_native_images else None
+        if native is not None:
+            image, info, ext, grayscale = native
+            image_rect = fitz.Rect(info['bbox'])
+            native_size = [image.shape[1], image.shape[0]]
+        else:
+            channels = 1 if gray else 3
+            zoom = self.fit_render_zoom(page, 2, page_num, reduced_dpi_pages, channels)  # 放大倍数,提高清晰度
+            image = render_page(page, zoom, gray)
+            ext, grayscale = "png", gray
+            image_rect = page.rect
+            native_size = None
+        return image, image_rect, native_size, ext, grayscale
+    
+    def clean_loaded_page(self, image, page_rect, image_rect, footer_band=None):
+        """
+        去除已取出的页面图像中的广告(流水线的处理阶段,不使用fitz,可在工作线程中进行)
+        
+        Args:
+            image: load_page() 取出的图像,会被原地修改
+            page_rect: 页面矩形
+            image_rect: 图片在页面上的矩形
+            footer_band: find_repeated_band() 得到的页脚区域,指定时直接覆盖该区域,不逐页检测
+            
+        Returns:
+            处理后的图像,页面无需处理时返回 None
+        """
+        # 已跨页确定页脚位置: 直接覆盖,页脚区域本来就是纯白时无需处理
+        if footer_band is not None:
+            start, end = band_rows(footer_band, page_rect, image_rect, image.shape[0])
+            if np.all(image[start:end] == 255):
+                return None
+            image[start:end] = 255
+            return image
+        
+        # 没有检测到广告,或底部区域本来就是纯白(覆盖后不会有变化)时无需处理
+        bottom_start = self.ad_band_start(image)
+        regions = self.detect_advertisement(image, bottom_start)
+        if not regions or np.all(image[bottom_start:] == 255):
+            return None
+        return self.clean_image(image, regions, bottom_start)
+    
+    @holds_fitz_lock
+    def batch_process_pdf_to_pdf(self, pdf_path, output_pdf_path=None, progress_callback=None, cancel_token=None, pages=None):
+        """
+        批量处理PDF并生成新的PDF文件
+        
+        Args:
+            pdf_path: 输入PDF文件路径
+            output_pdf_path: 输出PDF文件路径,如果为None则在原目录添加"_cleaned"后缀
+            progress_callback: 进度回调函数,参数为进度字典(见 ProgressTracker)
+            cancel_token: CancelToken对象,取消时抛出 ProcessingCancelled,不会留下输出文件
+            pages: 要处理的页码 range(从0开始),为None时处理全部页面;指定时输出为带分片元数据的分片PDF
+            
+        Returns:
+            处理后的PDF文件路径
+        """
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            print("请先安装pymupdf: pip install pymupdf")
+            return None
+        
+        cancel_token = cancel_token or CancelToken()
+        
+        # 设置输出PDF路径
+        if output_pdf_path is None:
+            base_name = os.path.splitext(pdf_path)[0]
+            if pages is None:
+                output_pdf_path = f"{base_name}_cleaned.pdf"
+            else:
+                output_pdf_path = f"{base_name}_cleaned_{format_page_range(pages)}.pdf"
+        
+        # 打开PDF文件
+        print(f"正在打开PDF: {pdf_path}")
+        pdf_document = fitz.open(pdf_path)
+        
+        try:
+            # 只处理部分页面时,输出记录页码范围,供合并时检查
+            metadata = None if pages is None else shard_metadata(pages, len(pdf_document))
+            pages = resolve_pages(pages, len(pdf_document))
+        except ValueError:
+            pdf_document.close()
+            raise
+        
+        # 创建新的PDF文档,按内存预算增量写入临时文件,完成后再替换,取消或失败时不会留下半成品
+        output_pdf = IncrementalPDFWriter(
+            output_pdf_path,
+            self.memory_budget,
+            optimize=self.optimize_output,
+            metadata=metadata
+        )
+        tracker = ProgressTracker(len(pages), progress_callback)
+        
+        reduced_dpi_pages = []
+        native_pages = []
+        passthrough_pages = []
+        cached_pages = []
+        stream_hashes = {}  # 多页共用的图片等资源只计算一次哈希
+        self.reset_prefilter_counts()
+        if self.cache is not None:
+            self.cache.reset_stats()
+        
+        # 先跨页比对找出重复的页脚;抽样范围为整个文档,各分片得到的结果一致
+        footer_band = None
+        if self.footer_consensus:
+            footer_band = find_repeated_band(pdf_document)
+            if footer_band is not None:
+                print(f"跨页比对找到重复页脚: 页面高度的 {footer_band[0]:.1%} - {footer_band[1]:.1%},直接覆盖")
+            else:
+                print("跨页比对没有找到重复页脚,逐页检测")
+        
+        # 处理阶段去广告,编码阶段按原图格式重新编码(渲染的页面用PNG保持清晰度),都与渲染下一页同时进行
+        def process(item):
+            image, page_rect, image_rect, ext, grayscale = item
+            cleaned = self.clean_loaded_page(image, page_rect, image_rect, footer_band)
+            return None if cleaned is None else (cleaned, ext, grayscale)
+        
+        pipeline = PagePipeline(
+            process,
+            lambda item: encode_page_image(*item),
+            self.memory_budget.max_pages_in_flight,
+            self.pipeline_workers
+        )
+        page_info = {}  # 页码 -> (图片在页面上的矩形, 原图尺寸, 缓存键),写入该页时使用
+        
+        def write_page(i, image_data):
+            image_rect, native_size, cache_key = page_info.pop(i)
+            if cache_key is not None:
+                meta = {'passthrough': image_data is None, 'rect': list(image_rect), 'native_size': native_size}
+                self.cache.put(cache_key, meta, image_data or b"")
+            
+            # 没有需要移除的内容: 原样复制源页面,不重新编码
+            if image_data is None:
+                output_pdf.copy_page(pdf_document, i)
+                passthrough_pages.append(i)
+                tracker.update()
+                print(f"已处理第 {i+1}/{len(pdf_document)} 页 (无广告,原样复制)")
+                return
+            
+            # 创建新页面;原图按原来的位置插回,图片正向放置时边界矩形即等价于原放置矩阵
+            page_rect = pdf_document[i].rect
+            new_page = output_pdf.new_page(
+                width=page_rect.width,
+                height=page_rect.height
+            )
+            output_pdf.insert_image(new_page, image_rect, image_data, keep_proportion=False)
+            output_pdf.page_done(len(image_data))
+            
+            tracker.update(bytes_written=len(image_data))
+            if native_size is not None:
+                native_pages.append(i)
+                print(f"已处理第 {i+1}/{len(pdf_document)} 页 (原图 {native_size[0]}x{native_size[1]})")
+            else:
+                print(f"已处理第 {i+1}/{len(pdf_document)} 页")
+        
+        try:
+            for i in pages:
+                cancel_token.check()
+                with pipeline.stage("render"):
+                    page = pdf_document[i]
+                    
+                    # 页面内容和处理参数都没变时直接使用缓存的结果
+                    cached = None
+                    cache_key = None
+                    if self.cache is not None:
+                        cache_key = self.cache.make_key(page_content_hash(page, stream_hashes), self.cache_params(page, footer_band))
+                        cached = self.cache.get(cache_key)
+                    if cached is not None:
+                        meta, image_data = cached
+                        page_info[i] = (fitz.Rect(meta['rect']), meta['native_size'], None)
+                        cached_pages.append(i)
+                    else:
+                        image, image_rect, native_size, ext, grayscale = self.load_page(page, i, reduced_dpi_pages)
+                        page_info[i] = (image_rect, native_size, cache_key)
+                
+                if cached is not None:
+                    pipeline.put_result(i, None if meta['passthrough'] else image_data)
+                else:
+                    pipeline.submit(i, (image, page.rect, image_rect, ext, grayscale))
+                for page_num, image_data in pipeline.results():
+                    with pipeline.stage("write"):
+                        write_page(page_num, image_data)
+            
+            for page_num, image_data in pipeline.results(wait_all=True):
+                cancel_token.check()
+                with pipeline.stage("write"):
+                    write_page(page_num, image_data)
+            
+            # 保存输出PDF
+            cancel_token.check()
+            output_pdf.commit()
+        except BaseException:
+            output_pdf.abort()
+            raise
+        finally:
+            pipeline.close()
+            pdf_document.close()
+        
+        self.last_report = add_memory_report(
+            tracker.finish(bytes_written=os.path.getsize(output_pdf_path)),
+            self.memory_budget,
+            reduced_dpi_pages,
+            output_pdf.flush_count
+        )
+        self.last_report['native_pages'] = native_pages
+        self.last_report['passthrough_pages'] = passthrough_pages
+        self.last_report['footer_band'] = footer_band
+        self.add_prefilter_report()
+        add_pipeline_report(self.last_report, pipeline)
+        if passthrough_pages:
+            print(f"无需处理、原样复制的页数: {len(passthrough_pages)}")
+        if self.cache is not None:
+            self.last_report['cached_pages'] = cached_pages
+            self.last_report.update(self.cache.report())
+            print(f"使用缓存结果的页数: {len(cached_pages)}/{len(pages)}")
+        add_size_report(self.last_report, output_pdf)
+        
+        print(f"处理完成! 输出文件: {output_pdf_path}")
+        return output_pdf_path
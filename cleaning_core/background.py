@@ -0,0 +1,35 @@
+"""
+打印图片的背景处理
+去除扫描或拍摄的打印图片中的深色背景,只保留文字和线条等前景内容,背景变为白色。
+不依赖界面,图片背景处理工具和批量脚本共用。
+"""
+
+from typing import TYPE_CHECKING
+from lazy_modules import lazy_import
+
+lazy_import(globals(), cv2="cv2", np="numpy")
+if TYPE_CHECKING:
+    import cv2
+    import numpy as np
+
+
+def remove_black_background(image, block_size, c_value):
+    """
+    移除黑色背景,保留前景内容(支持BGR和单通道灰度图像)
+    
+    Args:
+        image: OpenCV图像
+        block_size: 自适应阈值的邻域大小,必须为奇数
+        c_value: 自适应阈值从邻域均值中减去的常数,越大保留的前景越少
+        
+    Returns:
+        处理后的图像,形状与输入相同
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY_INV, block_size, c_value)
+    white_background = np.ones_like(image, dtype=np.uint8) * 255
+    result = cv2.bitwise_and(image, image, mask=thresh)
+    result = cv2.add(result, white_background, mask=cv2.bitwise_not(thresh))
+    return result
@@ -0,0 +1,661 @@
+"""
+按保留区域处理PDF的核心
+KeepRegions 保存要保留的区域(全局区域 + 单页覆盖),KeepRegionRemover 按这些区域裁剪每页并去除白边。
+不依赖界面,交互式标注工具和服务进程共用。
+"""
+
+import os
+from typing import TYPE_CHECKING
+from pdf_shards import resolve_pages, shard_metadata, format_page_range
+from result_cache import page_content_hash
+from lazy_modules import lazy_import
+from cleaning_core.ad_remover import (
+    ProgressTracker, CancelToken, PagePipeline, add_pipeline_report, MemoryBudget, IncrementalPDFWriter,
+    add_memory_report, add_size_report, extract_page_image, encode_page_image, COLOR_MODES, use_grayscale,
+    render_page, to_gray, holds_fitz_lock
+)
+
+lazy_import(globals(), cv2="cv2", np="numpy")
+if TYPE_CHECKING:
+    import cv2
+    import numpy as np
+
+
+def page_to_pixel_matrix(rotation_matrix, zoom):
+    """
+    组合页面旋转矩阵和渲染倍数,得到 点坐标 -> 渲染像素 的变换矩阵
+    
+    Args:
+        rotation_matrix: 页面的 page.rotation_matrix,(a, b, c, d, e, f)
+        zoom: 渲染倍数 (DPI / 72)
+        
+    Returns:
+        变换矩阵 (a, b, c, d, e, f)
+    """
+    return tuple(value * zoom for value in rotation_matrix)
+
+
+def invert_matrix(matrix):
+    """求 (a, b, c, d, e, f) 变换矩阵的逆矩阵"""
+    a, b, c, d, e, f = matrix
+    det = a * d - b * c
+    return (
+        d / det, -b / det, -c / det, a / det,
+        (c * f - d * e) / det, (b * e - a * f) / det
+    )
+
+
+def transform_regions(regions, matrix):
+    """
+    用 (a, b, c, d, e, f) 矩阵变换区域数组,与 fitz.Rect * fitz.Matrix 的结果一致
+    
+    Args:
+        regions: 区域数组,形状为 (N, 4),每行为 (x1, y1, x2, y2)
+        matrix: 变换矩阵
+        
+    Returns:
+        变换后的区域数组,坐标已规范化为 x1 <= x2, y1 <= y2
+    """
+    a, b, c, d, e, f = matrix
+    regions = np.asarray(regions, dtype=np.float64).reshape(-1, 4)
+    xs = regions[:, [0, 2, 0, 2]]
+    ys = regions[:, [1, 1, 3, 3]]
+    tx = xs * a + ys * c + e
+    ty = xs * b + ys * d + f
+    return np.stack([tx.min(axis=1), ty.min(axis=1), tx.max(axis=1), ty.max(axis=1)], axis=1)
+
+
+def _first_ink_line(ink, noise_tolerance, axis, reverse=False):
+    """在墨迹掩码的若干行(axis=1)或列(axis=0)中查找第一条墨迹像素数超过容差的线,找不到返回 None"""
+    counts = np.count_nonzero(ink, axis=axis)
+    hits = np.flatnonzero(counts > noise_tolerance)
+    if len(hits) == 0:
+        return None
+    return int(hits[-1] if reverse else hits[0])
+
+
+def find_content_bbox(image, white_threshold=250, noise_tolerance=0, coarse_factor=4):
+    """
+    用行/列投影查找非白色内容的边界框
+    
+    先在按 coarse_factor 做最小值池化的小图上定位内容所在的块,
+    再只在边缘块内用全分辨率的行/列投影精确定位,避免生成所有墨迹像素的坐标列表。
+    
+    Args:
+        image: OpenCV图像(BGR或灰度)
+        white_threshold: 灰度值大于该值视为白色,调低可忽略近白色的底噪
+        noise_tolerance: 一行/一列中墨迹像素数不超过该值时视为空白,用于忽略扫描灰尘和斑点
+        coarse_factor: 粗扫描的下采样倍数,1 表示直接在全分辨率上计算投影
+        
+    Returns:
+        边界框 (x, y, w, h),整张图都是白色时返回 None
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    
+    if coarse_factor <= 1 or min(height, width) < coarse_factor * 2:
+        ink = gray <= white_threshold
+        top = _first_ink_line(ink, noise_tolerance, axis=1)
+        if top is None:
+            return None
+        bottom = _first_ink_line(ink, noise_tolerance, axis=1, reverse=True)
+        left = _first_ink_line(ink, noise_tolerance, axis=0)
+        right = _first_ink_line(ink, noise_tolerance, axis=0, reverse=True)
+        if left is None:
+            return None
+        return (left, top, right - left + 1, bottom - top + 1)
+    
+    f = coarse_factor
+    
+    # 粗扫描: 每个 f×f 块取最小灰度值,块内有任何墨迹即视为墨迹块
+    kernel = np.ones((f, f), np.uint8)
+    coarse = cv2.erode(gray, kernel, anchor=(0, 0), borderType=cv2.BORDER_REPLICATE)[::f, ::f]
+    coarse_ink = coarse <= white_threshold
+    
+    # 一行中超过 noise_tolerance 个墨迹像素至少落在 noise_tolerance // f + 1 个块中,
+    # 因此粗扫描排除的块行/块列一定不含超过容差的行/列
+    block_tolerance = noise_tolerance // f
+    row_blocks = np.flatnonzero(np.count_nonzero(coarse_ink, axis=1) > block_tolerance)
+    col_blocks = np.flatnonzero(np.count_nonzero(coarse_ink, axis=0) > block_tolerance)
+    if len(row_blocks) == 0 or len(col_blocks) == 0:
+        return None
+    
+    def refine(blocks, axis, reverse):
+        # 从外向内逐块精确查找,通常第一个块就能命中
+        for block in (blocks[::-1] if reverse else blocks):
+            start = block * f
+            if axis == 1:
+                ink = gray[start:start + f] <= white_threshold
+            else:
+                ink = gray[:, start:start + f] <= white_threshold
+            line = _first_ink_line(ink, noise_tolerance, axis=axis, reverse=reverse)
+            if line is not None:
+                return int(start + line)
+        return None
+    
+    top = refine(row_blocks, axis=1, reverse=False)
+    if top is None:
+        return None
+    bottom = refine(row_blocks, axis=1, reverse=True)
+    left = refine(col_blocks, axis=0, reverse=False)
+    right = refine(col_blocks, axis=0, reverse=True)
+    if left is None:
+        return None
+    return (left, top, right - left + 1, bottom - top + 1)
+
+
+class KeepRegions:
+    """
+    保留区域集合 - 全局区域 + 单页增加的区域 + 单页排除的全局区域
+    
+    全局区域对所有页生效,只保存一份;某页生效的区域为未在该页排除的全局区域加上该页自己的区域。
+    之后添加或删除的全局区域同样作用于单独框选过的页,与逐页保存列表时的行为相同。
+    区域以 NumPy 数组存储,形状为 (N, 4),每行为 (x1, y1, x2, y2),
+    单位为 PDF 点(1/72 英寸),坐标系为未旋转的页面坐标,与渲染分辨率无关。
+    增删区域的开销与页数无关。
+    """
+    
+    def __init__(self):
+        self.global_regions = self._empty()
+        self.global_ids = np.empty(0, dtype=np.int64)  # 全局区域的编号,不随其他区域的删除改变
+        self.page_extras = {}    # 单页增加的区域 {页码: ndarray}
+        self.page_excluded = {}  # 单页删除的全局区域 {页码: {全局区域编号, ...}}
+        self._next_id = 0
+    
+    @staticmethod
+    def _empty():
+        return np.empty((0, 4), dtype=np.float64)
+    
+    @staticmethod
+    def _as_row(region):
+        """把 (x1, y1, x2, y2) 或 {'x1':, 'y1':, 'x2':, 'y2':} 转换为单行数组"""
+        if isinstance(region, dict):
+            region = (region['x1'], region['y1'], region['x2'], region['y2'])
+        return np.asarray(region, dtype=np.float64).reshape(1, 4)
+    
+    @classmethod
+    def from_dict(cls, regions_dict):
+        """
+        从旧的 {页码: [{'x1':, 'y1':, 'x2':, 'y2':}, ...]} 结构创建
+        
+        Args:
+            regions_dict: 每页的保留区域字典
+            
+        Returns:
+            KeepRegions对象,所有区域都作为单页区域保存
+        """
+        keep_regions = cls()
+        for page_num, regions in regions_dict.items():
+            for region in regions:
+                keep_regions.add_to_page(page_num, region)
+        return keep_regions
+    
+    def _visible_global_mask(self, page_num):
+        """指定页上未被排除的全局区域,没有排除时返回 None"""
+        excluded = self.page_excluded.get(page_num)
+        if not excluded:
+            return None
+        return ~np.isin(self.global_ids, list(excluded))
+    
+    def get(self, page_num):
+        """获取指定页生效的保留区域数组: 全局区域在前,单页区域在后"""
+        regions = self.global_regions
+        mask = self._visible_global_mask(page_num)
+        if mask is not None:
+            regions = regions[mask]
+        extras = self.page_extras.get(page_num)
+        if extras is not None:
+            regions = np.concatenate([regions, extras])
+        return regions
+    
+    def add_global(self, region):
+        """添加应用到所有页的区域"""
+        self.global_regions = np.concatenate([self.global_regions, self._as_row(region)])
+        self.global_ids = np.append(self.global_ids, self._next_id)
+        self._next_id += 1
+    
+    def add_to_page(self, page_num, region):
+        """为单页添加区域"""
+        extras = self.page_extras.get(page_num, self._empty())
+        self.page_extras[page_num] = np.concatenate([extras, self._as_row(region)])
+    
+    def remove_global(self, index):
+        """删除一个全局区域,所有页都不再保留它"""
+        removed = int(self.global_ids[index])
+        self.global_regions = np.delete(self.global_regions, index, axis=0)
+        self.global_ids = np.delete(self.global_ids, index)
+        for page_num in [page for page, excluded in self.page_excluded.items() if removed in excluded]:
+            self.page_excluded[page_num].discard(removed)
+            if not self.page_excluded[page_num]:
+                del self.page_excluded[page_num]
+    
+    def remove_from_page(self, page_num, index):
+        """
+        删除单页生效的第 index 个区域(顺序与 get() 相同)
+        
+        全局区域只在该页排除,其他页仍然保留;单页区域直接删除。
+        """
+        mask = self._visible_global_mask(page_num)
+        visible_ids = self.global_ids if mask is None else self.global_ids[mask]
+        if index < len(visible_ids):
+            self.page_excluded.setdefault(page_num, set()).add(int(visible_ids[index]))
+            return
+        
+        extras = np.delete(self.page_extras[page_num], index - len(visible_ids), axis=0)
+        if len(extras):
+            self.page_extras[page_num] = extras
+        else:
+            del self.page_extras[page_num]
+    
+    def clear(self):
+        """清空所有区域"""
+        self.global_regions = self._empty()
+        self.global_ids = np.empty(0, dtype=np.int64)
+        self.page_extras = {}
+        self.page_excluded = {}
+    
+    def override_count(self):
+        """单独框选过(增加区域或排除全局区域)的页数"""
+        return len(self.page_extras.keys() | self.page_excluded.keys())
+    
+    def __bool__(self):
+        return len(self.global_regions) > 0 or bool(self.page_extras)
+
+
+class KeepRegionRemover:
+    """保留区域处理器"""
+    
+    def __init__(self, keep_regions, remove_margins=True, margin_white_threshold=250, margin_noise_tolerance=0,
+                 memory_budget=None, use_native_images=True, optimize_output=False, cache=None, page_provider=None,
+                 color_mode="auto", pipeline_workers=2):
+        """
+        初始化保留区域处理器
+        
+        Args:
+            keep_regions: KeepRegions对象,或旧的 {页码: [{'x1':, 'y1':, 'x2':, 'y2':}, ...]} 字典
+            remove_margins: 是否去除保留区域外的白边
+            margin_white_threshold: 去白边时灰度值大于该值视为白色
+            margin_noise_tolerance: 去白边时一行/一列墨迹像素数不超过该值视为空白(忽略扫描灰尘)
+            memory_budget: MemoryBudget对象,为None时使用默认预算
+            use_native_images: 整页只有一张图片的页面(扫描件)直接取出原图按原始分辨率处理,不按输出DPI渲染
+            optimize_output: 使用优化保存模式(重复图片只嵌入一次、对象流、压缩)
+            cache: ResultCache对象,复用页面内容、保留区域和参数都未变化的页面的处理结果;为None时不使用缓存
+            page_provider: page_provider(页码, 渲染倍数) 函数,返回已渲染好的OpenCV图像(如界面的预览图片),
+                返回 None 时自行渲染;为None时总是自行渲染
+            color_mode: 颜色模式,"gray" 按灰度渲染并以单通道处理和编码,"color" 按彩色处理,"auto" 按页面饱和度逐页选择
+            pipeline_workers: 处理和编码阶段各自的线程数(见 PagePipeline),与渲染下一页同时进行;为0时逐页依次处理
+        """
+        if color_mode not in COLOR_MODES:
+            raise ValueError(f"无效的颜色模式: {color_mode},应为 {'/'.join(COLOR_MODES)}")
+        if isinstance(keep_regions, dict):
+            keep_regions = KeepRegions.from_dict(keep_regions)
+        self.keep_regions = keep_regions
+        self.remove_margins = remove_margins
+        self.margin_white_threshold = margin_white_threshold
+        self.margin_noise_tolerance = margin_noise_tolerance
+        self.memory_budget = memory_budget or MemoryBudget()
+        self.use_native_images = use_native_images
+        self.optimize_output = optimize_output
+        self.cache = cache
+        self.page_provider = page_provider
+        self.color_mode = color_mode
+        self.pipeline_workers = pipeline_workers
+        self.provided_pages = []  # 使用了 page_provider 图片的页码
+        self.last_report = None  # 最近一次处理的运行报告
+    
+    @holds_fitz_lock
+    def process_pdf(self, pdf_path, output_pdf_path=None, dpi=72, progress_callback=None, cancel_token=None, pages=None):
+        """
+        处理PDF文件,保留指定区域并去除白边
+        
+        Args:
+            pdf_path: 输入PDF文件路径
+            output_pdf_path: 输出PDF文件路径
+            dpi: 输出分辨率,与标注时的预览分辨率无关,默认72(即1倍缩放);按原图处理的扫描页保持原图分辨率
+            progress_callback: 进度回调函数,参数为进度字典(见 ProgressTracker)
+            cancel_token: CancelToken对象,取消时抛出 ProcessingCancelled,不会留下输出文件
+            pages: 要处理的页码 range(从0开始),为None时处理全部页面;指定时输出为带分片元数据的分片PDF,
+                可用 pdf_shards.merge_shards() 合并
+                
+        Returns:
+            处理后的PDF文件路径
+        """
+        try:
+            import fitz
+        except ImportError:
+            raise Exception("请先安装pymupdf: pip install pymupdf")
+        
+        cancel_token = cancel_token or CancelToken()
+        
+        # 设置输出PDF路径
+        if output_pdf_path is None:
+            base_name = os.path.splitext(pdf_path)[0]
+            if pages is None:
+                output_pdf_path = f"{base_name}_cleaned.pdf"
+            else:
+                output_pdf_path = f"{base_name}_cleaned_{format_page_range(pages)}.pdf"
+        
+        # 打开PDF文件
+        pdf_document = fitz.open(pdf_path)
+        
+        try:
+            # 只处理部分页面时,输出记录页码范围,供合并时检查
+            metadata = None if pages is None else shard_metadata(pages, len(pdf_document))
+            pages = resolve_pages(pages, len(pdf_document))
+        except ValueError:
+            pdf_document.close()
+            raise
+        
+        # 创建新的PDF文档,按内存预算增量写入临时文件,完成后再替换,取消或失败时不会留下半成品
+        output_pdf = IncrementalPDFWriter(
+            output_pdf_path,
+            self.memory_budget,
+            deflate=True,
+            optimize=self.optimize_output,
+            metadata=metadata
+        )
+        tracker = ProgressTracker(len(pages), progress_callback)
+        reduced_dpi_pages = []
+        native_pages = []
+        passthrough_pages = []
+        cached_pages = []
+        stream_hashes = {}  # 多页共用的图片等资源只计算一次哈希
+        self.provided_pages = []
+        if self.cache is not None:
+            self.cache.reset_stats()
+        
+        # 处理阶段应用保留区域并去白边,编码阶段重新编码,都与渲染下一页同时进行
+        def process(item):
+            image, regions, ext, grayscale, scale = item
+            processed = self.clean_loaded_page(image, regions)
+            return None if processed is None else (processed, ext, grayscale, scale)
+        
+        def encode(item):
+            image, ext, grayscale, scale = item
+            return encode_page_image(image, ext, grayscale), image.shape[1], image.shape[0], scale
+        
+        pipeline = PagePipeline(process, encode, self.memory_budget.max_pages_in_flight, self.pipeline_workers)
+        page_info = {}  # 页码 -> (渲染倍数, 缓存键),写入该页时使用
+        
+        def write_page(i, result):
+            zoom, cache_key = page_info.pop(i)
+            if cache_key is not None:
+                if result is None:
+                    self.cache.put(cache_key, {'passthrough': True})
+                else:
+                    image_bytes, width, height, scale = result
+                    meta = {'passthrough': False, 'width': width, 'height': height, 'scale': list(scale)}
+                    self.cache.put(cache_key, meta, image_bytes)
+            
+            if result is None:
+                # 处理后与原页面相同,原样复制源页面,不重新编码
+                output_pdf.copy_page(pdf_document, i)
+                passthrough_pages.append(i)
+                print(f"  第 {i+1} 页无需改动,原样复制")
+                tracker.update()
+                return
+            
+            image_bytes, width, height, (scale_x, scale_y) = result
+            if (scale_x, scale_y) != (zoom, zoom):
+                native_pages.append(i)
+            
+            # 创建新页面,页面尺寸(点)= 图片像素尺寸 / 每点像素数
+            new_page = output_pdf.new_page(
+                width=width / scale_x,
+                height=height / scale_y
+            )
+            output_pdf.insert_image(new_page, new_page.rect, image_bytes)
+            output_pdf.page_done(len(image_bytes))
+            
+            print(f"  第 {i+1} 页最终输出尺寸: {width}x{height} ({scale_x * 72:.0f} DPI)")
+            tracker.update(bytes_written=len(image_bytes))
+        
+        try:
+            for i in pages:
+                cancel_token.check()
+                
+                # 没有保留区域且不去白边: 无需渲染,直接原样复制
+                if not self.remove_margins and len(self.keep_regions.get(i)) == 0:
+                    page_info[i] = (None, None)
+                    pipeline.put_result(i, None)
+                else:
+                    with pipeline.stage("render"):
+                        page = pdf_document[i]
+                        
+                        # 单页渲染超出内存预算时降低该页的DPI
+                        zoom = self.memory_budget.fit_zoom(page.rect.width, page.rect.height, dpi / 72)
+                        if zoom < dpi / 72:
+                            reduced_dpi_pages.append(i)
+                            print(f"  第{i+1}页按 {dpi} DPI 渲染会超出内存预算,降为 {zoom * 72:.0f} DPI")
+                        
+                        # 页面内容、该页的保留区域和参数都没变时直接使用缓存的结果
+                        cached = None
+                        cache_key = None
+                        if self.cache is not None:
+                            cache_key = self.cache.make_key(page_content_hash(page, stream_hashes), self.cache_params(i, zoom))
+                            cached = self.cache.get(cache_key)
+                        if cached is not None:
+                            meta, image_bytes = cached
+                            page_info[i] = (zoom, None)
+                            cached_pages.append(i)
+                            print(f"\n第 {i+1} 页使用缓存结果")
+                        else:
+                            page_info[i] = (zoom, cache_key)
+                            item = self.load_page(page, i, zoom)
+                    
+                    if cached is not None:
+                        pipeline.put_result(i, None if meta['passthrough'] else (
+                            image_bytes, meta['width'], meta['height'], tuple(meta['scale'])
+                        ))
+                    else:
+                        pipeline.submit(i, item)
+                
+                for page_num, result in pipeline.results():
+                    with pipeline.stage("write"):
+                        write_page(page_num, result)
+            
+            for page_num, result in pipeline.results(wait_all=True):
+                cancel_token.check()
+                with pipeline.stage("write"):
+                    write_page(page_num, result)
+            
+            # 保存输出PDF,启用压缩
+            cancel_token.check()
+            output_pdf.commit()
+        except BaseException:
+            output_pdf.abort()
+            raise
+        finally:
+            pipeline.close()
+            pdf_document.close()
+        
+        self.last_report = add_memory_report(
+            tracker.finish(bytes_written=os.path.getsize(output_pdf_path)),
+            self.memory_budget,
+            reduced_dpi_pages,
+            output_pdf.flush_count
+        )
+        self.last_report['native_pages'] = native_pages
+        self.last_report['passthrough_pages'] = passthrough_pages
+        self.last_report['provided_pages'] = self.provided_pages
+        if self.cache is not None:
+            self.last_report['cached_pages'] = cached_pages
+            self.last_report.update(self.cache.report())
+        add_size_report(self.last_report, output_pdf)
+        add_pipeline_report(self.last_report, pipeline)
+        
+        return output_pdf_path
+    
+    def cache_params(self, page_num, zoom):
+        """
+        影响页面处理结果的参数,作为缓存键的一部分
+        
+        Args:
+            page_num: 页码,用于查找保留区域
+            zoom: 渲染倍数
+            
+        Returns:
+            参数字典
+        """
+        return {
+            'engine': type(self).__name__,
+            'keep_regions': self.keep_regions.get(page_num).tolist(),
+            'remove_margins': self.remove_margins,
+            'margin_white_threshold': self.margin_white_threshold,
+            'margin_noise_tolerance': self.margin_noise_tolerance,
+            'render_zoom': zoom,
+            'use_native_images': self.use_native_images,
+            'color_mode': self.color_mode,
+            'page_allowance': self.memory_budget.page_allowance()
+        }
+    
+    def load_page(self, page, page_num, zoom):
+        """
+        取出页面图像并把该页的保留区域换算为像素坐标(流水线的渲染阶段,使用fitz,只能在调用线程中进行)
+        
+        Args:
+            page: fitz页面对象
+            page_num: 页码,用于查找保留区域
+            zoom: 渲染倍数
+            
+        Returns:
+            (图像, 保留区域像素坐标数组, 编码格式, 是否按灰度编码, (横向每点像素数, 纵向每点像素数))
+        """
+        # 获取页面的原始尺寸
+        page_rect = page.rect
+        page_width = page_rect.width
+        page_height = page_rect.height
+        
+        print(f"\n处理第 {page_num+1} 页:")
+        print(f"  原始PDF尺寸: {page_width:.0f}x{page_height:.0f}")
+        
+        # 黑白页面按灰度处理,全程单通道
+        gray = use_grayscale(page, self.color_mode)
+        
+        native = extract_page_image(page, self.memory_budget, gray) if self.use_native_images else None
+        if native is not None:
+            # 整页单图(扫描件): 按原图分辨率处理,点坐标 -> 原图像素由图片放置位置决定
+            image, info, ext, grayscale = native
+            x0, y0, x1, y1 = info['bbox']
+            scale_x = image.shape[1] / (x1 - x0)
+            scale_y = image.shape[0] / (y1 - y0)
+            pixel_matrix = (scale_x, 0, 0, scale_y, -x0 * scale_x, -y0 * scale_y)
+            
+            print(f"  使用原图: {image.shape[1]}x{image.shape[0]} ({ext})")
+        else:
+            # 已有同样倍数渲染好的页面图片时直接使用,否则按输出DPI转换页面为图片
+            image = self.page_provider(page_num, zoom) if self.page_provider is not None else None
+            if image is not None:
+                self.provided_pages.append(page_num)
+                print("  使用已渲染的页面图片")
+                if gray:
+                    image = to_gray(image)
+            else:
+                # 直接从像素缓冲区构造图像,灰度页面按灰度颜色空间渲染
+                image = render_page(page, zoom, gray)
+            ext, grayscale = "png", gray
+            scale_x = scale_y = zoom
+            pixel_matrix = page_to_pixel_matrix(tuple(page.rotation_matrix), zoom)
+        
+        print(f"  OpenCV图像尺寸: {image.shape[1]}x{image.shape[0]}")
+        
+        # 当前页的保留区域,点坐标 -> 像素坐标
+        current_regions = transform_regions(self.keep_regions.get(page_num), pixel_matrix)
+        print(f"  保留区域数量: {len(current_regions)}")
+        for j, (x1, y1, x2, y2) in enumerate(current_regions.tolist()):
+            print(f"    区域{j+1}: ({x1:.0f}, {y1:.0f}) -> ({x2:.0f}, {y2:.0f})")
+        
+        # 渲染的页面用PNG保持清晰度,原图按原格式重新编码
+        return image, current_regions, ext, grayscale, (scale_x, scale_y)
+    
+    def clean_loaded_page(self, image, regions):
+        """
+        应用保留区域并去白边(流水线的处理阶段,不使用fitz,可在工作线程中进行)
+        
+        Args:
+            image: load_page() 取出的图像
+            regions: 保留区域像素坐标数组
+            
+        Returns:
+            处理后的图像;保留区域覆盖整页且没有白边可去、页面无需改动时返回 None
+        """
+        processed = self.process_keep_regions(image, regions)
+        if self.remove_margins:
+            processed = self.remove_white_margins(processed)
+        
+        # 两个步骤都原样返回了图像,说明页面无需改动
+        if processed is image:
+            return None
+        return processed
+    
+    def process_keep_regions(self, image, regions):
+        """
+        处理保留区域,将保留区域外的内容用白色覆盖
+        
+        Args:
+            image: OpenCV图像对象
+            regions: 当前页的保留区域数组(像素坐标),形状为 (N, 4),每行为 (x1, y1, x2, y2)
+            
+        Returns:
+            处理后的图像,无需改动时返回原图像对象
+        """
+        # 如果没有保留区域,返回原图
+        if len(regions) == 0:
+            return image
+        
+        # 创建白色覆盖层
+        mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        
+        # 确保坐标在图像范围内
+        height, width = image.shape[:2]
+        clipped = np.clip(np.rint(regions), 0, [width, height, width, height]).astype(int)
+        
+        # 为每个保留区域创建掩码
+        for x1, y1, x2, y2 in clipped.tolist():
+            # 在掩码上标记保留区域
+            mask[y1:y2, x1:x2] = 255
+        
+        # 创建白色图像(彩色或单通道)
+        white_image = np.full(image.shape, 255, dtype=np.uint8)
+        
+        # 保留区域覆盖整页时无需改动
+        if mask.all():
+            return image
+        
+        # 使用掩码合并图像
+        keep = mask == 255 if image.ndim == 2 else mask[:, :, np.newaxis] == 255
+        result = np.where(keep, image, white_image)
+        
+        return result
+    
+    def remove_white_margins(self, image):
+        """
+        去除图片四周的白边
+        
+        Args:
+            image: OpenCV图像对象
+            
+        Returns:
+            去除白边后的图像
+        """
+        # 用行/列投影查找非白色区域的边界
+        bbox = find_content_bbox(
+            image,
+            white_threshold=self.margin_white_threshold,
+            noise_tolerance=self.margin_noise_tolerance
+        )
+        
+        if bbox is None:
+            # 如果整个图片都是白色,返回原图
+            return image
+        
+        # 获取边界坐标
+        x, y, w, h = bbox
+        if (w, h) == (image.shape[1], image.shape[0]):
+            # 没有白边可去,返回原图
+            return image
+        
+        # 裁剪图片
+        result = image[y:y+h, x:x+w]
+        
+        return result
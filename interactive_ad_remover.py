@@ -7,16 +7,29 @@ PDF广告移除工具 - 交互式标注版本(保留区域模式 + 对比预览)
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, simpledialog
 import threading
+import queue
 import os
-import cv2
-import numpy as np
-from PIL import Image, ImageTk
+import io
+from typing import TYPE_CHECKING
+from cleaning_core import (
+    format_progress, CancelToken, ProcessingCancelled, MemoryBudget, COLOR_MODES, FITZ_LOCK,
+    KeepRegions, KeepRegionRemover, page_to_pixel_matrix, invert_matrix, transform_regions
+)
+from result_cache import ResultCache
+from page_raster_store import PageRasterStore, planned_page_shapes
+from lazy_modules import lazy_import, preload_in_background
+
+lazy_import(globals(), cv2="cv2", np="numpy", Image="PIL.Image", ImageTk="PIL.ImageTk")
+if TYPE_CHECKING:
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageTk
 
 
 class ComparePreviewGUI:
     """对比预览界面"""
     
-    def __init__(self, root, original_pdf_path, cleaned_pdf_path):
+    def __init__(self, root, original_pdf_path, cleaned_pdf_path, use_cache=True):
         self.root = root
         self.root.title("PDF对比预览 - 源文件 vs 处理后文件")
         self.root.geometry("1600x900")
@@ -24,9 +37,9 @@ class ComparePreviewGUI:
         self.original_pdf_path = original_pdf_path
         self.cleaned_pdf_path = cleaned_pdf_path
         
-        # 数据存储
-        self.original_images = []
-        self.cleaned_images = []
+        # 数据存储,页面图片保存在映射文件中,常驻内存的部分由操作系统决定
+        self.original_images = PageRasterStore(persistent=use_cache)
+        self.cleaned_images = PageRasterStore(persistent=use_cache)
         self.current_page = 0
         self.total_pages = 0
         
@@ -137,6 +150,7 @@ class ComparePreviewGUI:
         
         self.left_canvas = tk.Canvas(left_canvas_frame, bg="white")
         self.left_canvas.pack(fill="both", expand=True)
+        self.left_view = PageCanvas(self.left_canvas)
         
         # 绑定滚动事件
         self.left_canvas.bind("<MouseWheel>", self.on_left_scroll)
@@ -189,6 +203,7 @@ class ComparePreviewGUI:
         
         self.right_canvas = tk.Canvas(right_canvas_frame, bg="white")
         self.right_canvas.pack(fill="both", expand=True)
+        self.right_view = PageCanvas(self.right_canvas)
         
         # 绑定滚动事件
         self.right_canvas.bind("<MouseWheel>", self.on_right_scroll)
@@ -210,71 +225,92 @@ class ComparePreviewGUI:
         info_label.pack(pady=10)
     
     def load_pdfs(self):
-        """加载PDF文件"""
-        try:
-            import fitz
-            import io
-            
-            # 加载源文件
-            self.root.config(cursor="watch")
-            self.root.update()
-            
-            print(f"正在加载源文件: {self.original_pdf_path}")
-            print(f"正在加载处理后文件: {self.cleaned_pdf_path}")
-            
-            original_doc = fitz.open(self.original_pdf_path)
-            cleaned_doc = fitz.open(self.cleaned_pdf_path)
-            
-            print(f"源文件页数: {len(original_doc)}")
-            print(f"处理后文件页数: {len(cleaned_doc)}")
-            
-            self.total_pages = min(len(original_doc), len(cleaned_doc))
-            print(f"总页数: {self.total_pages}")
-            
-            if self.total_pages == 0:
-                raise Exception("PDF文件为空")
-            
-            # 转换所有页面为图片
-            zoom = 2
-            
-            for i in range(self.total_pages):
-                print(f"正在转换第 {i+1}/{self.total_pages} 页...")
+        """在后台加载两个PDF文件,界面保持响应"""
+        print(f"正在加载源文件: {self.original_pdf_path}")
+        print(f"正在加载处理后文件: {self.cleaned_pdf_path}")
+        
+        self.root.config(cursor="watch")
+        
+        # 转换所有页面为图片;两个加载器每渲染一页取得一次 FITZ_LOCK,交替进行
+        zoom = 2
+        self.loaders = {
+            'original': PageLoader(self.original_pdf_path, self.original_images, zoom=zoom).start(),
+            'cleaned': PageLoader(self.cleaned_pdf_path, self.cleaned_images, zoom=zoom).start()
+        }
+        self.page_counts = {}
+        self.loaded_images = {'original': self.original_images, 'cleaned': self.cleaned_images}
+        
+        # 关闭窗口时取消加载
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.root.after(30, self.poll_loaders)
+    
+    def poll_loaders(self):
+        """轮询两个后台加载器的事件"""
+        if not self.root.winfo_exists():
+            return  # 窗口已关闭
+        
+        for name, loader in list(self.loaders.items()):
+            for event in loader.poll():
+                kind = event[0]
                 
-                # 源文件页面
-                orig_page = original_doc[i]
-                orig_mat = fitz.Matrix(zoom, zoom)
-                orig_pix = orig_page.get_pixmap(matrix=orig_mat)
-                orig_img_data = orig_pix.tobytes("png")
-                orig_image = Image.open(io.BytesIO(orig_img_data))
-                self.original_images.append(orig_image)
-                print(f"  源文件第{i+1}页加载成功, 尺寸: {orig_image.size}")
+                if kind == "opened":
+                    self.page_counts[name] = event[1]
+                    print(f"{'源文件' if name == 'original' else '处理后文件'}页数: {event[1]}")
+                    if len(self.page_counts) == 2:
+                        self.total_pages = min(self.page_counts.values())
+                        print(f"总页数: {self.total_pages}")
+                        self.page_label.config(text=f"第 {self.current_page + 1} / {self.total_pages} 页")
+                        if self.is_page_loaded(self.current_page):
+                            self.display_page(self.current_page)
                 
-                # 处理后文件页面
-                clean_page = cleaned_doc[i]
-                clean_mat = fitz.Matrix(zoom, zoom)
-                clean_pix = clean_page.get_pixmap(matrix=clean_mat)
-                clean_img_data = clean_pix.tobytes("png")
-                clean_image = Image.open(io.BytesIO(clean_img_data))
-                self.cleaned_images.append(clean_image)
-                print(f"  处理后第{i+1}页加载成功, 尺寸: {clean_image.size}")
-            
-            original_doc.close()
-            cleaned_doc.close()
-            
-            self.root.config(cursor="")
-            
-            print("所有页面加载完成,开始显示...")
-            
-            # 显示第一页
-            self.root.after(100, lambda: self.display_page(0))
-            
-        except Exception as e:
+                elif kind == "page":
+                    page_num = event[1]
+                    image = self.loaded_images[name][page_num]
+                    print(f"  {'源文件' if name == 'original' else '处理后'}第{page_num+1}页加载成功, 尺寸: {image.size}")
+                    
+                    # 当前页两侧都已加载时立即显示
+                    if page_num == self.current_page and self.is_page_loaded(page_num):
+                        self.display_page(page_num)
+                
+                elif kind in ("done", "cancelled"):
+                    del self.loaders[name]
+                    break
+                
+                elif kind == "error":
+                    self.cancel_loaders()
+                    self.root.config(cursor="")
+                    print(f"加载PDF失败: {event[1]}")
+                    messagebox.showerror("错误", f"加载PDF失败:\n{event[1]}")
+                    self.root.destroy()
+                    return
+        
+        if self.loaders:
+            self.root.after(30, self.poll_loaders)
+        else:
             self.root.config(cursor="")
-            print(f"加载PDF失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            messagebox.showerror("错误", f"加载PDF失败:\n{str(e)}")
-            self.root.destroy()
+            print("所有页面加载完成")
+    
+    def is_page_loaded(self, page_num):
+        """指定页在两侧是否都已加载"""
+        return (
+            page_num < len(self.original_images) and page_num < len(self.cleaned_images)
+            and self.original_images.is_loaded(page_num)
+            and self.cleaned_images.is_loaded(page_num)
+        )
+    
+    def cancel_loaders(self):
+        """取消所有后台加载"""
+        for loader in self.loaders.values():
+            loader.cancel()
+        self.loaders = {}
+    
+    def on_close(self):
+        """关闭窗口: 先取消后台加载,再释放页面图片的映射文件"""
+        self.cancel_loaders()
+        self.original_images.close()
+        self.cleaned_images.close()
+        self.root.destroy()
     
     def display_page(self, page_num):
         """显示指定页"""
@@ -289,6 +325,12 @@ class ComparePreviewGUI:
         # 更新页面标签
         self.page_label.config(text=f"第 {page_num + 1} / {self.total_pages} 页")
         
+        if not self.is_page_loaded(page_num):
+            # 页面还在后台加载,加载完成后会自动显示
+            for view in (self.left_view, self.right_view):
+                view.show_message(f"⏳ 第 {page_num + 1} 页加载中...")
+            return
+        
         # 获取各自独立的缩放比例
         left_zoom_factor = self.left_zoom_var.get()
         right_zoom_factor = self.right_zoom_var.get()
@@ -301,26 +343,25 @@ class ComparePreviewGUI:
         
         # 显示源文件
         self.display_image_on_canvas(
-            self.left_canvas,
+            self.left_view,
             self.original_images[page_num],
             left_zoom_factor
         )
         
         # 显示处理后文件
         self.display_image_on_canvas(
-            self.right_canvas,
+            self.right_view,
             self.cleaned_images[page_num],
             right_zoom_factor
         )
         
         print(f"第 {page_num + 1} 页显示完成")
     
-    def display_image_on_canvas(self, canvas, image, zoom_factor):
-        """在画布上显示图片"""
+    def display_image_on_canvas(self, view, image, zoom_factor):
+        """在画布上显示图片,页面和缩放比例都未改变时只调整位置"""
+        canvas = view.canvas
         print(f"display_image_on_canvas 被调用, 画布: {canvas}, 图片尺寸: {image.size}")
         
-        canvas.delete("all")
-        
         # 计算缩放后的尺寸
         canvas_width = canvas.winfo_width()
         canvas_height = canvas.winfo_height()
@@ -342,23 +383,14 @@ class ComparePreviewGUI:
         
         print(f"缩放后图片尺寸: {new_width} x {new_height}")
         
-        # 缩放图片
-        resized_image = image.resize((new_width, new_height), Image.LANCZOS)
-        
-        # 为每个画布创建独立的PhotoImage对象
-        photo = ImageTk.PhotoImage(resized_image)
-        
-        # 将PhotoImage对象保存到画布的属性中,防止被垃圾回收
-        canvas.photo = photo
-        
         # 计算居中位置
         x = (canvas_width - new_width) // 2
         y = (canvas_height - new_height) // 2
         
         print(f"图片位置: ({x}, {y})")
         
-        # 显示图片
-        canvas.create_image(x, y, image=photo, anchor="nw")
+        # 显示图片,每个画布使用各自的PhotoImage对象
+        view.show_image((self.current_page, new_width, new_height), image, x, y, new_width, new_height)
         
         # 保存图片信息用于滚动
         canvas.image_info = {
@@ -407,9 +439,9 @@ class ComparePreviewGUI:
         print(f"左侧缩放改变为: {value}")
         # 只重新显示左侧画布
         zoom_factor = float(value)
-        if 0 <= self.current_page < self.total_pages:
+        if 0 <= self.current_page < self.total_pages and self.is_page_loaded(self.current_page):
             self.display_image_on_canvas(
-                self.left_canvas,
+                self.left_view,
                 self.original_images[self.current_page],
                 zoom_factor
             )
@@ -419,9 +451,9 @@ class ComparePreviewGUI:
         print(f"右侧缩放改变为: {value}")
         # 只重新显示右侧画布
         zoom_factor = float(value)
-        if 0 <= self.current_page < self.total_pages:
+        if 0 <= self.current_page < self.total_pages and self.is_page_loaded(self.current_page):
             self.display_image_on_canvas(
-                self.right_canvas,
+                self.right_view,
                 self.cleaned_images[self.current_page],
                 zoom_factor
             )
@@ -444,18 +476,24 @@ class InteractiveAdRemoverGUI:
         # 数据存储
         self.pdf_file_path = None
         self.output_pdf_path = None
-        self.all_pages_images = []  # 存储所有页面的图片
-        self.all_pages_cv2 = []     # 存储所有页面的OpenCV格式图片
+        self.all_pages_images = PageRasterStore()  # 存储所有页面的预览图片(映射文件)
         self.current_page = 0       # 当前显示的页码
         self.total_pages = 0        # 总页数
-        self.keep_regions = {}      # 存储每页的保留区域 {页码: [(x1, y1, x2, y2), ...]}
+        self.keep_regions = KeepRegions()  # 保留区域: 全局区域 + 单页覆盖(PDF点坐标)
+        self.preview_zoom = 1.0     # 预览渲染倍数,与输出DPI无关
+        self.page_rotation_matrices = []  # 每页的旋转矩阵,用于点坐标与预览像素的转换
+        self.loader = None          # 后台页面加载器
+        self.cancel_token = None    # 当前处理任务的取消令牌
+        self.first_page_image = None
         self.drag_start = None
         self.current_rect = None
-        self.rect_id = None
         self.scale = 1.0
         
         # 创建界面
         self.create_widgets()
+        
+        # 关闭窗口时取消正在进行的加载和处理
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def create_widgets(self):
         """创建GUI组件 - 左右结构"""
@@ -524,6 +562,7 @@ class InteractiveAdRemoverGUI:
         
         self.canvas = tk.Canvas(canvas_frame, bg="white")
         self.canvas.pack(fill="both", expand=True)
+        self.view = PageCanvas(self.canvas, border_color="#3498db")
         
         # 绑定鼠标事件
         self.canvas.bind("<ButtonPress-1>", self.on_mouse_press)
@@ -570,6 +609,18 @@ class InteractiveAdRemoverGUI:
         )
         browse_button.pack(side="left", padx=5)
         
+        self.cancel_load_button = tk.Button(
+            pdf_entry_frame,
+            text="⏹ 取消加载",
+            command=self.cancel_loading,
+            width=10,
+            bg="#95a5a6",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            state="disabled"
+        )
+        self.cancel_load_button.pack(side="left", padx=5)
+        
         # 保留区域列表
         region_frame = tk.LabelFrame(right_frame, text="📋 已选择的保留区域", font=("Arial", 11, "bold"), bg="#ecf0f1")
         region_frame.pack(fill="both", expand=True, padx=15, pady=10)
@@ -681,6 +732,101 @@ class InteractiveAdRemoverGUI:
         )
         remove_margin_check.pack(anchor="w", padx=10, pady=5)
         
+        # 输出分辨率选项
+        dpi_frame = tk.Frame(options_frame, bg="#ecf0f1")
+        dpi_frame.pack(fill="x", padx=10, pady=5)
+        
+        dpi_label = tk.Label(dpi_frame, text="输出DPI:", font=("Arial", 10), bg="#ecf0f1")
+        dpi_label.pack(side="left")
+        
+        self.output_dpi_var = tk.IntVar(value=72)
+        dpi_spinbox = ttk.Spinbox(
+            dpi_frame,
+            values=(72, 96, 150, 200, 300, 600),
+            textvariable=self.output_dpi_var,
+            width=6
+        )
+        dpi_spinbox.pack(side="left", padx=5)
+        
+        # 预览倍数: 区域以PDF点保存,预览用较小倍数加载更快,输出仍按输出DPI重新渲染
+        preview_frame = tk.Frame(options_frame, bg="#ecf0f1")
+        preview_frame.pack(fill="x", padx=10, pady=5)
+        
+        preview_label = tk.Label(preview_frame, text="预览倍数:", font=("Arial", 10), bg="#ecf0f1")
+        preview_label.pack(side="left")
+        
+        self.preview_zoom_var = tk.StringVar(value=str(self.preview_zoom))
+        preview_combobox = ttk.Combobox(
+            preview_frame,
+            values=("0.5", "0.75", "1.0", "1.5", "2.0"),
+            textvariable=self.preview_zoom_var,
+            state="readonly",
+            width=5
+        )
+        preview_combobox.pack(side="left", padx=5)
+        preview_combobox.bind("<<ComboboxSelected>>", self.on_preview_zoom_change)
+        
+        preview_hint = tk.Label(preview_frame, text="(较小时加载更快,不影响输出)", font=("Arial", 9), bg="#ecf0f1", fg="#7f8c8d")
+        preview_hint.pack(side="left")
+        
+        # 颜色模式选项: 黑白文档按灰度处理,内存和输出更小
+        color_frame = tk.Frame(options_frame, bg="#ecf0f1")
+        color_frame.pack(fill="x", padx=10, pady=5)
+        
+        color_label = tk.Label(color_frame, text="颜色模式:", font=("Arial", 10), bg="#ecf0f1")
+        color_label.pack(side="left")
+        
+        self.color_mode_var = tk.StringVar(value="auto")
+        color_combobox = ttk.Combobox(
+            color_frame,
+            values=COLOR_MODES,
+            textvariable=self.color_mode_var,
+            state="readonly",
+            width=6
+        )
+        color_combobox.pack(side="left", padx=5)
+        
+        color_hint = tk.Label(color_frame, text="(auto 自动, color 彩色, gray 灰度)", font=("Arial", 9), bg="#ecf0f1", fg="#7f8c8d")
+        color_hint.pack(side="left")
+        
+        # 处理时的内存上限(预览图片保存在映射文件中,不计入)
+        memory_frame = tk.Frame(options_frame, bg="#ecf0f1")
+        memory_frame.pack(fill="x", padx=10, pady=5)
+        
+        memory_label = tk.Label(memory_frame, text="内存上限(MB):", font=("Arial", 10), bg="#ecf0f1")
+        memory_label.pack(side="left")
+        
+        self.memory_mb_var = tk.IntVar(value=1024)
+        memory_spinbox = ttk.Spinbox(
+            memory_frame,
+            values=(256, 512, 1024, 2048, 4096, 8192),
+            textvariable=self.memory_mb_var,
+            width=6
+        )
+        memory_spinbox.pack(side="left", padx=5)
+        
+        # 优化保存选项
+        self.optimize_output_var = tk.BooleanVar(value=True)
+        optimize_check = tk.Checkbutton(
+            options_frame,
+            text="优化输出体积(重复页面只保存一次)",
+            variable=self.optimize_output_var,
+            font=("Arial", 10),
+            bg="#ecf0f1"
+        )
+        optimize_check.pack(anchor="w", padx=10, pady=5)
+        
+        # 结果缓存选项
+        self.use_cache_var = tk.BooleanVar(value=True)
+        cache_check = tk.Checkbutton(
+            options_frame,
+            text="使用缓存(只重新处理有改动的页面)",
+            variable=self.use_cache_var,
+            font=("Arial", 10),
+            bg="#ecf0f1"
+        )
+        cache_check.pack(anchor="w", padx=10, pady=5)
+        
         # 对比预览选项
         self.show_compare_var = tk.BooleanVar(value=True)
         compare_check = tk.Checkbutton(
@@ -709,10 +855,22 @@ class InteractiveAdRemoverGUI:
         )
         self.process_button.pack()
         
+        self.cancel_button = tk.Button(
+            process_frame,
+            text="⏹ 取消处理",
+            command=self.cancel_processing,
+            font=("Arial", 10, "bold"),
+            bg="#e74c3c",
+            fg="white",
+            width=15,
+            state="disabled"
+        )
+        self.cancel_button.pack(pady=5)
+        
         # 进度条
         self.progress = ttk.Progressbar(
             right_frame,
-            mode="indeterminate",
+            mode="determinate",
             length=400
         )
         self.progress.pack(pady=10)
@@ -765,78 +923,102 @@ class InteractiveAdRemoverGUI:
             # 自动加载PDF
             self.load_first_page()
     
-    def load_first_page(self):
-        """加载PDF的所有页面"""
+    def on_preview_zoom_change(self, event=None):
+        """预览倍数改变: 按新倍数重新加载预览,已标注的区域(PDF点坐标)保持不变"""
+        zoom = float(self.preview_zoom_var.get())
+        if zoom == self.preview_zoom:
+            return
+        self.preview_zoom = zoom
+        if self.pdf_file_path and self.total_pages:
+            self.load_first_page(keep_regions=True)
+    
+    def load_first_page(self, keep_regions=False):
+        """
+        在后台加载PDF的所有页面,第一页到达后即可开始标注
+        
+        Args:
+            keep_regions: 是否保留已标注的区域和当前页(只改变预览倍数时)
+        """
         if not self.pdf_file_path or not os.path.exists(self.pdf_file_path):
             messagebox.showerror("错误", "请先选择有效的PDF文件!")
             return
         
-        try:
-            import fitz
-            import io
-            
-            self.status_label.config(text="⏳ 正在加载所有页面...", fg="#f39c12")
-            self.root.update()
-            
-            # 清空之前的数据
-            self.all_pages_images = []
-            self.all_pages_cv2 = []
-            self.keep_regions = {}
+        # 取消上一次尚未完成的加载
+        if self.loader is not None:
+            self.loader.cancel()
+        
+        self.status_label.config(text="⏳ 正在加载所有页面...", fg="#f39c12")
+        
+        # 清空之前的数据;使用缓存时,同一文档之前渲染过的页面会从映射文件中直接读取
+        self.all_pages_images.close()
+        self.all_pages_images = PageRasterStore(persistent=self.use_cache_var.get())
+        self.page_rotation_matrices = []
+        self.total_pages = 0
+        self.first_page_image = None
+        if not keep_regions:
+            self.keep_regions = KeepRegions()
             self.current_page = 0
             self.region_mode_var.set("all")  # 重置为应用到所有页模式
+        self.update_region_listbox()
+        self.view.clear()
+        
+        self.loader = PageLoader(self.pdf_file_path, self.all_pages_images, zoom=self.preview_zoom).start()
+        self.cancel_load_button.config(state="normal")
+        self.root.after(30, self.poll_loader, self.loader)
+    
+    def poll_loader(self, loader):
+        """轮询后台加载器的事件"""
+        if loader is not self.loader:
+            return  # 已被新的加载替换
+        
+        for event in loader.poll():
+            kind = event[0]
             
-            # 打开PDF文件
-            pdf_document = fitz.open(self.pdf_file_path)
-            
-            self.total_pages = len(pdf_document)
-            
-            if self.total_pages == 0:
-                messagebox.showerror("错误", "PDF文件为空!")
-                return
+            if kind == "opened":
+                self.total_pages = event[1]
+                self.page_rotation_matrices = [None] * self.total_pages
+                self.page_label.config(text=f"第 {self.current_page + 1} / {self.total_pages} 页")
             
-            # 加载所有页面 - 使用原始尺寸
-            for i in range(self.total_pages):
-                self.status_label.config(text=f"⏳ 正在加载第 {i+1}/{self.total_pages} 页...", fg="#f39c12")
-                self.root.update()
-                
-                # 获取页面
-                page = pdf_document[i]
-                
-                # 获取原始页面尺寸
-                page_rect = page.rect
-                self.original_page_width = int(page_rect.width)
-                self.original_page_height = int(page_rect.height)
+            elif kind == "page":
+                _, page_num, rotation_matrix = event
+                self.page_rotation_matrices[page_num] = rotation_matrix
                 
-                # 将页面转换为图片 - 使用原始尺寸(1倍缩放)
-                mat = fitz.Matrix(1, 1)
-                pix = page.get_pixmap(matrix=mat)
+                if page_num == self.current_page:
+                    self.display_current_page()
                 
-                # 转换为OpenCV格式
-                img_data = pix.tobytes("png")
-                cv2_image = cv2.imdecode(
-                    np.frombuffer(img_data, np.uint8),
-                    cv2.IMREAD_COLOR
+                self.status_label.config(
+                    text=f"⏳ 已加载 {page_num + 1}/{self.total_pages} 页,可以开始标注已加载的页面",
+                    fg="#f39c12"
                 )
-                self.all_pages_cv2.append(cv2_image)
-                
-                # 转换为PIL Image用于显示
-                pil_image = Image.fromarray(
-                    cv2.cvtColor(cv2_image, cv2.COLOR_BGR2RGB)
-                )
-                self.all_pages_images.append(pil_image)
-                
-                print(f"第{i+1}页加载完成: 原始尺寸={self.original_page_width}x{self.original_page_height}, 图片尺寸={pil_image.size}")
             
-            pdf_document.close()
-            
-            # 显示第一页
-            self.display_current_page()
+            elif kind == "done":
+                self.finish_loading()
+                self.status_label.config(text=f"✅ 所有 {self.total_pages} 页加载完成!请在图片上标注要保留的区域", fg="#27ae60")
+                return
             
-            self.status_label.config(text=f"✅ 所有 {self.total_pages} 页加载完成!请在图片上标注要保留的区域", fg="#27ae60")
+            elif kind == "cancelled":
+                self.finish_loading()
+                self.status_label.config(text=f"⏹ 已取消加载,已加载 {event[1]}/{self.total_pages} 页", fg="#7f8c8d")
+                return
             
-        except Exception as e:
-            messagebox.showerror("错误", f"加载PDF失败:\n{str(e)}")
-            self.status_label.config(text="❌ 加载失败", fg="#e74c3c")
+            elif kind == "error":
+                self.finish_loading()
+                messagebox.showerror("错误", f"加载PDF失败:\n{event[1]}")
+                self.status_label.config(text="❌ 加载失败", fg="#e74c3c")
+                return
+        
+        self.root.after(30, self.poll_loader, loader)
+    
+    def finish_loading(self):
+        """加载结束(完成、取消或失败)后恢复界面状态"""
+        self.loader = None
+        self.cancel_load_button.config(state="disabled")
+    
+    def cancel_loading(self):
+        """取消后台加载"""
+        if self.loader is not None:
+            self.loader.cancel()
+            self.status_label.config(text="⏳ 正在取消加载...", fg="#f39c12")
     
     def on_mode_change(self):
         """框选模式改变时的处理"""
@@ -846,7 +1028,6 @@ class InteractiveAdRemoverGUI:
         self.update_region_listbox()
         
         # 重新显示当前页面
-        self.canvas.delete("all")
         self.display_image()
         
         # 显示模式切换提示
@@ -868,12 +1049,17 @@ class InteractiveAdRemoverGUI:
         # 更新页面标签
         self.page_label.config(text=f"第 {self.current_page + 1} / {self.total_pages} 页")
         
-        # 获取当前页面的图片
+        # 获取当前页面的图片(尚未加载时为None)
         self.first_page_image = self.all_pages_images[self.current_page]
         
         # 更新区域列表显示
         self.update_region_listbox()
         
+        if self.first_page_image is None:
+            # 页面还在后台加载,加载完成后会自动显示
+            self.view.show_message(f"⏳ 第 {self.current_page + 1} 页加载中...", fill="#7f8c8d")
+            return
+        
         # 显示图片
         self.display_image()
     
@@ -890,7 +1076,7 @@ class InteractiveAdRemoverGUI:
             self.display_current_page()
     
     def display_image(self):
-        """显示图片"""
+        """显示图片,页面和显示尺寸都未改变时只调整位置,不重新缩放"""
         if self.first_page_image is None:
             return
         
@@ -914,30 +1100,16 @@ class InteractiveAdRemoverGUI:
         new_width = int(img_width * scale)
         new_height = int(img_height * scale)
         
-        # 缩放图片
-        display_image = self.first_page_image.resize((new_width, new_height), Image.LANCZOS)
-        
-        # 显示图片
-        self.photo = ImageTk.PhotoImage(display_image)
-        self.canvas.delete("all")
-        self.canvas.create_image(
-            canvas_width // 2,
-            canvas_height // 2,
-            image=self.photo,
-            anchor="center"
-        )
-        
-        # 计算图片在画布上的位置
+        # 计算图片在画布上的位置(居中)
         self.image_x1 = (canvas_width - new_width) // 2
         self.image_y1 = (canvas_height - new_height) // 2
         self.image_x2 = self.image_x1 + new_width
         self.image_y2 = self.image_y1 + new_height
         
-        # 绘制图片边框
-        self.canvas.create_rectangle(
-            self.image_x1 - 2, self.image_y1 - 2,
-            self.image_x2 + 2, self.image_y2 + 2,
-            outline="#3498db", width=2
+        # 显示图片和边框
+        self.view.show_image(
+            (self.current_page, new_width, new_height), self.first_page_image,
+            self.image_x1, self.image_y1, new_width, new_height
         )
         
         # 重绘所有已选择的区域
@@ -960,11 +1132,7 @@ class InteractiveAdRemoverGUI:
         if self.drag_start is None:
             return
         
-        # 删除之前的临时矩形
-        if self.rect_id:
-            self.canvas.delete(self.rect_id)
-        
-        # 绘制新的临时矩形
+        # 移动临时矩形
         x1 = min(self.drag_start[0], event.x)
         y1 = min(self.drag_start[1], event.y)
         x2 = max(self.drag_start[0], event.x)
@@ -976,12 +1144,7 @@ class InteractiveAdRemoverGUI:
         x2 = min(self.image_x2, x2)
         y2 = min(self.image_y2, y2)
         
-        self.rect_id = self.canvas.create_rectangle(
-            x1, y1, x2, y2,
-            outline="#27ae60",
-            width=3,
-            dash=(5, 5)
-        )
+        self.view.set_selection((x1, y1, x2, y2))
         
         self.current_rect = (x1, y1, x2, y2)
     
@@ -990,137 +1153,88 @@ class InteractiveAdRemoverGUI:
         if self.drag_start is None or self.current_rect is None:
             return
         
-        # 转换为图片坐标(相对于图片左上角)
-        x1 = int((self.current_rect[0] - self.image_x1) / self.scale)
-        y1 = int((self.current_rect[1] - self.image_y1) / self.scale)
-        x2 = int((self.current_rect[2] - self.image_x1) / self.scale)
-        y2 = int((self.current_rect[3] - self.image_y1) / self.scale)
-        
-        # 确保坐标正确
-        x1, x2 = min(x1, x2), max(x1, x2)
-        y1, y2 = min(y1, y2), max(y1, y2)
+        # 转换为PDF点坐标(未旋转的页面坐标系)
+        region = self.canvas_to_points(self.current_rect)
+        x1, y1, x2, y2 = region
         
         # 检查区域是否有效
         if x2 - x1 > 20 and y2 - y1 > 20:
-            # 使用原始尺寸,不需要坐标转换
-            region = {
-                'x1': x1,
-                'y1': y1,
-                'x2': x2,
-                'y2': y2
-            }
-            
-            print(f"标注区域: ({x1}, {y1}) -> ({x2}, {y2})")
+            print(f"标注区域(点): ({x1:.1f}, {y1:.1f}) -> ({x2:.1f}, {y2:.1f})")
             print(f"图片尺寸: {self.first_page_image.size}")
             
             # 根据框选模式处理
             mode = self.region_mode_var.get()
             
             if mode == "all":
-                # 应用到所有页
-                for page_num in range(self.total_pages):
-                    if page_num not in self.keep_regions:
-                        self.keep_regions[page_num] = []
-                    self.keep_regions[page_num].append(region.copy())
+                # 应用到所有页 - 只保存一份全局区域
+                self.keep_regions.add_global(region)
             else:
                 # 每页各自框选
-                if self.current_page not in self.keep_regions:
-                    self.keep_regions[self.current_page] = []
-                self.keep_regions[self.current_page].append(region)
+                self.keep_regions.add_to_page(self.current_page, region)
             
             # 更新列表显示
             self.update_region_listbox()
             
-            # 绘制永久矩形
-            display_x1 = self.image_x1 + x1 * self.scale
-            display_y1 = self.image_y1 + y1 * self.scale
-            display_x2 = self.image_x1 + x2 * self.scale
-            display_y2 = self.image_y1 + y2 * self.scale
-            
-            self.canvas.create_rectangle(
-                display_x1, display_y1, display_x2, display_y2,
-                outline="#27ae60",
-                width=2
-            )
-            
-            # 添加区域编号标签
-            current_regions = self.keep_regions.get(self.current_page, [])
-            self.canvas.create_text(
-                (display_x1 + display_x2) // 2,
-                (display_y1 + display_y2) // 2,
-                text=str(len(current_regions)),
-                fill="#27ae60",
-                font=("Arial", 16, "bold")
-            )
+            # 更新区域标注(当前页已单独框选时,全局区域不作用于该页)
+            self.redraw_regions()
         
-        # 清除临时矩形
-        if self.rect_id:
-            self.canvas.delete(self.rect_id)
-            self.rect_id = None
+        # 隐藏临时矩形
+        self.view.set_selection(None)
         
         self.drag_start = None
         self.current_rect = None
     
+    def regions_to_canvas(self, regions):
+        """把当前页的点坐标区域数组 (N, 4) 一次转换为画布坐标数组"""
+        matrix = page_to_pixel_matrix(self.page_rotation_matrices[self.current_page], self.preview_zoom)
+        pixels = transform_regions(regions, matrix)
+        return pixels * self.scale + (self.image_x1, self.image_y1, self.image_x1, self.image_y1)
+    
+    def canvas_to_points(self, rect):
+        """把画布上的矩形转换为当前页的点坐标区域 (x1, y1, x2, y2)"""
+        pixels = np.array([[
+            (rect[0] - self.image_x1) / self.scale,
+            (rect[1] - self.image_y1) / self.scale,
+            (rect[2] - self.image_x1) / self.scale,
+            (rect[3] - self.image_y1) / self.scale
+        ]])
+        matrix = page_to_pixel_matrix(self.page_rotation_matrices[self.current_page], self.preview_zoom)
+        return tuple(transform_regions(pixels, invert_matrix(matrix))[0].tolist())
+    
     def update_region_listbox(self):
         """更新区域列表"""
         self.region_listbox.delete(0, tk.END)
         
         mode = self.region_mode_var.get()
+        override_count = self.keep_regions.override_count()
         
         if mode == "all":
-            # 应用到所有页模式 - 显示总区域信息
-            total_regions = sum(len(regions) for regions in self.keep_regions.values())
+            # 应用到所有页模式 - 显示全局区域
+            for i, (x1, y1, x2, y2) in enumerate(self.keep_regions.global_regions.tolist()):
+                text = f"区域{i+1}: 位置({x1:.0f}, {y1:.0f}) 大小{x2 - x1:.0f}×{y2 - y1:.0f}pt [应用到所有{self.total_pages}页]"
+                self.region_listbox.insert(tk.END, text)
             
-            if total_regions > 0:
-                # 显示第一页的区域作为参考
-                if 0 in self.keep_regions:
-                    for i, region in enumerate(self.keep_regions[0]):
-                        width = region['x2'] - region['x1']
-                        height = region['y2'] - region['y1']
-                        text = f"区域{i+1}: 位置({region['x1']}, {region['y1']}) 大小{width}×{height} [应用到所有{self.total_pages}页]"
-                        self.region_listbox.insert(tk.END, text)
-                
-                self.info_label.config(text=f"保留区域数量: {len(self.keep_regions.get(0, []))} (应用到所有{self.total_pages}页)")
-            else:
-                self.info_label.config(text=f"保留区域数量: 0 (应用到所有{self.total_pages}页)")
+            info_text = f"保留区域数量: {len(self.keep_regions.global_regions)} (应用到所有{self.total_pages}页)"
+            if override_count:
+                info_text += f", {override_count}页单独框选"
+            self.info_label.config(text=info_text)
         else:
             # 每页各自框选模式 - 显示当前页的区域
-            if self.current_page in self.keep_regions:
-                for i, region in enumerate(self.keep_regions[self.current_page]):
-                    width = region['x2'] - region['x1']
-                    height = region['y2'] - region['y1']
-                    text = f"第{self.current_page+1}页 区域{i+1}: 位置({region['x1']}, {region['y1']}) 大小{width}×{height}"
-                    self.region_listbox.insert(tk.END, text)
+            current_regions = self.keep_regions.get(self.current_page)
+            for i, (x1, y1, x2, y2) in enumerate(current_regions.tolist()):
+                text = f"第{self.current_page+1}页 区域{i+1}: 位置({x1:.0f}, {y1:.0f}) 大小{x2 - x1:.0f}×{y2 - y1:.0f}pt"
+                self.region_listbox.insert(tk.END, text)
             
-            # 计算总区域数
-            total_regions = sum(len(regions) for regions in self.keep_regions.values())
-            self.info_label.config(text=f"保留区域数量: {total_regions} (当前页: {len(self.keep_regions.get(self.current_page, []))})")
+            self.info_label.config(
+                text=f"全局区域: {len(self.keep_regions.global_regions)}, 单独框选: {override_count}页 (当前页: {len(current_regions)})"
+            )
     
     def redraw_regions(self):
-        """重绘当前页的所有已选择的区域"""
-        if self.current_page in self.keep_regions:
-            for i, region in enumerate(self.keep_regions[self.current_page]):
-                # 现在使用原始尺寸,直接使用坐标
-                display_x1 = self.image_x1 + region['x1'] * self.scale
-                display_y1 = self.image_y1 + region['y1'] * self.scale
-                display_x2 = self.image_x1 + region['x2'] * self.scale
-                display_y2 = self.image_y1 + region['y2'] * self.scale
-                
-                self.canvas.create_rectangle(
-                    display_x1, display_y1, display_x2, display_y2,
-                    outline="#27ae60",
-                    width=2
-                )
-                
-                # 添加区域编号标签
-                center_x = (display_x1 + display_x2) // 2
-                center_y = (display_y1 + display_y2) // 2
-                self.canvas.create_text(
-                    center_x, center_y,
-                    text=str(i + 1),
-                    fill="#27ae60",
-                    font=("Arial", 16, "bold")
-                )
+        """更新当前页所有已选择区域的标注,复用画布上已有的图元"""
+        if self.first_page_image is None:
+            return
+        # 点坐标 -> 画布坐标
+        self.view.set_regions(self.regions_to_canvas(self.keep_regions.get(self.current_page)).tolist())
     
     def delete_selected_region(self):
         """删除选中的区域"""
@@ -1133,46 +1247,32 @@ class InteractiveAdRemoverGUI:
         index = selection[0]
         
         if mode == "all":
-            # 应用到所有页模式 - 删除所有页对应的区域
-            for page_num in range(self.total_pages):
-                if page_num in self.keep_regions and index < len(self.keep_regions[page_num]):
-                    del self.keep_regions[page_num][index]
-                    # 如果该页没有区域了,删除该页的键
-                    if not self.keep_regions[page_num]:
-                        del self.keep_regions[page_num]
+            # 应用到所有页模式 - 删除全局区域
+            self.keep_regions.remove_global(index)
         else:
             # 每页各自框选模式 - 只删除当前页的区域
-            if self.current_page not in self.keep_regions:
-                return
-            
-            del self.keep_regions[self.current_page][index]
-            # 如果该页没有区域了,删除该页的键
-            if not self.keep_regions[self.current_page]:
-                del self.keep_regions[self.current_page]
+            self.keep_regions.remove_from_page(self.current_page, index)
         
         # 更新显示
         self.update_region_listbox()
-        self.canvas.delete("all")
-        self.display_image()
+        self.redraw_regions()
     
     def clear_all_regions(self):
         """清空所有区域"""
-        total_regions = sum(len(regions) for regions in self.keep_regions.values())
-        if total_regions == 0:
+        if not self.keep_regions:
             return
         
         mode = self.region_mode_var.get()
         
         if mode == "all":
-            confirm_text = f"确定要清空所有 {len(self.keep_regions.get(0, []))} 个保留区域吗?\n(这将从所有 {self.total_pages} 页中删除)"
+            confirm_text = f"确定要清空所有 {len(self.keep_regions.global_regions)} 个保留区域吗?\n(这将从所有 {self.total_pages} 页中删除)"
         else:
-            confirm_text = f"确定要清空所有 {total_regions} 个保留区域吗?"
+            confirm_text = f"确定要清空所有保留区域吗?\n(包括 {self.keep_regions.override_count()} 页的单独框选)"
         
         if messagebox.askyesno("确认", confirm_text):
-            self.keep_regions = {}
+            self.keep_regions.clear()
             self.update_region_listbox()
-            self.canvas.delete("all")
-            self.display_image()
+            self.redraw_regions()
     
     def start_processing(self):
         """开始处理PDF"""
@@ -1187,37 +1287,111 @@ class InteractiveAdRemoverGUI:
         
         # 禁用按钮,防止重复点击
         self.process_button.config(state="disabled", text="处理中...")
-        self.progress.start()
+        self.cancel_button.config(state="normal")
+        self.progress.config(value=0, maximum=1)
         self.status_label.config(text="⏳ 正在处理PDF...", fg="#f39c12")
+        self.cancel_token = CancelToken()
         
         # 在新线程中处理,避免阻塞GUI
-        thread = threading.Thread(target=self.process_pdf)
+        thread = threading.Thread(target=self.process_pdf, args=(self.cancel_token,))
         thread.start()
     
-    def process_pdf(self):
+    def cancel_processing(self):
+        """取消正在进行的处理"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.cancel_button.config(state="disabled")
+            self.status_label.config(text="⏳ 正在取消...", fg="#f39c12")
+    
+    def on_close(self):
+        """关闭窗口: 取消加载和处理,处理线程会在当前页结束后清理输出并退出"""
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        self.all_pages_images.close()
+        self.root.destroy()
+    
+    def post_to_ui(self, func, *args):
+        """从处理线程把回调切换到界面线程,窗口已关闭时忽略"""
+        try:
+            self.root.after(0, func, *args)
+        except (RuntimeError, tk.TclError):
+            pass
+    
+    def process_pdf(self, cancel_token):
         """处理PDF文件"""
         try:
             # 创建保留区域处理器
             remover = KeepRegionRemover(
                 self.keep_regions,
-                self.remove_margin_var.get()
+                self.remove_margin_var.get(),
+                memory_budget=MemoryBudget(max_memory_mb=self.memory_mb_var.get()),
+                optimize_output=self.optimize_output_var.get(),
+                cache=ResultCache() if self.use_cache_var.get() else None,
+                page_provider=self.make_page_provider(),
+                color_mode=self.color_mode_var.get()
             )
             
-            # 处理PDF
-            output_pdf = remover.process_pdf(self.pdf_file_path)
+            # 处理PDF,进度回调切换到界面线程更新进度条
+            output_pdf = remover.process_pdf(
+                self.pdf_file_path,
+                dpi=self.output_dpi_var.get(),
+                progress_callback=lambda progress: self.post_to_ui(self.on_progress, progress),
+                cancel_token=cancel_token
+            )
             self.output_pdf_path = output_pdf
             
             # 处理完成
-            self.root.after(0, lambda: self.processing_completed(True, output_pdf))
+            self.post_to_ui(self.processing_completed, True, output_pdf)
+            
+        except ProcessingCancelled:
+            self.post_to_ui(self.processing_cancelled)
             
         except Exception as e:
             # 处理失败
-            self.root.after(0, lambda: self.processing_completed(False, str(e)))
+            self.post_to_ui(self.processing_completed, False, str(e))
+    
+    def make_page_provider(self):
+        """
+        把已加载的预览图片提供给 KeepRegionRemover,输出倍数与预览倍数相同的页面不再重新渲染
+        
+        Returns:
+            page_provider(页码, 渲染倍数) 函数,返回OpenCV图像,没有可用的预览时返回 None
+        """
+        pages_images = self.all_pages_images
+        preview_zoom = self.preview_zoom
+        
+        def page_provider(page_num, zoom):
+            # 处理期间重新打开了PDF时,缓存对象会被替换,不再使用旧的预览
+            if zoom != preview_zoom or pages_images is not self.all_pages_images:
+                return None
+            pixels = pages_images.array(page_num) if page_num < len(pages_images) else None
+            if pixels is None:
+                return None
+            return cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+        
+        return page_provider
+    
+    def on_progress(self, progress):
+        """处理进度回调(界面线程)"""
+        self.progress.config(maximum=max(progress['total_pages'], 1), value=progress['pages_done'])
+        self.status_label.config(text=f"⏳ {format_progress(progress)}", fg="#f39c12")
+    
+    def processing_cancelled(self):
+        """处理取消回调"""
+        self.cancel_token = None
+        self.progress.config(value=0)
+        self.process_button.config(state="normal", text="✅ 应用并处理PDF")
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text="⏹ 处理已取消,未保留不完整的输出", fg="#7f8c8d")
     
     def processing_completed(self, success, result):
         """处理完成回调"""
-        self.progress.stop()
+        self.cancel_token = None
+        self.progress.config(value=self.progress.cget("maximum") if success else 0)
         self.process_button.config(state="normal", text="✅ 应用并处理PDF")
+        self.cancel_button.config(state="disabled")
         
         if success:
             self.status_label.config(
@@ -1247,198 +1421,248 @@ class InteractiveAdRemoverGUI:
             compare_gui = ComparePreviewGUI(
                 compare_window,
                 self.pdf_file_path,
-                self.output_pdf_path
+                self.output_pdf_path,
+                use_cache=self.use_cache_var.get()
             )
 
 
-class KeepRegionRemover:
-    """保留区域处理器"""
+class PageCanvas:
+    """
+    画布上的常驻图元: 页面图片、图片边框、提示文字、拖动中的框选矩形和区域标注
+    
+    图元只创建一次,之后通过 itemconfig 和 coords 更新,不需要的图元隐藏而不删除;
+    页面图片只在页面或显示尺寸改变时重新缩放,拖动框选矩形时只移动这一个图元。
+    """
+    
+    REGION_COLOR = "#27ae60"
     
-    def __init__(self, keep_regions, remove_margins=True):
+    def __init__(self, canvas, border_color=None):
         """
-        初始化保留区域处理器
+        初始化画布图元
         
         Args:
-            keep_regions: 要保留的区域字典 {页码: [{'x1':, 'y1':, 'x2':, 'y2':}, ...]}
-            remove_margins: 是否去除保留区域外的白边
+            canvas: tk.Canvas对象
+            border_color: 图片边框颜色,为None时不显示边框
         """
-        self.keep_regions = keep_regions
-        self.remove_margins = remove_margins
+        self.canvas = canvas
+        self.image_item = canvas.create_image(0, 0, anchor="nw", state="hidden")
+        self.border_item = None
+        if border_color:
+            self.border_item = canvas.create_rectangle(0, 0, 0, 0, outline=border_color, width=2, state="hidden")
+        self.selection_item = canvas.create_rectangle(
+            0, 0, 0, 0, outline=self.REGION_COLOR, width=3, dash=(5, 5), state="hidden"
+        )
+        self.message_item = canvas.create_text(0, 0, font=("Arial", 14), state="hidden")
+        self.region_items = []   # [(矩形, 编号文字)],多出的图元隐藏备用
+        self.region_count = 0
+        self.photo = None        # 当前显示的PhotoImage,保存引用防止被垃圾回收
+        self.image_key = None    # 当前图片对应的 (页码, 宽度, 高度)
     
-    def process_pdf(self, pdf_path, output_pdf_path=None):
+    def show_image(self, key, image, x, y, width, height):
         """
-        处理PDF文件,保留指定区域并去除白边
+        显示页面图片,key 与当前显示的图片相同时不重新缩放,只移动位置
         
         Args:
-            pdf_path: 输入PDF文件路径
-            output_pdf_path: 输出PDF文件路径
-            
-        Returns:
-            处理后的PDF文件路径
+            key: 标识页面和显示尺寸的元组,如 (页码, 宽度, 高度)
+            image: 原尺寸PIL图片
+            x, y: 图片左上角在画布上的位置
+            width, height: 显示尺寸
         """
-        try:
-            import fitz
-            import io
-        except ImportError:
-            raise Exception("请先安装pymupdf: pip install pymupdf")
-        
-        # 设置输出PDF路径
-        if output_pdf_path is None:
-            base_name = os.path.splitext(pdf_path)[0]
-            output_pdf_path = f"{base_name}_cleaned.pdf"
-        
-        # 打开PDF文件
-        pdf_document = fitz.open(pdf_path)
-        
-        # 创建新的PDF文档
-        output_pdf = fitz.open()
-        
-        for i, page in enumerate(pdf_document):
-            # 获取页面的原始尺寸
-            page_rect = page.rect
-            page_width = page_rect.width
-            page_height = page_rect.height
-            
-            print(f"\n处理第 {i+1} 页:")
-            print(f"  原始PDF尺寸: {page_width:.0f}x{page_height:.0f}")
-            
-            # 使用原始分辨率转换页面为图片
-            mat = fitz.Matrix(1, 1)  # 使用1倍缩放,保持原始分辨率
-            pix = page.get_pixmap(matrix=mat)
-            
-            print(f"  Pixmap尺寸: {pix.width}x{pix.height}")
-            
-            # 转换为OpenCV格式
-            img_data = pix.tobytes("png")
-            image = cv2.imdecode(
-                np.frombuffer(img_data, np.uint8),
-                cv2.IMREAD_COLOR
-            )
-            
-            print(f"  OpenCV图像尺寸: {image.shape[1]}x{image.shape[0]}")
-            
-            # 处理保留区域(使用当前页的区域)
-            current_regions = self.keep_regions.get(i, [])
-            print(f"  保留区域数量: {len(current_regions)}")
-            for j, region in enumerate(current_regions):
-                print(f"    区域{j+1}: ({region['x1']}, {region['y1']}) -> ({region['x2']}, {region['y2']})")
-            
-            image = self.process_keep_regions(image, current_regions)
-            
-            print(f"  处理后图像尺寸: {image.shape[1]}x{image.shape[0]}")
-            
-            # 如果需要去除白边
-            if self.remove_margins:
-                image = self.remove_white_margins(image)
-                print(f"  去除白边后尺寸: {image.shape[1]}x{image.shape[0]}")
-            
-            # 转换为PIL Image
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            
-            # 转换为字节流,使用PNG格式保持原始清晰度
-            img_bytes = io.BytesIO()
-            pil_image.save(img_bytes, format="PNG")
-            img_bytes.seek(0)
-            
-            # 创建新页面,使用处理后的图片尺寸
-            new_page = output_pdf.new_page(
-                width=pil_image.width,
-                height=pil_image.height
-            )
-            new_page.insert_image(
-                new_page.rect,
-                stream=img_bytes.getvalue()
-            )
-            
-            print(f"  最终输出尺寸: {pil_image.width}x{pil_image.height}")
-        
-        # 保存输出PDF,启用压缩
-        output_pdf.save(output_pdf_path, deflate=True)
-        output_pdf.close()
-        pdf_document.close()
-        
-        return output_pdf_path
+        canvas = self.canvas
+        if key != self.image_key:
+            self.photo = ImageTk.PhotoImage(image.resize((width, height), Image.LANCZOS))
+            canvas.itemconfig(self.image_item, image=self.photo)
+            self.image_key = key
+        canvas.coords(self.image_item, x, y)
+        canvas.itemconfig(self.image_item, state="normal")
+        if self.border_item is not None:
+            canvas.coords(self.border_item, x - 2, y - 2, x + width + 2, y + height + 2)
+            canvas.itemconfig(self.border_item, state="normal")
+        canvas.itemconfig(self.message_item, state="hidden")
+    
+    def show_message(self, text, fill="black"):
+        """隐藏页面图片和标注,在画布中央显示提示文字"""
+        canvas = self.canvas
+        self.hide_page()
+        canvas.coords(self.message_item, canvas.winfo_width() // 2, canvas.winfo_height() // 2)
+        canvas.itemconfig(self.message_item, text=text, fill=fill, state="normal")
     
-    def process_keep_regions(self, image, regions):
+    def hide_page(self):
+        """隐藏页面图片、边框、框选矩形和区域标注"""
+        canvas = self.canvas
+        canvas.itemconfig(self.image_item, state="hidden")
+        if self.border_item is not None:
+            canvas.itemconfig(self.border_item, state="hidden")
+        self.set_selection(None)
+        self.set_regions(())
+    
+    def clear(self):
+        """隐藏所有图元并释放图片,打开新文档时调用"""
+        self.hide_page()
+        self.canvas.itemconfig(self.message_item, state="hidden")
+        self.canvas.itemconfig(self.image_item, image="")
+        self.photo = None
+        self.image_key = None
+    
+    def set_selection(self, rect):
         """
-        处理保留区域,将保留区域外的内容用白色覆盖
+        移动拖动中的框选矩形
         
         Args:
-            image: OpenCV图像对象
-            regions: 当前页的保留区域列表 [{'x1':, 'y1':, 'x2':, 'y2':}, ...]
-            
-        Returns:
-            处理后的图像
+            rect: 画布坐标 (x1, y1, x2, y2),为None时隐藏
         """
-        # 如果没有保留区域,返回原图
-        if not regions:
-            return image
-        
-        # 创建白色覆盖层
-        white_color = (255, 255, 255)
-        mask = np.zeros(image.shape[:2], dtype=np.uint8)
-        
-        # 为每个保留区域创建掩码
-        for region in regions:
-            x1 = region['x1']
-            y1 = region['y1']
-            x2 = region['x2']
-            y2 = region['y2']
-            
-            # 确保坐标在图像范围内
-            height, width = image.shape[:2]
-            x1 = max(0, min(x1, width))
-            y1 = max(0, min(y1, height))
-            x2 = max(0, min(x2, width))
-            y2 = max(0, min(y2, height))
-            
-            # 在掩码上标记保留区域
-            mask[y1:y2, x1:x2] = 255
-        
-        # 创建白色图像
-        white_image = np.full(image.shape, white_color, dtype=np.uint8)
+        if rect is None:
+            self.canvas.itemconfig(self.selection_item, state="hidden")
+        else:
+            self.canvas.coords(self.selection_item, *rect)
+            self.canvas.itemconfig(self.selection_item, state="normal")
+    
+    def set_regions(self, rects):
+        """
+        显示区域标注(矩形和从1开始的编号),复用已有的图元,只更新变化的数量
         
-        # 使用掩码合并图像
-        result = np.where(mask[:, :, np.newaxis] == 255, image, white_image)
+        Args:
+            rects: 画布坐标数组,形状为 (N, 4),每行为 (x1, y1, x2, y2)
+        """
+        canvas = self.canvas
+        count = len(rects)
+        for i, (x1, y1, x2, y2) in enumerate(rects):
+            if i < len(self.region_items):
+                rect_item, label_item = self.region_items[i]
+                canvas.coords(rect_item, x1, y1, x2, y2)
+                canvas.coords(label_item, (x1 + x2) // 2, (y1 + y2) // 2)
+                if i >= self.region_count:
+                    canvas.itemconfig(rect_item, state="normal")
+                    canvas.itemconfig(label_item, state="normal")
+            else:
+                rect_item = canvas.create_rectangle(x1, y1, x2, y2, outline=self.REGION_COLOR, width=2)
+                label_item = canvas.create_text(
+                    (x1 + x2) // 2, (y1 + y2) // 2,
+                    text=str(i + 1),
+                    fill=self.REGION_COLOR,
+                    font=("Arial", 16, "bold")
+                )
+                self.region_items.append((rect_item, label_item))
+                # 新建的图元在最上层,框选矩形和提示文字仍要显示在它们之上
+                canvas.tag_raise(self.selection_item)
+                canvas.tag_raise(self.message_item)
+        for rect_item, label_item in self.region_items[count:self.region_count]:
+            canvas.itemconfig(rect_item, state="hidden")
+            canvas.itemconfig(label_item, state="hidden")
+        self.region_count = count
+
+
+class PageLoader:
+    """
+    后台页面加载器
+    
+    在后台线程中渲染PDF页面并写入 PageRasterStore,通过线程安全的队列发送进度事件,由界面线程定时轮询,
+    页面图片从存储中读取。同一文档之前已渲染的页面不再渲染。
+    每次使用fitz时取得 FITZ_LOCK: 多个加载器逐页交替渲染,处理器运行期间(持有锁)加载暂停。事件为元组:
+        ("opened", 总页数)
+        ("page", 页码, 页面旋转矩阵)
+        ("done", 已加载页数)
+        ("cancelled", 已加载页数)
+        ("error", 错误信息)
+    """
+    
+    def __init__(self, pdf_path, store, zoom=1.0):
+        """
+        初始化页面加载器
         
-        return result
+        Args:
+            pdf_path: PDF文件路径
+            store: PageRasterStore对象,由加载器打开并写入
+            zoom: 渲染倍数
+        """
+        self.pdf_path = pdf_path
+        self.store = store
+        self.zoom = zoom
+        self.events = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        """启动后台加载"""
+        self._thread.start()
+        return self
+    
+    def cancel(self):
+        """请求取消加载,后台线程在渲染下一页之前退出"""
+        self._cancel_event.set()
     
-    def remove_white_margins(self, image):
+    def is_running(self):
+        """后台线程是否仍在运行"""
+        return self._thread.is_alive()
+    
+    def poll(self, max_events=20):
         """
-        去除图片四周的白边
+        取出已到达的事件,不阻塞
         
         Args:
-            image: OpenCV图像对象
+            max_events: 单次最多取出的事件数,避免一次处理太多阻塞界面
             
         Returns:
-            去除白边后的图像
+            事件列表
         """
-        # 转换为灰度图
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 使用阈值检测白色区域
-        _, binary = cv2.threshold(gray, 250, 255, cv2.THRESH_BINARY)
-        
-        # 查找非白色区域的边界
-        coords = cv2.findNonZero(cv2.bitwise_not(binary))
-        
-        if coords is None:
-            # 如果整个图片都是白色,返回原图
-            return image
-        
-        # 获取边界坐标
-        x, y, w, h = cv2.boundingRect(coords)
-        
-        # 裁剪图片
-        result = image[y:y+h, x:x+w]
-        
-        return result
+        events = []
+        while len(events) < max_events:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+    
+    def _run(self):
+        """后台线程: 逐页渲染"""
+        loaded = 0
+        pdf_document = None
+        try:
+            import fitz
+            
+            with FITZ_LOCK:
+                pdf_document = fitz.open(self.pdf_path)
+                total = len(pdf_document)
+                if total == 0:
+                    self.events.put(("error", "PDF文件为空!"))
+                    return
+                self.store.open(self.pdf_path, self.zoom, planned_page_shapes(pdf_document, self.zoom))
+            self.events.put(("opened", total))
+            
+            mat = fitz.Matrix(self.zoom, self.zoom)
+            for i in range(total):
+                if self._cancel_event.is_set():
+                    self.events.put(("cancelled", loaded))
+                    return
+                
+                with FITZ_LOCK:
+                    rotation_matrix = self._load_page(pdf_document, i, mat)
+                self.events.put(("page", i, rotation_matrix))
+                loaded += 1
+            
+            self.events.put(("done", loaded))
+        except Exception as e:
+            self.events.put(("error", str(e)))
+        finally:
+            if pdf_document is not None:
+                with FITZ_LOCK:
+                    pdf_document.close()
+    
+    def _load_page(self, pdf_document, page_num, mat):
+        """渲染一页写入存储(已渲染过的页跳过),返回页面旋转矩阵;调用方持有 FITZ_LOCK"""
+        page = pdf_document[page_num]
+        if not self.store.is_loaded(page_num):
+            # 像素缓冲区直接写入存储,省去PNG编解码和颜色转换
+            pix = page.get_pixmap(matrix=mat, alpha=False)
+            self.store[page_num] = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, pix.n)
+        return tuple(page.rotation_matrix)
 
 
 def main():
     """主函数"""
     root = tk.Tk()
     app = InteractiveAdRemoverGUI(root)
+    preload_in_background(root)
     root.mainloop()
 
 
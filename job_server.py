@@ -0,0 +1,699 @@
+"""
+本地HTTP任务服务
+让其他程序通过HTTP提交PDF处理任务,不必调用命令行。只使用标准库,默认只监听本机。
+
+用法:
+  python job_server.py [--host 127.0.0.1] [--port 8765] [--workers 2] [--queue-size 8]
+
+接口:
+  POST   /jobs?engine=ad&...        请求体为PDF文件,返回任务状态(202);队列已满时返回 429
+  GET    /jobs                      所有任务的状态
+  GET    /jobs/<任务ID>             任务状态,包括排队、处理和总用时
+  GET    /jobs/<任务ID>/result      下载处理后的PDF(任务完成前返回 409)
+  DELETE /jobs/<任务ID>             取消任务并删除文件
+  GET    /health                    服务状态
+
+任务参数(查询参数):
+  engine=ad     去广告(PDFAdRemover): ad_height(广告区域占页面高度的比例,默认0.15), adaptive_band=1,
+                consensus=1, color_mode=auto|color|gray, optimize=1, cache=0, pages=起始页-结束页
+  engine=keep   保留区域(KeepRegionRemover): regions(JSON,必填), dpi(默认72), remove_margins=0,
+                color_mode, optimize=1, cache=0, pages
+                regions 为 [[x1, y1, x2, y2], ...] 时应用到所有页,为 {"页码": [[x1, y1, x2, y2], ...]} 时
+                只应用到这些页(页码从1开始);坐标单位为PDF点,与 KeepRegions 相同
+
+例:
+  curl --data-binary @input.pdf "http://127.0.0.1:8765/jobs?engine=ad&adaptive_band=1"
+  curl http://127.0.0.1:8765/jobs/<任务ID>
+  curl -o output.pdf http://127.0.0.1:8765/jobs/<任务ID>/result
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import argparse
+import signal
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, CancelledError, wait
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ENGINES = ("ad", "keep")
+
+
+def parse_flag(value):
+    """解析 1/0、true/false 形式的开关参数"""
+    text = value.lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"无效的开关值: {value}")
+
+
+def parse_regions(text):
+    """
+    解析保留区域参数
+    
+    Args:
+        text: JSON,[[x1, y1, x2, y2], ...] 应用到所有页,{"页码": [...]} 只应用到这些页(页码从1开始)
+        
+    Returns:
+        KeepRegions对象
+    """
+    from cleaning_core import KeepRegions
+    
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise ValueError("regions 不是有效的JSON")
+    
+    keep_regions = KeepRegions()
+    try:
+        if isinstance(data, list):
+            for region in data:
+                keep_regions.add_global(region)
+        elif isinstance(data, dict):
+            for page, regions in data.items():
+                if int(page) < 1:
+                    raise ValueError
+                for region in regions:
+                    keep_regions.add_to_page(int(page) - 1, region)
+        else:
+            raise ValueError
+    except (TypeError, ValueError, KeyError):
+        raise ValueError("regions 应为 [[x1, y1, x2, y2], ...] 或 {\"页码\": [[x1, y1, x2, y2], ...]}")
+    if not keep_regions:
+        raise ValueError("regions 不能为空")
+    return keep_regions
+
+
+def parse_number(text, name, cast, low, high):
+    """解析数值参数并检查范围"""
+    try:
+        value = cast(text)
+    except ValueError:
+        raise ValueError(f"{name} 不是有效的数值: {text}")
+    if not low <= value <= high:
+        raise ValueError(f"{name} 应在 {low} 到 {high} 之间")
+    return value
+
+
+def parse_job_options(query):
+    """
+    解析并检查任务参数
+    
+    Args:
+        query: parse_qs() 的结果
+        
+    Returns:
+        (engine, 参数字典)
+    """
+    from cleaning_core import COLOR_MODES
+    from pdf_shards import parse_page_range
+    
+    params = {name: values[-1] for name, values in query.items()}
+    engine = params.pop('engine', "ad")
+    if engine not in ENGINES:
+        raise ValueError(f"engine 应为 {'/'.join(ENGINES)}")
+    
+    options = {
+        'color_mode': params.pop('color_mode', "auto"),
+        'optimize': parse_flag(params.pop('optimize', "0")),
+        'cache': parse_flag(params.pop('cache', "1")),
+        'pages': parse_page_range(params.pop('pages')) if 'pages' in params else None
+    }
+    if options['color_mode'] not in COLOR_MODES:
+        raise ValueError(f"color_mode 应为 {'/'.join(COLOR_MODES)}")
+    
+    if engine == "ad":
+        options['ad_height'] = parse_number(params.pop('ad_height', "0.15"), "ad_height", float, 0.01, 0.9)
+        options['adaptive_band'] = parse_flag(params.pop('adaptive_band', "0"))
+        options['consensus'] = parse_flag(params.pop('consensus', "0"))
+    else:
+        if 'regions' not in params:
+            raise ValueError("engine=keep 需要 regions 参数")
+        options['regions'] = parse_regions(params.pop('regions'))
+        options['dpi'] = parse_number(params.pop('dpi', "72"), "dpi", int, 18, 1200)
+        options['remove_margins'] = parse_flag(params.pop('remove_margins', "1"))
+    
+    if params:
+        raise ValueError(f"未知参数: {', '.join(sorted(params))}")
+    return engine, options
+
+
+def make_job_remover(engine, options, memory_mb):
+    """
+    按任务参数创建处理器
+    
+    Args:
+        engine: "ad" 或 "keep"
+        options: parse_job_options() 的参数字典
+        memory_mb: 内存上限(MB)
+        
+    Returns:
+        PDFAdRemover 或 KeepRegionRemover 对象
+    """
+    from cleaning_core import PDFAdRemover, KeepRegionRemover, MemoryBudget
+    from result_cache import ResultCache
+    
+    common = {
+        'memory_budget': MemoryBudget(max_memory_mb=memory_mb),
+        'optimize_output': options['optimize'],
+        'cache': ResultCache() if options['cache'] else None,
+        'color_mode': options['color_mode']
+    }
+    if engine == "ad":
+        return PDFAdRemover(
+            ad_height_percent=options['ad_height'],
+            footer_consensus=options['consensus'],
+            adaptive_band=options['adaptive_band'],
+            **common
+        )
+    return KeepRegionRemover(
+        options['regions'],
+        remove_margins=options['remove_margins'],
+        **common
+    )
+
+
+def init_job_worker():
+    """工作进程初始化: 提前导入依赖,Ctrl+C 由主进程处理"""
+    from lazy_modules import preload_modules
+    
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    preload_modules(("numpy", "cv2", "fitz"))
+
+
+def process_job(engine, options, memory_mb, input_path, output_path, progress_path, cancel_path):
+    """
+    在工作进程中处理一个任务
+    
+    PyMuPDF 不是线程安全的,每个任务在单独的进程中打开和渲染PDF。进度写入 progress_path,
+    主进程创建 cancel_path 文件表示取消,每处理完一页检查一次。
+    
+    Args:
+        engine: "ad" 或 "keep"
+        options: parse_job_options() 的参数字典
+        memory_mb: 内存上限(MB)
+        input_path: 输入PDF路径
+        output_path: 输出PDF路径
+        progress_path: 进度文件路径
+        cancel_path: 取消标记文件路径
+        
+    Returns:
+        处理器的运行报告(last_report)
+    """
+    from cleaning_core import CancelToken
+    from watch_folder import write_json_atomic
+    
+    cancel_token = CancelToken()
+    
+    def progress_callback(progress):
+        write_json_atomic(progress_path, {
+            'pages_done': progress['pages_done'],
+            'total_pages': progress['total_pages']
+        })
+        if os.path.exists(cancel_path):
+            cancel_token.cancel()
+    
+    if os.path.exists(cancel_path):
+        cancel_token.cancel()
+    remover = make_job_remover(engine, options, memory_mb)
+    if engine == "ad":
+        remover.batch_process_pdf_to_pdf(
+            input_path, output_path,
+            progress_callback=progress_callback,
+            cancel_token=cancel_token,
+            pages=options['pages']
+        )
+    else:
+        remover.process_pdf(
+            input_path, output_path,
+            dpi=options['dpi'],
+            progress_callback=progress_callback,
+            cancel_token=cancel_token,
+            pages=options['pages']
+        )
+    return remover.last_report
+
+
+class Job:
+    """一个处理任务"""
+    
+    def __init__(self, job_dir, engine, options):
+        """
+        初始化任务
+        
+        Args:
+            job_dir: 任务目录,存放输入和输出PDF
+            engine: "ad" 或 "keep"
+            options: parse_job_options() 的参数字典
+        """
+        from cleaning_core import CancelToken
+        
+        self.id = os.path.basename(job_dir)
+        self.job_dir = job_dir
+        self.input_path = os.path.join(job_dir, "input.pdf")
+        self.output_path = os.path.join(job_dir, "output.pdf")
+        self.progress_path = os.path.join(job_dir, "progress.json")
+        self.cancel_path = os.path.join(job_dir, "cancel")
+        self.engine = engine
+        self.options = options
+        self.status = "queued"  # queued / running / done / failed / cancelled
+        self.error = None
+        self.progress = None
+        self.report = None
+        self.cancel_token = CancelToken()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+    
+    def cancel(self):
+        """请求取消;工作进程通过任务目录中的取消标记文件得知"""
+        self.cancel_token.cancel()
+        try:
+            open(self.cancel_path, "w").close()
+        except OSError:
+            pass  # 任务目录已删除
+    
+    def read_progress(self):
+        """读取工作进程写入的进度"""
+        try:
+            with open(self.progress_path, encoding="utf-8") as f:
+                self.progress = json.load(f)
+        except (OSError, ValueError):
+            pass
+    
+    @property
+    def finished_status(self):
+        return self.status in ("done", "failed", "cancelled")
+    
+    def timing(self):
+        """排队、处理和总用时(秒),尚未开始处理时 run_seconds 为 None"""
+        now = time.time()
+        return {
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'queue_seconds': (self.started or self.finished or now) - self.created,
+            'run_seconds': (self.finished or now) - self.started if self.started else None,
+            'total_seconds': (self.finished or now) - self.created
+        }
+    
+    def to_dict(self):
+        """任务状态,作为接口的响应"""
+        return {
+            'id': self.id,
+            'engine': self.engine,
+            'status': self.status,
+            'error': self.error,
+            'progress': self.progress,
+            'timing': self.timing(),
+            'report': self.report,
+            'result_url': f"/jobs/{self.id}/result" if self.status == "done" else None
+        }
+
+
+class JobServer:
+    """
+    任务队列和工作进程
+    
+    任务放入有界队列,由固定数量的调度线程依次取出,交给同样数量的工作进程处理
+    (PyMuPDF 不是线程安全的,不能在多个线程中同时打开和渲染PDF);队列已满时拒绝新任务(接口返回429)。
+    工作进程异常退出时该任务失败,并重建进程池。
+    完成的任务保留 max_finished 个,超出时删除最早完成的任务及其文件。
+    """
+    
+    def __init__(self, work_dir=None, workers=2, queue_size=8, memory_mb=1024, max_finished=100):
+        """
+        初始化任务服务
+        
+        Args:
+            work_dir: 存放任务文件的目录,为None时使用临时目录(退出时删除)
+            workers: 工作进程数
+            queue_size: 排队任务数上限
+            memory_mb: 每个任务的内存上限(MB)
+            max_finished: 最多保留的已完成任务数
+        """
+        self.own_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="img-pdf-jobs-")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.memory_mb = memory_mb
+        self.max_finished = max_finished
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = {}  # 任务ID -> Job,按提交顺序
+        self.lock = threading.Lock()
+        self.threads = []
+        self.executor = None
+    
+    def start(self):
+        """启动工作进程池和调度线程"""
+        self.executor = self.make_executor()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def stop(self):
+        """取消所有任务并停止调度线程和工作进程"""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+        # 清空队列,再让每个调度线程取到一个结束标记
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self.own_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+    
+    def submit(self, pdf_data, engine, options):
+        """
+        提交任务
+        
+        Args:
+            pdf_data: PDF文件内容
+            engine: "ad" 或 "keep"
+            options: parse_job_options() 的参数字典
+            
+        Returns:
+            Job对象
+            
+        Raises:
+            queue.Full: 排队任务已达上限
+        """
+        if self.queue.full():
+            raise queue.Full
+        job_dir = os.path.join(self.work_dir, uuid.uuid4().hex)
+        os.makedirs(job_dir)
+        job = Job(job_dir, engine, options)
+        with open(job.input_path, "wb") as f:
+            f.write(pdf_data)
+        
+        # 先登记再入队: 调度线程取到任务时它必须已在 self.jobs 中,否则处理完会被当作已删除
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job.id, None)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        return job
+    
+    def get(self, job_id):
+        """按ID查找任务,不存在时返回 None"""
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def delete(self, job_id):
+        """
+        取消任务并删除其文件;正在处理的任务在当前页处理完后停止
+        
+        Returns:
+            是否存在该任务
+        """
+        # 状态的检查和修改与调度线程开始处理(_worker)在同一把锁下,不会与其交错
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job.cancel()
+            running = job.status == "running"
+            if not running and not job.finished_status:
+                job.status = "cancelled"
+                job.finished = time.time()
+        # 正在处理的任务由调度线程在处理完后删除文件
+        if not running:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+        return True
+    
+    def health(self):
+        """服务状态"""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queued': self.queue.qsize(),
+            'jobs': counts
+        }
+    
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                if job.status == "cancelled":
+                    continue
+                job.status = "running"
+                job.started = time.time()
+            self.run_job(job)
+            self._evict_finished()
+            if self.get(job.id) is None:
+                # 处理期间已被删除
+                shutil.rmtree(job.job_dir, ignore_errors=True)
+    
+    def run_job(self, job):
+        """在调度线程中把任务交给工作进程,等待完成并更新进度"""
+        from cleaning_core import ProcessingCancelled
+        
+        executor = self.executor
+        report = error = None
+        try:
+            future = executor.submit(
+                process_job, job.engine, job.options, self.memory_mb,
+                job.input_path, job.output_path, job.progress_path, job.cancel_path
+            )
+            while not wait([future], timeout=0.5).done:
+                job.read_progress()
+            job.read_progress()
+            report = future.result()
+            status = "done"
+        except (ProcessingCancelled, CancelledError):
+            status = "cancelled"
+        except BrokenProcessPool:
+            error, status = "工作进程异常退出", "failed"
+            self.restart_executor(executor)
+        except Exception as e:
+            error, status = f"{type(e).__name__}: {e}", "failed"
+        
+        # 与 delete()、health() 在同一把锁下修改状态
+        with self.lock:
+            job.report = report
+            job.error = error
+            job.status = status
+            job.finished = time.time()
+    
+    def make_executor(self):
+        """创建工作进程池"""
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_job_worker)
+    
+    def restart_executor(self, broken):
+        """
+        工作进程异常退出后进程池不能再使用,换成新的进程池
+        
+        Args:
+            broken: 出错的进程池;已停止或已被其他调度线程重建时不再处理
+        """
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = self.make_executor()
+        broken.shutdown(wait=False)
+    
+    def _evict_finished(self):
+        """删除超出 max_finished 的最早完成的任务"""
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.finished_status]
+            finished.sort(key=lambda job: job.finished)
+            excess = finished[:max(len(finished) - self.max_finished, 0)]
+            for job in excess:
+                del self.jobs[job.id]
+        for job in excess:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP接口,见模块说明;self.server.jobs 为 JobServer 对象"""
+    
+    JOB_PATH = re.compile(r"^/jobs/([0-9a-f]{32})(/result)?$")
+    
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {'error': message}, headers)
+    
+    def do_GET(self):
+        jobs = self.server.jobs
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self.send_json(200, jobs.health())
+            return
+        if path == "/jobs":
+            with jobs.lock:
+                job_list = list(jobs.jobs.values())
+            self.send_json(200, [job.to_dict() for job in job_list])
+            return
+        
+        match = self.JOB_PATH.match(path)
+        job = match and jobs.get(match.group(1))
+        if not job:
+            self.send_error_json(404, "任务不存在")
+            return
+        if not match.group(2):
+            self.send_json(200, job.to_dict())
+            return
+        
+        # 下载结果
+        if job.status != "done":
+            self.send_json(409, job.to_dict())
+            return
+        try:
+            with open(job.output_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.send_error_json(410, "结果文件已删除")
+            return
+        timing = job.timing()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f'attachment; filename="{job.id}.pdf"')
+        self.send_header("X-Queue-Seconds", f"{timing['queue_seconds']:.3f}")
+        self.send_header("X-Run-Seconds", f"{timing['run_seconds']:.3f}")
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_POST(self):
+        jobs = self.server.jobs
+        url = urlsplit(self.path)
+        if url.path != "/jobs":
+            self.send_error_json(404, "未知路径")
+            return
+        
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_error_json(411, "需要 Content-Length")
+            return
+        if length < 0:
+            self.close_connection = True
+            self.send_error_json(400, "Content-Length 不能为负数")
+            return
+        if length > self.server.max_upload_bytes:
+            self.close_connection = True
+            self.send_error_json(413, f"PDF超过 {self.server.max_upload_bytes // (1024 * 1024)} MB")
+            return
+        try:
+            engine, options = parse_job_options(parse_qs(url.query))
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error_json(400, str(e))
+            return
+        
+        # 队列已满时不必读取上传内容
+        if jobs.queue.full():
+            self.close_connection = True
+            self.send_error_json(429, "排队任务已满,请稍后重试", {"Retry-After": "5"})
+            return
+        
+        data = self.rfile.read(length)
+        if not data.startswith(b"%PDF"):
+            self.send_error_json(400, "请求体不是PDF文件")
+            return
+        
+        try:
+            job = jobs.submit(data, engine, options)
+        except queue.Full:
+            self.send_error_json(429, "排队任务已满,请稍后重试", {"Retry-After": "5"})
+            return
+        self.send_json(202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+    
+    def do_DELETE(self):
+        match = self.JOB_PATH.match(urlsplit(self.path).path)
+        if not match or match.group(2) or not self.server.jobs.delete(match.group(1)):
+            self.send_error_json(404, "任务不存在")
+            return
+        self.send_json(200, {'id': match.group(1), 'deleted': True})
+
+
+def make_server(host="127.0.0.1", port=8765, jobs=None, max_upload_mb=200):
+    """
+    创建HTTP服务(未启动)
+    
+    Args:
+        host: 监听地址,默认只监听本机
+        port: 端口,为0时由系统分配
+        jobs: JobServer对象,为None时使用默认参数创建;需要调用其 start() 启动工作进程
+        max_upload_mb: 上传PDF的大小上限(MB)
+        
+    Returns:
+        ThreadingHTTPServer对象,server.jobs 为 JobServer 对象
+    """
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.jobs = jobs or JobServer()
+    server.max_upload_bytes = int(max_upload_mb * 1024 * 1024)
+    return server
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地HTTP任务服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址,默认只监听本机")
+    parser.add_argument("--port", type=int, default=8765, help="端口")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--queue-size", type=int, default=8, help="排队任务数上限,超出时返回429")
+    parser.add_argument("--memory-mb", type=int, default=1024, help="每个任务的内存上限(MB)")
+    parser.add_argument("--max-upload-mb", type=int, default=200, help="上传PDF的大小上限(MB)")
+    parser.add_argument("--work-dir", help="存放任务文件的目录,默认为临时目录")
+    args = parser.parse_args()
+    
+    jobs = JobServer(args.work_dir, args.workers, args.queue_size, args.memory_mb)
+    server = make_server(args.host, args.port, jobs, args.max_upload_mb)
+    jobs.start()
+    print(f"任务服务已启动: http://{args.host}:{server.server_address[1]} ({args.workers} 个工作进程)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n停止服务")
+    finally:
+        server.server_close()
+        jobs.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
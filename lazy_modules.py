@@ -0,0 +1,106 @@
+"""
+按需导入模块
+cv2、numpy、PIL 和 fitz 的导入要花费数百毫秒,打包为单文件后更久。界面程序用 lazy_import
+代替模块开头的导入语句,先显示窗口,这些模块在第一次使用时才导入;窗口显示后再用
+preload_in_background 在后台线程中提前导入,用户第一次操作时通常已经导入完成。
+"""
+
+import sys
+import importlib
+import threading
+
+
+# 界面程序在后台预先导入的模块
+GUI_MODULES = ("numpy", "cv2", "PIL.Image", "PIL.ImageTk", "fitz")
+
+
+class LazyModule:
+    """
+    模块的代理对象,第一次访问属性时导入模块
+    
+    导入后把所在命名空间中的同名变量替换为真正的模块,之后的访问不再经过代理。
+    """
+    
+    def __init__(self, module_name, namespace, alias):
+        """
+        初始化代理对象
+        
+        Args:
+            module_name: 模块名,例如 "PIL.Image"
+            namespace: 代理所在模块的 globals()
+            alias: 代理在命名空间中的变量名
+        """
+        self._module_name = module_name
+        self._namespace = namespace
+        self._alias = alias
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """导入并返回模块,多个线程同时调用时只导入一次"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._module_name)
+                    if self._namespace.get(self._alias) is self:
+                        self._namespace[self._alias] = module
+                    self._module = module
+        return self._module
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+    
+    def __repr__(self):
+        state = "已导入" if self._module is not None else "未导入"
+        return f"<LazyModule {self._module_name} ({state})>"
+
+
+def lazy_import(namespace, **modules):
+    """
+    在命名空间中为模块放置按需导入的代理,已导入过的模块直接使用
+    
+    用法: lazy_import(globals(), cv2="cv2", np="numpy", Image="PIL.Image")
+    
+    代理是运行时放入的,静态检查工具和编辑器看不到这些名称;调用后在
+    `if TYPE_CHECKING:` 中写出对应的导入语句,运行时不会执行:
+        
+        lazy_import(globals(), cv2="cv2", np="numpy")
+        if TYPE_CHECKING:
+            import cv2
+            import numpy as np
+    
+    Args:
+        namespace: 调用方模块的 globals()
+        **modules: 变量名 -> 模块名
+    """
+    for alias, module_name in modules.items():
+        module = sys.modules.get(module_name)
+        namespace[alias] = module if module is not None else LazyModule(module_name, namespace, alias)
+
+
+def preload_modules(module_names=GUI_MODULES):
+    """
+    依次导入模块,未安装的模块跳过,第一次使用时再报告错误
+    
+    Args:
+        module_names: 模块名列表
+    """
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+
+
+def preload_in_background(root, module_names=GUI_MODULES):
+    """
+    窗口空闲(首次绘制完成)后在后台线程中导入模块
+    
+    Args:
+        root: Tk根窗口
+        module_names: 模块名列表
+    """
+    def start():
+        threading.Thread(target=preload_modules, args=(module_names,), daemon=True).start()
+    
+    root.after_idle(start)
@@ -0,0 +1,232 @@
+"""
+页面图片存储
+每个文档的页面图片保存在一个 numpy.memmap 文件中,每页占一个固定大小的槽位,
+界面和处理器直接读取映射内存上的视图,不复制数据;哪些页面留在内存中由操作系统的页缓存决定。
+同一文档(路径、大小、修改时间和渲染倍数都相同)再次打开时直接使用已渲染的页面。
+不使用缓存时映射文件放在临时目录中,关闭时删除。
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+from typing import TYPE_CHECKING
+from result_cache import default_cache_dir
+from lazy_modules import lazy_import
+
+lazy_import(globals(), np="numpy", Image="PIL.Image")
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+
+def document_key(pdf_path, zoom):
+    """
+    文档的标识,文件内容或渲染倍数改变时随之改变
+    
+    Args:
+        pdf_path: PDF文件路径
+        zoom: 渲染倍数
+        
+    Returns:
+        十六进制字符串
+    """
+    stat = os.stat(pdf_path)
+    identity = f"{os.path.abspath(pdf_path)}|{stat.st_size}|{stat.st_mtime_ns}|{zoom}"
+    return hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+
+def planned_page_shapes(pdf_document, zoom):
+    """
+    不渲染页面,计算按指定倍数渲染后每页的 (高度, 宽度)
+    
+    Args:
+        pdf_document: 已打开的fitz文档
+        zoom: 渲染倍数
+        
+    Returns:
+        [(高度, 宽度), ...]
+    """
+    import fitz
+    
+    mat = fitz.Matrix(zoom, zoom)
+    shapes = []
+    for page in pdf_document:
+        rect = (page.rect * mat).irect
+        shapes.append((rect.height, rect.width))
+    return shapes
+
+
+class PageRasterStore:
+    """
+    基于 numpy.memmap 的页面图片存储
+    
+    像列表一样按页码读取PIL图片(尚未渲染的页为 None),图片直接引用映射内存。
+    数据文件中每页一个 stride 字节的槽位,存放RGB像素;索引文件记录每页是否已写入及其尺寸。
+    后台加载线程写入页面、界面线程读取页面可以同时进行: 先写像素再写索引,读取时只读已写入的页。
+    缓存目录中的文档数或总大小超出上限时,按打开时间删除最久未打开的文档(LRU)。
+    """
+    
+    CHANNELS = 3
+    
+    def __init__(self, cache_dir=None, max_documents=8, max_size_mb=2048, persistent=True):
+        """
+        初始化页面图片存储
+        
+        Args:
+            cache_dir: 存放映射文件的目录,为None时使用结果缓存目录下的 rasters 子目录
+            max_documents: 最多保留的文档数,超出时删除最久未打开的文档的映射文件
+            max_size_mb: 映射文件总大小上限(MB),单个文档超出上限时按不保留处理
+            persistent: 是否保留映射文件供下次打开使用;为False时(不使用缓存)放在临时目录,关闭时删除
+        """
+        self.cache_dir = cache_dir or os.path.join(default_cache_dir(), "rasters")
+        self.max_documents = max_documents
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.persistent = persistent
+        self.key = None
+        self.stride = 0
+        self._data = None   # (页数, stride) uint8
+        self._index = None  # (页数, 3) int32: 是否已写入, 高度, 宽度
+        self._temp_dir = None
+    
+    def open(self, pdf_path, zoom, page_shapes):
+        """
+        打开(或创建)文档的映射文件
+        
+        Args:
+            pdf_path: PDF文件路径
+            zoom: 渲染倍数
+            page_shapes: planned_page_shapes() 的结果,用于确定槽位大小
+            
+        Returns:
+            已有的可直接使用的页数
+        """
+        self.close()
+        
+        page_count = len(page_shapes)
+        # 每个方向多留一个像素,渲染尺寸的取整与计算值略有出入时仍放得下
+        stride = max(((h + 1) * (w + 1) * self.CHANNELS for h, w in page_shapes), default=1)
+        persistent = self.persistent and page_count * stride <= self.max_bytes
+        if persistent:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            key = document_key(pdf_path, zoom)
+            data_path, index_path = self._paths(key)
+        else:
+            self._temp_dir = tempfile.mkdtemp(prefix="img-pdf-rasters-")
+            key = "document"
+            data_path, index_path = self._paths(key, self._temp_dir)
+        
+        reused = False
+        if os.path.exists(data_path) and os.path.exists(index_path):
+            try:
+                index = np.memmap(index_path, dtype=np.int32, mode="r+")
+                data_size = os.path.getsize(data_path)
+                if index.size == page_count * 3 and data_size == page_count * stride:
+                    self._index = index.reshape(page_count, 3)
+                    reused = True
+            except (OSError, ValueError):
+                pass
+        
+        if reused:
+            mode = "r+"
+        else:
+            mode = "w+"
+            self._index = np.memmap(index_path, dtype=np.int32, mode=mode, shape=(page_count, 3))
+        self._data = np.memmap(data_path, dtype=np.uint8, mode=mode, shape=(page_count, stride))
+        self.key = key
+        self.stride = stride
+        
+        if persistent:
+            # 更新修改时间,淘汰时保留最近打开的文档
+            os.utime(index_path)
+            self.evict()
+        return int(np.count_nonzero(self._index[:, 0])) if reused else 0
+    
+    def _paths(self, key, directory=None):
+        directory = directory or self.cache_dir
+        return os.path.join(directory, key + ".raw"), os.path.join(directory, key + ".idx")
+    
+    def evict(self):
+        """删除最久未打开的文档的映射文件,直到文档数不超过 max_documents、总大小不超过 max_bytes"""
+        documents = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".idx"):
+                continue
+            key = entry.name[:-4]
+            size = sum(os.path.getsize(path) for path in self._paths(key) if os.path.exists(path))
+            total += size
+            if key != self.key:
+                documents.append((entry.stat().st_mtime, key, size))
+        
+        documents.sort()
+        count = len(documents) + 1  # 加上当前文档
+        for _, key, size in documents:
+            if count <= self.max_documents and total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # 其他窗口仍在使用(Windows)时保留
+            count -= 1
+            total -= size
+    
+    def close(self):
+        """写回并释放映射,已渲染的页面保留在文件中供下次打开使用;临时目录中的映射文件直接删除"""
+        if self._data is not None:
+            self._data.flush()
+            self._index.flush()
+        self._data = None
+        self._index = None
+        self.key = None
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+    
+    def __len__(self):
+        return 0 if self._index is None else len(self._index)
+    
+    def is_loaded(self, page_num):
+        """指定页是否已写入"""
+        return self._index is not None and bool(self._index[page_num, 0])
+    
+    def array(self, page_num):
+        """
+        指定页的RGB像素数组,是映射内存上的视图,不复制数据
+        
+        Args:
+            page_num: 页码
+            
+        Returns:
+            (高度, 宽度, 3) 的 uint8 数组,尚未写入时返回 None
+        """
+        index, data = self._index, self._data
+        if index is None or not index[page_num, 0]:
+            return None
+        _, height, width = index[page_num].tolist()
+        return data[page_num, :height * width * self.CHANNELS].reshape(height, width, self.CHANNELS)
+    
+    def __getitem__(self, page_num):
+        pixels = self.array(page_num)
+        if pixels is None:
+            return None
+        height, width = pixels.shape[:2]
+        return Image.frombuffer("RGB", (width, height), pixels, "raw", "RGB", 0, 1)
+    
+    def __setitem__(self, page_num, pixels):
+        """
+        写入一页RGB像素
+        
+        Args:
+            page_num: 页码
+            pixels: (高度, 宽度, 3) 的 uint8 数组
+        """
+        height, width = pixels.shape[:2]
+        size = height * width * self.CHANNELS
+        if size > self.stride:
+            raise ValueError(f"第{page_num+1}页图片 {width}x{height} 超出槽位大小")
+        self._data[page_num, :size] = pixels.reshape(-1)
+        # 最后写入已写入标记,读取线程看到标记时尺寸和像素都已就绪
+        self._index[page_num, 1:] = (height, width)
+        self._index[page_num, 0] = 1
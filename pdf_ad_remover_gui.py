@@ -7,19 +7,24 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
 import os
-from pdf_ad_remover import PDFAdRemover
+from cleaning_core import PDFAdRemover, MemoryBudget, format_progress, CancelToken, ProcessingCancelled
+from lazy_modules import preload_in_background
 
 
 class PDFAdRemoverGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("PDF广告移除工具")
-        self.root.geometry("600x400")
+        self.root.geometry("600x440")
         
         self.pdf_file_path = None
         self.output_dir = None
+        self.cancel_token = None  # 当前处理任务的取消令牌
         
         self.create_widgets()
+        
+        # 关闭窗口时取消正在进行的处理
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def create_widgets(self):
         """创建GUI组件"""
@@ -99,6 +104,32 @@ class PDFAdRemoverGUI:
         )
         ad_height_scale.pack(fill="x", pady=5)
         
+        # 自动定位广告区域,上面的高度作为上限
+        self.adaptive_band_var = tk.BooleanVar(value=False)
+        adaptive_band_check = tk.Checkbutton(
+            settings_frame,
+            text="自动定位广告区域(按页脚上方的空白间隔,不超过上面的高度)",
+            variable=self.adaptive_band_var,
+            font=("Arial", 10)
+        )
+        adaptive_band_check.pack(anchor="w")
+        
+        # 内存上限,超出时降低渲染DPI
+        memory_frame = tk.Frame(settings_frame)
+        memory_frame.pack(anchor="w", pady=5)
+        
+        memory_label = tk.Label(memory_frame, text="内存上限(MB):", font=("Arial", 10))
+        memory_label.pack(side="left")
+        
+        self.memory_mb_var = tk.IntVar(value=1024)
+        memory_spinbox = ttk.Spinbox(
+            memory_frame,
+            values=(256, 512, 1024, 2048, 4096, 8192),
+            textvariable=self.memory_mb_var,
+            width=6
+        )
+        memory_spinbox.pack(side="left", padx=5)
+        
         # 处理按钮
         button_frame = tk.Frame(self.root)
         button_frame.pack(pady=20)
@@ -113,12 +144,25 @@ class PDFAdRemoverGUI:
             width=20,
             height=2
         )
-        self.process_button.pack()
+        self.process_button.pack(side="left", padx=5)
+        
+        self.cancel_button = tk.Button(
+            button_frame,
+            text="取消",
+            command=self.cancel_processing,
+            font=("Arial", 12, "bold"),
+            bg="#e74c3c",
+            fg="white",
+            width=8,
+            height=2,
+            state="disabled"
+        )
+        self.cancel_button.pack(side="left", padx=5)
         
         # 进度条
         self.progress = ttk.Progressbar(
             self.root,
-            mode="indeterminate",
+            mode="determinate",
             length=400
         )
         self.progress.pack(pady=10)
@@ -171,37 +215,83 @@ class PDFAdRemoverGUI:
         
         # 禁用按钮,防止重复点击
         self.process_button.config(state="disabled", text="处理中...")
-        self.progress.start()
+        self.cancel_button.config(state="normal")
+        self.progress.config(value=0, maximum=1)
         self.status_label.config(text="正在处理...")
+        self.cancel_token = CancelToken()
         
         # 在新线程中处理,避免阻塞GUI
-        thread = threading.Thread(target=self.process_pdf)
+        thread = threading.Thread(target=self.process_pdf, args=(self.cancel_token,))
         thread.start()
     
-    def process_pdf(self):
+    def cancel_processing(self):
+        """取消正在进行的处理"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.cancel_button.config(state="disabled")
+            self.status_label.config(text="正在取消...", fg="blue")
+    
+    def on_close(self):
+        """关闭窗口: 取消处理,处理线程会在当前页结束后清理输出并退出"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        self.root.destroy()
+    
+    def post_to_ui(self, func, *args):
+        """从处理线程把回调切换到界面线程,窗口已关闭时忽略"""
+        try:
+            self.root.after(0, func, *args)
+        except (RuntimeError, tk.TclError):
+            pass
+    
+    def process_pdf(self, cancel_token):
         """处理PDF文件"""
         try:
             # 创建广告移除器
             ad_height_percent = self.ad_height_var.get() / 100
-            remover = PDFAdRemover(ad_height_percent=ad_height_percent)
+            remover = PDFAdRemover(
+                ad_height_percent=ad_height_percent,
+                memory_budget=MemoryBudget(max_memory_mb=self.memory_mb_var.get()),
+                adaptive_band=self.adaptive_band_var.get()
+            )
             
             # 处理PDF
             processed_images = remover.batch_process_pdf_images(
                 self.pdf_file_path,
-                self.output_dir
+                self.output_dir,
+                progress_callback=lambda progress: self.post_to_ui(self.on_progress, progress),
+                cancel_token=cancel_token
             )
             
             # 处理完成
-            self.root.after(0, lambda: self.processing_completed(True, len(processed_images)))
+            self.post_to_ui(self.processing_completed, True, len(processed_images))
+            
+        except ProcessingCancelled:
+            self.post_to_ui(self.processing_cancelled)
             
         except Exception as e:
             # 处理失败
-            self.root.after(0, lambda: self.processing_completed(False, str(e)))
+            self.post_to_ui(self.processing_completed, False, str(e))
+    
+    def on_progress(self, progress):
+        """处理进度回调(界面线程)"""
+        self.progress.config(maximum=max(progress['total_pages'], 1), value=progress['pages_done'])
+        self.status_label.config(text=format_progress(progress), fg="blue")
+    
+    def processing_cancelled(self):
+        """处理取消回调"""
+        self.cancel_token = None
+        self.progress.config(value=0)
+        self.process_button.config(state="normal", text="开始处理")
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text="处理已取消,未保留不完整的输出", fg="gray")
     
     def processing_completed(self, success, result):
         """处理完成回调"""
-        self.progress.stop()
+        self.cancel_token = None
+        self.progress.config(value=self.progress.cget("maximum") if success else 0)
         self.process_button.config(state="normal", text="开始处理")
+        self.cancel_button.config(state="disabled")
         
         if success:
             self.status_label.config(
@@ -224,6 +314,7 @@ def main():
     """主函数"""
     root = tk.Tk()
     app = PDFAdRemoverGUI(root)
+    preload_in_background(root)
     root.mainloop()
 
 
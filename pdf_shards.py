@@ -0,0 +1,392 @@
+"""
+PDF分片处理
+把一个很长的PDF按页码范围分成多个分片,由共享文件系统上的多台机器(或多个进程)分别处理,
+最后按页码顺序合并
+
+用法:
+  处理(可在多台机器上同时运行): python pdf_shards.py work <PDF路径> <工作目录> [--shard-size 页数] [--merge]
+  合并分片: python pdf_shards.py merge <输出PDF> <分片1> <分片2> ...
+"""
+
+import os
+import sys
+import time
+import socket
+import uuid
+import argparse
+
+# 分片PDF的关键字元数据前缀,内容为 "pdf-shard:起始页-结束页/总页数"(页码从1开始)
+SHARD_KEYWORD_PREFIX = "pdf-shard:"
+
+
+def parse_page_range(text):
+    """
+    解析命令行的页码范围
+    
+    Args:
+        text: "START-END" 或 "N",页码从1开始,包含两端
+        
+    Returns:
+        从0开始的页码 range
+    """
+    try:
+        if "-" in text:
+            start, end = (int(part) for part in text.split("-", 1))
+        else:
+            start = end = int(text)
+    except ValueError:
+        raise ValueError(f"无效的页码范围: {text},应为 起始页-结束页,例如 1-100")
+    
+    if start < 1 or end < start:
+        raise ValueError(f"无效的页码范围: {text}")
+    return range(start - 1, end)
+
+
+def resolve_pages(pages, page_count):
+    """
+    确定要处理的页码并检查范围
+    
+    Args:
+        pages: 从0开始的页码 range,为None时表示全部页面
+        page_count: 文档总页数
+        
+    Returns:
+        从0开始的页码 range
+    """
+    if pages is None:
+        return range(page_count)
+    if pages.start < 0 or pages.stop > page_count or len(pages) == 0:
+        raise ValueError(f"页码范围 {pages.start + 1}-{pages.stop} 超出文档页数 {page_count}")
+    return pages
+
+
+def format_page_range(pages):
+    """把从0开始的页码 range 格式化为 "起始页-结束页"(从1开始)"""
+    return f"{pages.start + 1}-{pages.stop}"
+
+
+def shard_metadata(pages, page_count):
+    """
+    分片PDF的元数据,合并时据此检查页码是否完整
+    
+    Args:
+        pages: 分片包含的页码 range(从0开始)
+        page_count: 源文档总页数
+        
+    Returns:
+        可传给 fitz Document.set_metadata() 的字典
+    """
+    return {'keywords': f"{SHARD_KEYWORD_PREFIX}{format_page_range(pages)}/{page_count}"}
+
+
+def read_shard_info(doc):
+    """
+    读取分片PDF记录的页码范围
+    
+    Args:
+        doc: 已打开的fitz文档
+        
+    Returns:
+        (页码 range(从0开始), 源文档总页数),不是分片时返回 None
+    """
+    keywords = (doc.metadata or {}).get('keywords') or ""
+    if not keywords.startswith(SHARD_KEYWORD_PREFIX):
+        return None
+    page_range, page_count = keywords[len(SHARD_KEYWORD_PREFIX):].split("/")
+    return parse_page_range(page_range), int(page_count)
+
+
+def plan_shards(page_count, shard_size):
+    """
+    按固定页数划分分片
+    
+    Args:
+        page_count: 总页数
+        shard_size: 每个分片的页数
+        
+    Returns:
+        页码 range 列表(从0开始)
+    """
+    return [range(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+
+def merge_shards(shard_paths, output_pdf_path):
+    """
+    按页码顺序合并分片PDF,并检查没有缺页或重叠
+    
+    Args:
+        shard_paths: 分片PDF路径列表,顺序任意
+        output_pdf_path: 输出PDF路径
+        
+    Returns:
+        输出PDF路径
+    """
+    import fitz
+    from cleaning_core.ad_remover import IncrementalPDFWriter, MemoryBudget
+    
+    # 读取各分片的页码范围
+    shards = []
+    for path in shard_paths:
+        with fitz.open(path) as doc:
+            info = read_shard_info(doc)
+            if info is None:
+                raise ValueError(f"不是分片PDF(缺少分片元数据): {path}")
+            pages, page_count = info
+            if len(doc) != len(pages):
+                raise ValueError(f"分片 {path} 应有 {len(pages)} 页,实际 {len(doc)} 页")
+        shards.append((pages.start, pages, page_count, path))
+    if not shards:
+        raise ValueError("没有要合并的分片")
+    shards.sort()
+    
+    # 检查来自同一文档且页码连续完整
+    page_count = shards[0][2]
+    if any(shard[2] != page_count for shard in shards):
+        raise ValueError("分片来自页数不同的文档")
+    
+    problems = []
+    next_page = 0
+    for start, pages, _, path in shards:
+        if start > next_page:
+            problems.append(f"缺少第 {next_page + 1}-{start} 页")
+        elif start < next_page:
+            problems.append(f"分片 {os.path.basename(path)} 与前一个分片重叠")
+        next_page = max(next_page, pages.stop)
+    if next_page < page_count:
+        problems.append(f"缺少第 {next_page + 1}-{page_count} 页")
+    if problems:
+        raise ValueError("分片不完整: " + "; ".join(problems))
+    
+    # 按顺序合并,每个分片合并后写盘,内存中最多保留一个分片
+    output_pdf = IncrementalPDFWriter(output_pdf_path, MemoryBudget(max_pages_in_flight=1))
+    try:
+        for _, pages, _, path in shards:
+            with fitz.open(path) as doc:
+                output_pdf.copy_pages(doc, 0, len(doc) - 1)
+            print(f"已合并第 {format_page_range(pages)} 页: {path}")
+        output_pdf.commit()
+    except BaseException:
+        output_pdf.abort()
+        raise
+    
+    print(f"合并完成! 共 {page_count} 页, 输出文件: {output_pdf_path}")
+    return output_pdf_path
+
+
+class ShardClaim:
+    """
+    基于锁文件的分片认领
+    
+    每个分片对应工作目录中的一个锁文件,用 O_CREAT | O_EXCL 创建,同一时刻只有一个进程能创建成功,
+    在共享文件系统上同样有效。处理期间定时更新锁文件的修改时间(心跳),超过 stale_seconds
+    没有心跳的锁视为持有者已退出,其他进程可以接管。分片PDF生成后即视为完成,锁随即释放。
+    锁文件中写入每次认领唯一的令牌,心跳和释放前先确认锁文件仍是自己的。
+    """
+    
+    def __init__(self, lock_path, stale_seconds=300):
+        """
+        初始化分片认领
+        
+        Args:
+            lock_path: 锁文件路径
+            stale_seconds: 锁文件超过该时间没有更新视为失效
+        """
+        self.lock_path = lock_path
+        self.stale_seconds = stale_seconds
+        self.owned = False
+        self.token = None
+    
+    def acquire(self):
+        """
+        尝试认领,失效的锁会被接管
+        
+        Returns:
+            是否认领成功
+        """
+        if self._create():
+            return True
+        if not self._is_stale(self.lock_path):
+            # 锁刚好被释放时再尝试一次
+            return not os.path.exists(self.lock_path) and self._create()
+        
+        # 接管必须先创建接管锁,同一时刻只有一个进程能删除失效的锁;
+        # 取得接管锁后重新检查,读取修改时间之后其他进程可能已经接管并创建了新锁
+        takeover_path = self.lock_path + ".takeover"
+        try:
+            fd = os.open(takeover_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if self._is_stale(takeover_path):
+                # 接管进程在持有接管锁的瞬间退出,删除后下次再尝试
+                self._remove(takeover_path)
+            return False
+        os.close(fd)
+        try:
+            if not self._is_stale(self.lock_path):
+                return False
+            self._remove(self.lock_path)
+            print(f"接管失效的锁: {self.lock_path}")
+            return self._create()
+        finally:
+            self._remove(takeover_path)
+    
+    def _is_stale(self, path):
+        """文件超过 stale_seconds 没有更新;文件不存在时不算失效"""
+        try:
+            return time.time() - os.path.getmtime(path) >= self.stale_seconds
+        except FileNotFoundError:
+            return False
+    
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def _create(self):
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        token = f"{socket.gethostname()} {os.getpid()} {uuid.uuid4().hex}"
+        with os.fdopen(fd, "w") as f:
+            f.write(token + "\n")
+        self.token = token
+        self.owned = True
+        # 写入后再读回确认,写入期间锁被其他进程误接管时放弃
+        if not self.is_owner():
+            self.owned = False
+            return False
+        return True
+    
+    def is_owner(self):
+        """锁文件是否仍是本次认领创建的"""
+        if not self.owned:
+            return False
+        try:
+            with open(self.lock_path, encoding="utf-8") as f:
+                return f.readline().strip() == self.token
+        except OSError:
+            return False
+    
+    def heartbeat(self):
+        """更新锁文件的修改时间,表示仍在处理"""
+        if self.is_owner():
+            try:
+                os.utime(self.lock_path)
+            except OSError:
+                pass
+    
+    def release(self):
+        """释放认领;分片未生成时可被其他进程重新认领。锁已被其他进程接管时不删除"""
+        if self.is_owner():
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+        self.owned = False
+
+
+def shard_output_path(work_dir, pdf_path, pages):
+    """分片PDF在工作目录中的路径"""
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(work_dir, f"{base_name}.shard-{pages.start + 1:06d}-{pages.stop:06d}.pdf")
+
+
+def run_worker(pdf_path, work_dir, shard_size=50, merge=False, stale_seconds=300, remover=None):
+    """
+    反复认领并处理尚未完成的分片,直到没有可认领的分片
+    
+    Args:
+        pdf_path: 输入PDF路径(所有节点通过共享文件系统访问同一文件)
+        work_dir: 共享的工作目录,存放分片和锁文件
+        shard_size: 每个分片的页数,所有节点必须一致
+        merge: 所有分片完成后是否由本节点合并(只会有一个节点执行合并)
+        stale_seconds: 锁文件超过该时间没有心跳视为失效
+        remover: PDFAdRemover对象,为None时使用默认参数
+        
+    Returns:
+        本节点处理的分片路径列表
+    """
+    import fitz
+    from cleaning_core import PDFAdRemover
+    
+    remover = remover or PDFAdRemover()
+    os.makedirs(work_dir, exist_ok=True)
+    
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    shards = plan_shards(page_count, shard_size)
+    
+    processed = []
+    for pages in shards:
+        shard_path = shard_output_path(work_dir, pdf_path, pages)
+        if os.path.exists(shard_path):
+            continue  # 已完成
+        
+        claim = ShardClaim(shard_path + ".lock", stale_seconds)
+        if not claim.acquire():
+            continue  # 其他节点正在处理
+        if os.path.exists(shard_path):
+            claim.release()  # 认领期间刚好被其他节点完成
+            continue
+        
+        print(f"认领分片: 第 {format_page_range(pages)} 页")
+        try:
+            remover.batch_process_pdf_to_pdf(
+                pdf_path,
+                shard_path,
+                progress_callback=lambda progress: claim.heartbeat(),
+                pages=pages
+            )
+        finally:
+            # 分片已生成或处理失败,都释放锁;已生成的分片不会再被认领
+            claim.release()
+        processed.append(shard_path)
+    
+    # 全部完成后合并,合并同样需要认领,只由一个节点执行
+    shard_paths = [shard_output_path(work_dir, pdf_path, pages) for pages in shards]
+    if merge and all(os.path.exists(path) for path in shard_paths):
+        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        output_pdf_path = os.path.join(work_dir, f"{base_name}_cleaned.pdf")
+        merge_claim = ShardClaim(output_pdf_path + ".lock", stale_seconds)
+        if not os.path.exists(output_pdf_path) and merge_claim.acquire():
+            try:
+                merge_shards(shard_paths, output_pdf_path)
+            finally:
+                merge_claim.release()
+    
+    return processed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="PDF分片处理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    work_parser = subparsers.add_parser("work", help="认领并处理分片,可在多台机器上同时运行")
+    work_parser.add_argument("pdf", help="输入PDF路径")
+    work_parser.add_argument("work_dir", help="共享工作目录")
+    work_parser.add_argument("--shard-size", type=int, default=50, help="每个分片的页数,所有节点必须一致")
+    work_parser.add_argument("--merge", action="store_true", help="全部分片完成后合并")
+    work_parser.add_argument("--stale-seconds", type=int, default=300, help="锁文件超过该时间没有心跳视为失效")
+    
+    merge_parser = subparsers.add_parser("merge", help="按页码顺序合并分片")
+    merge_parser.add_argument("output", help="输出PDF路径")
+    merge_parser.add_argument("shards", nargs="+", help="分片PDF路径")
+    
+    args = parser.parse_args()
+    try:
+        if args.command == "work":
+            processed = run_worker(args.pdf, args.work_dir, args.shard_size, args.merge, args.stale_seconds)
+            print(f"本节点处理了 {len(processed)} 个分片")
+        else:
+            merge_shards(args.shards, args.output)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
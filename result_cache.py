@@ -0,0 +1,270 @@
+"""
+页面处理结果缓存
+按 页面内容 + 处理参数 + 代码版本 计算键,把处理后的编码页面保存在磁盘上,
+重复处理同一文档时未变化的页面直接使用缓存结果
+"""
+
+import os
+import re
+import json
+import hashlib
+
+# 处理算法改变时递增,使旧的缓存结果失效
+CODE_VERSION = "1"
+
+# PDF对象中的间接引用,例如 "12 0 R"
+_REFERENCE = re.compile(r"\b(\d+) \d+ R\b")
+
+
+def default_cache_dir():
+    """默认缓存目录: Windows 为 %LOCALAPPDATA%\\img-pdf\\cache,其他系统为 ~/.cache/img-pdf"""
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        return os.path.join(os.environ["LOCALAPPDATA"], "img-pdf", "cache")
+    return os.path.join(os.path.expanduser("~"), ".cache", "img-pdf")
+
+
+def _object_hash(doc, xref, stream_hashes):
+    """对象字典和原始数据流的哈希,按 xref 记录在 stream_hashes 中"""
+    if xref not in stream_hashes:
+        digest = hashlib.sha256(doc.xref_object(xref, compressed=True).encode())
+        if doc.xref_is_stream(xref):
+            digest.update(doc.xref_stream_raw(xref) or b"")
+        stream_hashes[xref] = digest.hexdigest()
+    return stream_hashes[xref]
+
+
+def _references(text):
+    """PDF对象文本中间接引用的 xref 列表"""
+    return [int(x) for x in _REFERENCE.findall(text)]
+
+
+def _reachable_xrefs(doc, roots):
+    """
+    从 roots 出发逐层跟随间接引用能到达的所有对象,例如资源中的表单、图片、字体及字体程序、
+    图形状态和颜色空间
+    
+    Args:
+        doc: fitz文档
+        roots: 起始对象的 xref 列表
+        
+    Returns:
+        xref 列表
+    """
+    found = set()
+    pending = list(roots)
+    while pending:
+        xref = pending.pop()
+        if xref in found or not 0 < xref < doc.xref_length():
+            continue
+        # 不经过页面对象,避免把整个页面树都算进来
+        if doc.xref_get_key(xref, "Type")[1] in ("/Page", "/Pages"):
+            continue
+        found.add(xref)
+        pending.extend(_references(doc.xref_object(xref, compressed=True)))
+    return sorted(found)
+
+
+def _page_resources(doc, page):
+    """页面生效的 /Resources 字典文本,页面自身没有时沿页面树向上查找继承的资源"""
+    xref = page.xref
+    while xref:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind == "xref":
+            return doc.xref_object(_references(value)[0], compressed=True)
+        if kind == "dict":
+            return value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        xref = _references(parent)[0] if kind == "xref" else 0
+    return ""
+
+
+def page_content_hash(page, stream_hashes=None):
+    """
+    计算页面内容的哈希
+    
+    包含页面尺寸和旋转、内容流、页面资源(/Resources)逐层引用的所有对象(图片、表单、字体及字体程序、
+    图形状态、颜色空间等)的字典和原始数据流,以及批注对象和批注外观流引用的所有对象。
+    
+    Args:
+        page: fitz页面对象
+        stream_hashes: {xref: 数据流哈希} 字典,同一文档的多页之间共享,避免重复计算共用的资源
+        
+    Returns:
+        十六进制哈希字符串
+    """
+    doc = page.parent
+    if stream_hashes is None:
+        stream_hashes = {}
+    
+    digest = hashlib.sha256()
+    digest.update(repr((tuple(page.rect), page.rotation)).encode())
+    digest.update(page.read_contents())
+    
+    resources = _page_resources(doc, page)
+    digest.update(resources.encode())
+    for xref in _reachable_xrefs(doc, _references(resources)):
+        digest.update(_object_hash(doc, xref, stream_hashes).encode())
+    
+    # 渲染时批注也画在页面上
+    for annot_xref, _, _ in page.annot_xrefs():
+        digest.update(doc.xref_object(annot_xref, compressed=True).encode())
+        appearance = doc.xref_get_key(annot_xref, "AP")[1]
+        for xref in _reachable_xrefs(doc, _references(appearance)):
+            digest.update(_object_hash(doc, xref, stream_hashes).encode())
+    
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    磁盘上的页面结果缓存
+    
+    每个结果是一个文件: 一行JSON元数据 + 编码后的页面数据。读取时更新文件修改时间,
+    总大小超出上限时按修改时间删除最久未使用的结果(LRU)。
+    """
+    
+    def __init__(self, cache_dir=None, max_size_mb=1024):
+        """
+        初始化缓存
+        
+        Args:
+            cache_dir: 缓存目录,为None时使用 default_cache_dir()
+            max_size_mb: 缓存总大小上限(MB)
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None  # 首次写入时统计
+    
+    @staticmethod
+    def make_key(page_hash, params):
+        """
+        组合缓存键
+        
+        Args:
+            page_hash: page_content_hash() 的结果
+            params: 影响处理结果的参数字典,值需可转为JSON
+            
+        Returns:
+            十六进制键
+        """
+        payload = json.dumps([CODE_VERSION, page_hash, params], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".bin")
+    
+    def get(self, key):
+        """
+        读取缓存结果
+        
+        Args:
+            key: make_key() 的结果
+            
+        Returns:
+            (元数据字典, 数据字节),不存在时返回 None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = f.readline()
+                data = f.read()
+            meta = json.loads(header)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        # 更新修改时间,用于LRU淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return meta, data
+    
+    def put(self, key, meta, data=b""):
+        """
+        保存结果,超出大小上限时淘汰最久未使用的结果
+        
+        Args:
+            key: make_key() 的结果
+            meta: 元数据字典,值需可转为JSON
+            data: 编码后的页面数据
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # 覆盖已有结果时,总大小中减去旧文件
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        
+        # 先写临时文件再替换,多个进程同时写入同一结果也不会读到半个文件
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(json.dumps(meta).encode() + b"\n")
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, _, size in self._entries())
+        else:
+            self._total_bytes += os.path.getsize(path) - old_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+    
+    def _entries(self):
+        """列出所有缓存文件: (修改时间, 路径, 大小)"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for prefix in os.scandir(self.cache_dir):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith(".bin"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+    
+    def evict(self):
+        """删除最久未使用的结果,直到总大小降到上限的90%以下"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+    
+    def clear(self):
+        """清空缓存"""
+        for _, path, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._total_bytes = 0
+    
+    def reset_stats(self):
+        """清零命中统计,同一缓存对象用于多次运行时,每次运行开始时调用"""
+        self.hits = 0
+        self.misses = 0
+    
+    def report(self):
+        """本次运行的命中统计"""
+        return {'cache_hits': self.hits, 'cache_misses': self.misses}
@@ -0,0 +1,90 @@
+"""本地HTTP任务服务的测试: 只监听 127.0.0.1,端口由系统分配"""
+
+import json
+import time
+import threading
+import http.client
+
+import fitz
+import pytest
+
+from job_server import JobServer, make_server
+
+
+def make_pdf():
+    # 两页: 正文 + 底部广告文字
+    doc = fitz.open()
+    for index in range(2):
+        page = doc.new_page(width=300, height=400)
+        page.insert_text((40, 60), f"page {index + 1}")
+        page.insert_text((40, 380), "advertisement 13800000000")
+    return doc.tobytes()
+
+
+@pytest.fixture
+def service(tmp_path):
+    # 不调用 jobs.start(): 测试先在任务不会被取走时检查排队,再按需启动
+    jobs = JobServer(str(tmp_path), workers=1, queue_size=1)
+    server = make_server("127.0.0.1", 0, jobs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    jobs.stop()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=30)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def test_submit_poll_and_download(service):
+    service.jobs.start()
+    status, headers, body = request(service, "POST", "/jobs?engine=ad&cache=0", make_pdf())
+    assert status == 202
+    location = headers["Location"]
+    assert location == "/jobs/" + json.loads(body)['id']
+    
+    deadline = time.time() + 120
+    while True:
+        status, _, body = request(service, "GET", location)
+        assert status == 200
+        job = json.loads(body)
+        if job['status'] not in ("queued", "running"):
+            break
+        assert time.time() < deadline
+        time.sleep(0.2)
+    assert job['status'] == "done", job
+    
+    status, headers, body = request(service, "GET", location + "/result")
+    assert status == 200
+    assert headers["Content-Type"] == "application/pdf"
+    assert body.startswith(b"%PDF")
+    assert len(fitz.open("pdf", body)) == 2
+
+
+def test_full_queue_and_delete_queued_job(service):
+    pdf = make_pdf()
+    status, headers, _ = request(service, "POST", "/jobs?engine=ad", pdf)
+    assert status == 202
+    location = headers["Location"]
+    
+    status, headers, _ = request(service, "POST", "/jobs?engine=ad", pdf)
+    assert status == 429
+    assert headers["Retry-After"] == "5"
+    
+    status, _, body = request(service, "DELETE", location)
+    assert status == 200 and json.loads(body)['deleted']
+    assert request(service, "GET", location)[0] == 404
+    assert request(service, "DELETE", location)[0] == 404
+
+
+def test_negative_content_length_is_rejected(service):
+    status, _, _ = request(service, "POST", "/jobs?engine=ad", b"%PDF", {"Content-Length": "-1"})
+    assert status == 400
@@ -0,0 +1,54 @@
+"""保留区域集合的测试: 全局区域与单页框选的组合"""
+
+from cleaning_core import KeepRegions
+
+HEADER = (0, 0, 100, 20)
+BODY = (0, 30, 100, 90)
+NOTE = (10, 95, 50, 99)
+
+
+def rows(keep_regions, page_num):
+    return [tuple(row) for row in keep_regions.get(page_num).tolist()]
+
+
+def test_global_regions_reach_pages_framed_individually():
+    keep_regions = KeepRegions()
+    keep_regions.add_to_page(2, NOTE)
+    keep_regions.add_global(HEADER)
+    
+    assert rows(keep_regions, 0) == [HEADER]
+    assert rows(keep_regions, 2) == [HEADER, NOTE]
+    
+    keep_regions.remove_global(0)
+    assert rows(keep_regions, 0) == []
+    assert rows(keep_regions, 2) == [NOTE]
+
+
+def test_removing_a_global_region_on_one_page_keeps_it_elsewhere():
+    keep_regions = KeepRegions()
+    keep_regions.add_global(HEADER)
+    keep_regions.add_global(BODY)
+    keep_regions.add_to_page(1, NOTE)
+    
+    keep_regions.remove_from_page(1, 0)  # 第2页的 HEADER
+    assert rows(keep_regions, 1) == [BODY, NOTE]
+    assert rows(keep_regions, 0) == [HEADER, BODY]
+    assert keep_regions.override_count() == 1
+    
+    keep_regions.remove_from_page(1, 1)  # 第2页的 NOTE
+    assert rows(keep_regions, 1) == [BODY]
+    
+    # 全局删除后,该页的排除记录随之失效
+    keep_regions.remove_global(0)
+    assert rows(keep_regions, 0) == [BODY]
+    assert keep_regions.override_count() == 0
+
+
+def test_from_dict_keeps_page_only_regions():
+    keep_regions = KeepRegions.from_dict({0: [{'x1': 0, 'y1': 0, 'x2': 100, 'y2': 20}], 1: []})
+    assert rows(keep_regions, 0) == [HEADER]
+    assert rows(keep_regions, 1) == []
+    assert keep_regions
+    
+    keep_regions.clear()
+    assert not keep_regions
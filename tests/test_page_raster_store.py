@@ -0,0 +1,52 @@
+"""页面图片存储的淘汰和临时文件测试"""
+
+import os
+import time
+
+import numpy as np
+
+from page_raster_store import PageRasterStore
+
+
+def make_pdf_stand_in(directory, name):
+    # document_key 只读取文件的路径、大小和修改时间
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(name.encode())
+    return path
+
+
+def cached_documents(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".idx"))
+
+
+def test_evicts_oldest_documents_over_byte_cap(tmp_path):
+    cache_dir = str(tmp_path / "rasters")
+    shapes = [(99, 99)] * 10  # 每个文档约 0.3MB
+    store = PageRasterStore(cache_dir, max_documents=100, max_size_mb=0.7)
+    for index in range(4):
+        store.open(make_pdf_stand_in(str(tmp_path), f"{index}.pdf"), 1.0, shapes)
+        store[0] = np.full((99, 99, 3), index, dtype=np.uint8)
+        current = store.key
+        store.close()
+        time.sleep(0.01)
+    
+    remaining = cached_documents(cache_dir)
+    assert len(remaining) == 2
+    assert current + ".idx" in remaining
+    
+    total = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+    assert total <= store.max_bytes
+
+
+def test_non_persistent_store_leaves_no_files(tmp_path):
+    cache_dir = str(tmp_path / "rasters")
+    store = PageRasterStore(cache_dir, persistent=False)
+    assert store.open(make_pdf_stand_in(str(tmp_path), "a.pdf"), 1.0, [(10, 20)]) == 0
+    store[0] = np.zeros((10, 20, 3), dtype=np.uint8)
+    assert store[0].size == (20, 10)
+    temp_dir = store._temp_dir
+    store.close()
+    
+    assert not os.path.exists(temp_dir)
+    assert not os.path.exists(cache_dir)
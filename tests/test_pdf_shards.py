@@ -0,0 +1,139 @@
+"""分片认领锁的并发测试"""
+
+import os
+import time
+import threading
+import multiprocessing
+
+import fitz
+
+import pdf_shards
+from pdf_shards import ShardClaim, run_worker, plan_shards, shard_output_path
+
+
+def make_stale_lock(lock_path, age=3600):
+    with open(lock_path, "w") as f:
+        f.write("other-host 1 old-token\n")
+    old = time.time() - age
+    os.utime(lock_path, (old, old))
+
+
+def test_only_one_claimer_wins_a_fresh_lock(tmp_path):
+    lock_path = str(tmp_path / "shard.lock")
+    first, second = ShardClaim(lock_path), ShardClaim(lock_path)
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    assert second.is_owner()
+
+
+def test_concurrent_takeover_of_stale_lock_has_one_owner(tmp_path):
+    for round_index in range(30):
+        lock_path = str(tmp_path / f"shard-{round_index}.lock")
+        make_stale_lock(lock_path)
+        claims = [ShardClaim(lock_path, stale_seconds=60) for _ in range(6)]
+        barrier = threading.Barrier(len(claims))
+        results = [None] * len(claims)
+        
+        def run(index):
+            barrier.wait()
+            results[index] = claims[index].acquire()
+        
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(claims))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sum(results) == 1
+        assert sum(claim.is_owner() for claim in claims) == 1
+        assert not [name for name in os.listdir(tmp_path) if name.endswith(".takeover")]
+
+
+def test_takeover_does_not_steal_lock_created_after_stale_check(tmp_path, monkeypatch):
+    """A 读到旧的修改时间后,B 接管并创建了新锁;A 不能再删除 B 的新锁"""
+    lock_path = str(tmp_path / "shard.lock")
+    make_stale_lock(lock_path)
+    claim_a = ShardClaim(lock_path, stale_seconds=60)
+    claim_b = ShardClaim(lock_path, stale_seconds=60)
+    
+    real_getmtime = os.path.getmtime
+    interleaved = []
+    
+    def getmtime(path):
+        mtime = real_getmtime(path)
+        if path == lock_path and not interleaved:
+            # A 已读到旧的修改时间,此时 B 完成接管
+            interleaved.append(True)
+            assert claim_b.acquire()
+        return mtime
+    
+    monkeypatch.setattr(pdf_shards.os.path, "getmtime", getmtime)
+    assert not claim_a.acquire()
+    monkeypatch.undo()
+    
+    assert claim_b.is_owner()
+    assert not claim_a.is_owner()
+    with open(lock_path) as f:
+        assert f.readline().strip() == claim_b.token
+    
+    # A 的释放不会删除 B 的锁
+    claim_a.release()
+    assert os.path.exists(lock_path)
+    claim_b.release()
+    assert not os.path.exists(lock_path)
+
+
+def claim_in_process(lock_paths, barrier):
+    results = []
+    for lock_path in lock_paths:
+        barrier.wait()
+        results.append(ShardClaim(lock_path, stale_seconds=60).acquire())
+    return results
+
+
+def work_in_process(pdf_path, work_dir, barrier):
+    barrier.wait()
+    return run_worker(pdf_path, work_dir, shard_size=2, merge=True)
+
+
+def run_in_processes(target, args, count):
+    """在 count 个进程中同时运行 target(各进程用同一个屏障对齐),返回各进程的返回值"""
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        barrier = manager.Barrier(count)
+        with context.Pool(count) as pool:
+            results = [pool.apply_async(target, args + (barrier,)) for _ in range(count)]
+            return [result.get(timeout=300) for result in results]
+
+
+def test_stale_lock_takeover_across_processes_has_one_owner(tmp_path):
+    lock_paths = [str(tmp_path / f"shard-{round_index}.lock") for round_index in range(20)]
+    for lock_path in lock_paths:
+        make_stale_lock(lock_path)
+    
+    results = run_in_processes(claim_in_process, (lock_paths,), 4)
+    for round_results in zip(*results):
+        assert sum(round_results) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".takeover")]
+
+
+def test_processes_share_work_dir_and_process_each_shard_once(tmp_path):
+    pdf_path = str(tmp_path / "exam.pdf")
+    doc = fitz.open()
+    for index in range(9):
+        page = doc.new_page(width=200, height=300)
+        page.insert_text((20, 40), f"page {index + 1}")
+    doc.save(pdf_path)
+    work_dir = str(tmp_path / "work")
+    
+    processed = run_in_processes(work_in_process, (pdf_path, work_dir), 3)
+    
+    expected = [shard_output_path(work_dir, pdf_path, pages) for pages in plan_shards(9, 2)]
+    claimed = [path for paths in processed for path in paths]
+    assert sorted(claimed) == sorted(expected)
+    assert not [name for name in os.listdir(work_dir) if name.endswith((".lock", ".takeover"))]
+    
+    with fitz.open(os.path.join(work_dir, "exam_cleaned.pdf")) as merged:
+        assert len(merged) == 9
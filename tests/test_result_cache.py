@@ -0,0 +1,77 @@
+"""页面内容哈希和缓存命中统计的测试"""
+
+import fitz
+
+from result_cache import ResultCache, page_content_hash
+
+
+def make_source(color):
+    # 一页: 文字 + 一张纯色图片
+    source = fitz.open()
+    page = source.new_page()
+    page.insert_text((50, 50), "hello")
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    pixmap.clear_with(color)
+    page.insert_image(fitz.Rect(100, 100, 200, 200), pixmap=pixmap)
+    return source
+
+
+def make_nested(color):
+    # 图片位于两层表单对象之内
+    middle = fitz.open()
+    middle.new_page().show_pdf_page(fitz.Rect(0, 0, 595, 842), make_source(color), 0)
+    doc = fitz.open()
+    doc.new_page().show_pdf_page(fitz.Rect(0, 0, 595, 842), middle, 0)
+    return doc
+
+
+def test_hash_covers_images_nested_in_form_xobjects():
+    assert page_content_hash(make_nested(100)[0]) == page_content_hash(make_nested(100)[0])
+    assert page_content_hash(make_nested(100)[0]) != page_content_hash(make_nested(200)[0])
+
+
+def test_hash_covers_annotations():
+    doc = make_source(100)
+    before = page_content_hash(doc[0])
+    annot = doc[0].add_rect_annot(fitz.Rect(10, 10, 60, 60))
+    with_annot = page_content_hash(doc[0])
+    assert with_annot != before
+    
+    annot.set_colors(stroke=(0, 0, 1))
+    annot.update()
+    assert page_content_hash(doc[0]) != with_annot
+
+
+def test_report_counts_only_the_current_run(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("a" * 64, {'passthrough': True})
+    cache.get("a" * 64)
+    cache.get("b" * 64)
+    assert cache.report() == {'cache_hits': 1, 'cache_misses': 1}
+    
+    cache.reset_stats()
+    cache.get("a" * 64)
+    assert cache.report() == {'cache_hits': 1, 'cache_misses': 0}
+
+
+def test_hash_covers_graphics_state_resources():
+    doc = fitz.open()
+    page = doc.new_page()
+    gstate = doc.get_new_xref()
+    doc.update_object(gstate, "<</Type/ExtGState/ca 0.5>>")
+    resources = int(doc.xref_get_key(page.xref, "Resources")[1].split()[0])
+    doc.xref_set_key(resources, "ExtGState", f"<</GS0 {gstate} 0 R>>")
+    before = page_content_hash(doc[0])
+    
+    # 只改图形状态(透明度)对象,内容流和图片、字体都不变
+    doc.update_object(gstate, "<</Type/ExtGState/ca 0.2>>")
+    assert page_content_hash(doc[0]) != before
+
+
+def test_rewriting_a_key_does_not_inflate_total_size(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("a" * 64, {'passthrough': False}, b"x" * 1000)
+    cache.put("b" * 64, {'passthrough': False}, b"x" * 1000)
+    for _ in range(5):
+        cache.put("a" * 64, {'passthrough': False}, b"y" * 1000)
+    assert cache._total_bytes == sum(size for _, _, size in cache._entries())
@@ -0,0 +1,15 @@
+"""监视文件夹输出命名的测试"""
+
+import os
+
+from watch_folder import unique_path
+
+
+def test_unique_path_never_reuses_existing_or_claimed_names(tmp_path):
+    directory = str(tmp_path)
+    assert unique_path(directory, "scan.pdf") == os.path.join(directory, "scan.pdf")
+    
+    open(os.path.join(directory, "scan.pdf"), "w").close()
+    open(os.path.join(directory, "scan_1.pdf.part"), "w").close()  # 正在写入
+    claimed = {os.path.join(directory, "scan_2.pdf")}
+    assert unique_path(directory, "scan.pdf", claimed) == os.path.join(directory, "scan_3.pdf")
@@ -0,0 +1,435 @@
+"""
+监视文件夹
+持续监视输入目录(如扫描仪保存PDF的共享目录),新PDF写入完成后交给常驻的工作进程处理,
+处理后的PDF原子地放入输出目录。工作进程启动时加载一次 OpenCV、PyMuPDF 和广告移除器,
+之后每个文件都不再重复启动的开销。
+
+用法:
+  python watch_folder.py <输入目录> <输出目录> [--workers 进程数] [--interval 秒] [--settle 秒] [--status 状态文件]
+                         [--pipeline-depth 页数] [--pipeline-workers 线程数]
+  或: python pdf_ad_remover.py --watch <输入目录> <输出目录> [--workers 进程数] [其他处理选项]
+
+输入目录中处理成功的原文件移到 processed 子目录,失败的移到 failed 子目录(附带错误说明),
+不会被重复处理;服务重启后,输入目录中剩下的文件会重新处理。
+输出目录和这两个子目录中已有同名文件时(如扫描仪重复使用文件名),文件名后加 _1、_2 ...,不覆盖已有文件。
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+
+# 工作进程中常驻的广告移除器,由 init_worker() 创建
+_worker_remover = None
+
+
+def make_remover(options):
+    """
+    按选项创建广告移除器
+    
+    Args:
+        options: 选项字典,可包含 memory_mb, optimize_output, use_cache, color_mode,
+            footer_consensus, adaptive_band, pipeline_depth, pipeline_workers;未指定的使用默认值
+            
+    Returns:
+        PDFAdRemover对象
+    """
+    from cleaning_core import PDFAdRemover, MemoryBudget
+    from result_cache import ResultCache
+    
+    return PDFAdRemover(
+        memory_budget=MemoryBudget(
+            max_memory_mb=options.get('memory_mb', 1024),
+            max_pages_in_flight=options.get('pipeline_depth', 4)
+        ),
+        optimize_output=options.get('optimize_output', False),
+        cache=ResultCache() if options.get('use_cache', True) else None,
+        color_mode=options.get('color_mode', "auto"),
+        footer_consensus=options.get('footer_consensus', False),
+        adaptive_band=options.get('adaptive_band', False),
+        pipeline_workers=options.get('pipeline_workers', 2)
+    )
+
+
+def init_worker(options):
+    """工作进程初始化: 导入依赖并创建广告移除器,之后处理的每个文件共用"""
+    global _worker_remover
+    from lazy_modules import preload_modules
+    
+    # 提前导入,第一个文件不再等待
+    preload_modules(("numpy", "cv2", "fitz"))
+    
+    # Ctrl+C 由主进程处理,工作进程处理完当前文件后随进程池退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    _worker_remover = make_remover(options)
+
+
+def process_file(input_path, output_path):
+    """
+    在工作进程中处理一个PDF
+    
+    Args:
+        input_path: 输入PDF路径
+        output_path: 输出PDF路径,处理完成后才出现(写入期间为 .part 临时文件)
+        
+    Returns:
+        {'pages': 页数, 'seconds': 用时}
+    """
+    start = time.perf_counter()
+    _worker_remover.batch_process_pdf_to_pdf(input_path, output_path)
+    report = _worker_remover.last_report or {}
+    return {'pages': report.get('pages_done', 0), 'seconds': time.perf_counter() - start}
+
+
+def unique_path(directory, name, taken=()):
+    """
+    目录中不与已有文件重名的路径,重名时在文件名后加 _1、_2 ...
+    
+    Args:
+        directory: 目录
+        name: 文件名
+        taken: 已分配给其他文件、尚未写入的路径
+        
+    Returns:
+        路径
+    """
+    stem, ext = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    index = 1
+    # 正在写入的输出文件只有 .part 临时文件
+    while path in taken or os.path.exists(path) or os.path.exists(path + ".part"):
+        path = os.path.join(directory, f"{stem}_{index}{ext}")
+        index += 1
+    return path
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换,读取方不会读到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+class FolderWatcher:
+    """
+    轮询输入目录并把写入完成的PDF分发给常驻工作进程
+    
+    用轮询而不是文件系统通知: 网络共享目录(SMB/NFS)上通知通常不可用。文件的大小和修改时间
+    连续 settle_seconds 不变(并且在 Windows 上能以写方式打开,即没有其他程序在写)才视为写入完成。
+    工作进程异常退出时重建进程池,未完成的文件重新排队并逐个单独处理,以找出导致退出的文件;
+    单独处理时仍使工作进程退出 max_attempts 次的文件视为失败。
+    """
+    
+    def __init__(self, input_dir, output_dir, remover_options=None, workers=2, poll_interval=2.0,
+                 settle_seconds=5.0, status_path=None, status_interval=10.0, max_attempts=2):
+        """
+        初始化监视器
+        
+        Args:
+            input_dir: 输入目录
+            output_dir: 输出目录
+            remover_options: 传给 make_remover() 的选项字典
+            workers: 工作进程数
+            poll_interval: 轮询间隔(秒)
+            settle_seconds: 文件大小和修改时间保持不变多久后视为写入完成(秒)
+            status_path: 状态文件路径,为None时为输入目录下的 watch_status.json
+            status_interval: 状态文件的更新间隔(秒)
+            max_attempts: 单独处理时同一文件使工作进程异常退出多少次后视为失败
+        """
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.processed_dir = os.path.join(input_dir, "processed")
+        self.failed_dir = os.path.join(input_dir, "failed")
+        self.remover_options = remover_options or {}
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.status_path = status_path or os.path.join(input_dir, "watch_status.json")
+        self.status_interval = status_interval
+        self.max_attempts = max_attempts
+        
+        self.executor = None
+        self.pending = {}   # 路径 -> ((大小, 修改时间), 开始保持不变的时间)
+        self.running = {}   # future -> 路径
+        self.outputs = {}   # 正在处理的路径 -> 输出路径
+        self.crashes = {}   # 路径 -> 单独处理时工作进程异常退出的次数
+        self.suspects = set()  # 工作进程异常退出时正在处理的文件,需要逐个单独处理
+        self.stats = {
+            'started': time.time(),
+            'processed_files': 0,
+            'failed_files': 0,
+            'processed_pages': 0,
+            'busy_seconds': 0.0,
+            'last_file': None,
+            'last_error': None
+        }
+    
+    def start_pool(self):
+        """创建(或重建)工作进程池"""
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(self.remover_options,)
+        )
+    
+    def scan(self):
+        """扫描输入目录,更新各文件的写入状态"""
+        now = time.monotonic()
+        in_flight = set(self.running.values())
+        seen = set()
+        for entry in os.scandir(self.input_dir):
+            if not entry.is_file() or not entry.name.lower().endswith(".pdf") or entry.path in in_flight:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # 扫描期间被移走
+            seen.add(entry.path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous = self.pending.get(entry.path)
+            if previous is None or previous[0] != signature:
+                self.pending[entry.path] = (signature, now)
+        
+        # 被其他程序移走或删除的文件不再等待
+        for path in list(self.pending):
+            if path not in seen:
+                del self.pending[path]
+    
+    def ready_files(self):
+        """写入完成、可以处理的文件"""
+        now = time.monotonic()
+        ready = []
+        for path, (signature, since) in self.pending.items():
+            if signature[0] > 0 and now - since >= self.settle_seconds and self.is_writable(path):
+                ready.append(path)
+        return sorted(ready)
+    
+    @staticmethod
+    def is_writable(path):
+        """能否以写方式打开;Windows 上其他程序仍在写入时会失败"""
+        try:
+            with open(path, "ab"):
+                pass
+            return True
+        except OSError:
+            return False
+    
+    def submit_ready(self):
+        """把写入完成的文件交给工作进程;有待排查的文件时一次只处理一个"""
+        ready = self.ready_files()
+        if self.suspects:
+            if self.running:
+                return
+            ready = sorted(ready, key=lambda path: path not in self.suspects)[:1]
+        
+        for path in ready:
+            del self.pending[path]
+            output_path = unique_path(self.output_dir, os.path.basename(path), set(self.outputs.values()))
+            future = self.executor.submit(process_file, path, output_path)
+            self.running[future] = path
+            self.outputs[path] = output_path
+            print(f"开始处理: {os.path.basename(path)}")
+    
+    def collect(self):
+        """收集已完成的文件,移走原文件并更新统计"""
+        broken = []
+        for future in [future for future in self.running if future.done()]:
+            path = self.running.pop(future)
+            output_path = self.outputs.pop(path)
+            name = os.path.basename(path)
+            try:
+                result = future.result()
+            except CancelledError:
+                continue  # 停止监视时尚未开始处理,下次启动时重新处理
+            except BrokenProcessPool:
+                broken.append(path)
+                continue
+            except Exception as e:
+                self.fail(path, "".join(traceback.format_exception(type(e), e, e.__traceback__)))
+                continue
+            
+            self.move(path, self.processed_dir)
+            self.suspects.discard(path)
+            self.crashes.pop(path, None)
+            self.stats['processed_files'] += 1
+            self.stats['processed_pages'] += result['pages']
+            self.stats['busy_seconds'] += result['seconds']
+            self.stats['last_file'] = name
+            print(f"处理完成: {name} -> {os.path.basename(output_path)} ({result['pages']} 页, {result['seconds']:.1f} 秒)")
+        
+        if broken:
+            self.recover(broken)
+    
+    def recover(self, broken):
+        """
+        工作进程异常退出(如内存不足被系统结束)后重建进程池
+        
+        Args:
+            broken: 因进程池失效而失败的文件
+        """
+        # 进程池已不可用,其余未完成的文件同样受影响
+        for future, path in self.running.items():
+            future.cancel()
+            broken.append(path)
+        self.running.clear()
+        self.outputs.clear()
+        self.executor.shutdown(wait=False)
+        self.start_pool()
+        
+        if len(broken) == 1:
+            # 只有一个文件在处理,就是它导致的
+            path = broken[0]
+            self.crashes[path] = self.crashes.get(path, 0) + 1
+            if self.crashes[path] >= self.max_attempts:
+                self.suspects.discard(path)
+                self.crashes.pop(path)
+                self.fail(path, "工作进程异常退出")
+                return
+        
+        for path in broken:
+            print(f"工作进程异常退出,重新排队: {os.path.basename(path)}")
+            self.suspects.add(path)
+            self.pending[path] = ((-1, -1), time.monotonic())
+    
+    def fail(self, path, error):
+        """记录失败并把原文件移到 failed 子目录"""
+        name = os.path.basename(path)
+        self.suspects.discard(path)
+        self.stats['failed_files'] += 1
+        self.stats['last_error'] = f"{name}: {error.strip().splitlines()[-1]}"
+        print(f"处理失败: {name}: {error.strip().splitlines()[-1]}")
+        
+        moved = self.move(path, self.failed_dir)
+        if moved:
+            try:
+                with open(moved + ".error.txt", "w", encoding="utf-8") as f:
+                    f.write(error)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def move(path, target_dir):
+        """
+        把文件移到目标目录,同一文件系统上为原子操作;目标目录中已有同名文件时改名,不覆盖
+        
+        Returns:
+            移动后的路径,失败时返回 None
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        target = unique_path(target_dir, os.path.basename(path))
+        try:
+            os.replace(path, target)
+        except OSError as e:
+            print(f"无法移动 {path}: {e}")
+            return None
+        return target
+    
+    def status(self):
+        """健康和统计信息"""
+        stats = dict(self.stats)
+        busy = stats['busy_seconds']
+        stats.update({
+            'pid': os.getpid(),
+            'updated': time.time(),
+            'uptime_seconds': time.time() - stats['started'],
+            'workers': self.workers,
+            'waiting_files': len(self.pending),
+            'running_files': len(self.running),
+            'pages_per_second': stats['processed_pages'] / busy if busy > 0 else 0.0
+        })
+        return stats
+    
+    def write_status(self):
+        """写入状态文件"""
+        try:
+            write_json_atomic(self.status_path, self.status())
+        except OSError as e:
+            print(f"无法写入状态文件 {self.status_path}: {e}")
+    
+    def run(self, stop_event=None):
+        """
+        持续监视,直到按 Ctrl+C 或 stop_event 被设置
+        
+        Args:
+            stop_event: threading.Event,设置后处理完正在处理的文件并退出;为None时只能按 Ctrl+C 退出
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.start_pool()
+        print(f"监视目录: {self.input_dir} -> {self.output_dir} ({self.workers} 个工作进程)")
+        
+        last_status = 0.0
+        try:
+            while stop_event is None or not stop_event.is_set():
+                self.collect()
+                self.scan()
+                self.submit_ready()
+                if time.monotonic() - last_status >= self.status_interval:
+                    self.write_status()
+                    last_status = time.monotonic()
+                time.sleep(self.poll_interval)
+            
+            # 等待正在处理的文件完成
+            while self.running:
+                self.collect()
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            print("\n停止监视,等待正在处理的文件完成,尚未开始的文件下次启动时重新处理")
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.collect()
+            self.write_status()
+
+
+def main(argv=None, remover_options=None):
+    """
+    主函数
+    
+    Args:
+        argv: 命令行参数,为None时使用 sys.argv[1:]
+        remover_options: 传给 make_remover() 的选项字典(由 pdf_ad_remover.py --watch 解析)
+    """
+    parser = argparse.ArgumentParser(description="监视文件夹,自动去除新PDF中的广告")
+    parser.add_argument("input_dir", help="输入目录")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--interval", type=float, default=2.0, help="轮询间隔(秒)")
+    parser.add_argument("--settle", type=float, default=5.0, help="文件保持不变多久后视为写入完成(秒)")
+    parser.add_argument("--status", help="状态文件路径,默认为输入目录下的 watch_status.json")
+    parser.add_argument("--status-interval", type=float, default=10.0, help="状态文件更新间隔(秒)")
+    parser.add_argument("--pipeline-depth", type=int, help="每个工作进程的流水线中同时处理的页数(默认4)")
+    parser.add_argument("--pipeline-workers", type=int, help="每个工作进程中处理和编码各自的线程数(默认2)")
+    args = parser.parse_args(argv)
+    
+    remover_options = dict(remover_options or {})
+    if args.pipeline_depth is not None:
+        remover_options['pipeline_depth'] = args.pipeline_depth
+    if args.pipeline_workers is not None:
+        remover_options['pipeline_workers'] = args.pipeline_workers
+    
+    if not os.path.isdir(args.input_dir):
+        print(f"错误: 输入目录不存在: {args.input_dir}")
+        return 1
+    
+    watcher = FolderWatcher(
+        args.input_dir,
+        args.output_dir,
+        remover_options,
+        workers=args.workers,
+        poll_interval=args.interval,
+        settle_seconds=args.settle,
+        status_path=args.status,
+        status_interval=args.status_interval
+    )
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
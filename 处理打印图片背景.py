@@ -1,13 +1,20 @@
-import cv2
-import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
-from PIL import Image, ImageTk
 import os
 import sys
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import threading
+from typing import TYPE_CHECKING
+from lazy_modules import lazy_import, preload_in_background
+from cleaning_core import remove_black_background
+
+# 图像处理模块在第一次使用时导入,窗口先显示
+lazy_import(globals(), cv2="cv2", np="numpy", Image="PIL.Image", ImageTk="PIL.ImageTk")
+if TYPE_CHECKING:
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageTk
 
 if sys.platform == "win32":
     os.environ['NLS_LANG'] = 'SIMPLIFIED CHINESE_CHINA.UTF8'
@@ -20,17 +27,6 @@ class ImageContainer:
         self.display_image = None  # 当前显示的图像
         self.scale = 1.0  # 显示缩放比例
 
-def remove_black_background(image, block_size, c_value):
-    """移除黑色背景,保留前景内容"""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY_INV, block_size, c_value)
-    white_background = np.ones_like(image, dtype=np.uint8) * 255
-    result = cv2.bitwise_and(image, image, mask=thresh)
-    result = cv2.add(result, white_background, mask=cv2.bitwise_not(thresh))
-    return result
-
 def update_image(canvas, image, block_size, c_value, image_container=None):
     """处理并显示图像"""
     processed_image = remove_black_background(image, block_size, c_value)
@@ -57,7 +53,13 @@ def update_image(canvas, image, block_size, c_value, image_container=None):
 
     img_tk = ImageTk.PhotoImage(im)
     canvas.img_tk = img_tk
-    canvas.create_image(0, 0, anchor=tk.NW, image=img_tk)
+    # 复用同一个图片图元,只替换图片,不在画布上累积图元
+    image_item = getattr(canvas, 'image_item', None)
+    if image_item is None:
+        canvas.image_item = canvas.create_image(0, 0, anchor=tk.NW, image=img_tk)
+        canvas.tag_lower(canvas.image_item)
+    else:
+        canvas.itemconfig(image_item, image=img_tk)
     return processed_image
 
 def update_image_async(canvas, image_container, block_size, c_value, callback=None):
@@ -187,6 +189,9 @@ def start_crop_mode(canvas, image_container, block_size, c_value, status_label):
     crop_mode = True
     crop_start = None
     crop_rect = None
+    # 再次进入裁剪模式时删除上一次留下的裁剪框,否则它会一直留在画布上
+    if crop_canvas_id:
+        canvas.delete(crop_canvas_id)
     crop_canvas_id = None
     status_label.config(text="✂️ 裁剪模式: 请在图像上拖拽选择区域", foreground="green")
 
@@ -262,9 +267,9 @@ def on_canvas_click(event, canvas):
 
     crop_start = (event.x, event.y)
 
-    # 删除旧的裁剪框
+    # 隐藏旧的裁剪框,拖拽时再移动到新位置
     if crop_canvas_id:
-        canvas.delete(crop_canvas_id)
+        canvas.itemconfig(crop_canvas_id, state='hidden')
 
 def on_canvas_drag(event, canvas):
     """画布拖拽事件"""
@@ -279,15 +284,15 @@ def on_canvas_drag(event, canvas):
     # 更新裁剪矩形
     crop_rect = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
 
-    # 删除旧的裁剪框
+    # 移动已有的裁剪框,没有时再创建
     if crop_canvas_id:
-        canvas.delete(crop_canvas_id)
-
-    # 绘制新的裁剪框
-    crop_canvas_id = canvas.create_rectangle(
-        crop_rect[0], crop_rect[1], crop_rect[2], crop_rect[3],
-        outline='red', width=2, dash=(5, 5)
-    )
+        canvas.coords(crop_canvas_id, *crop_rect)
+        canvas.itemconfig(crop_canvas_id, state='normal')
+    else:
+        crop_canvas_id = canvas.create_rectangle(
+            crop_rect[0], crop_rect[1], crop_rect[2], crop_rect[3],
+            outline='red', width=2, dash=(5, 5)
+        )
 
 def create_ui():
     """创建用户界面"""
@@ -447,6 +452,7 @@ def create_ui():
 
     block_size_slider.focus_set()
 
+    preload_in_background(root, ("numpy", "cv2", "PIL.Image", "PIL.ImageTk"))
     root.mainloop()
 
 if __name__ == "__main__":
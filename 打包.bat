@@ -25,7 +25,7 @@ echo [3/4] 开始打包...
 echo   这可能需要几分钟时间,请耐心等待...
 echo.
 
-pyinstaller --onefile --windowed --icon=ico.ico --name="PDF广告移除工具" --version-file=version_info.txt interactive_ad_remover.py
+pyinstaller --onefile --windowed --icon=ico.ico --name="PDF广告移除工具" --version-file=version_info.txt --hidden-import=numpy --hidden-import=cv2 --hidden-import=PIL.Image --hidden-import=PIL.ImageTk --hidden-import=fitz interactive_ad_remover.py
 
 if %errorlevel% neq 0 (
     echo.
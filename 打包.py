@@ -66,6 +66,12 @@ def main():
             '--icon=ico.ico',
             '--name=PDF广告移除工具',
             '--version-file=version_info.txt',
+            # 以下模块在界面显示后才按需导入,需要显式列出
+            '--hidden-import=numpy',
+            '--hidden-import=cv2',
+            '--hidden-import=PIL.Image',
+            '--hidden-import=PIL.ImageTk',
+            '--hidden-import=fitz',
             main_script
         ]
         